@@ -0,0 +1,162 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from scipy.integrate import solve_ivp
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from propagator import Propagator
+from force_model import ForceModel
+
+
+# constant perturbation pulses without the sinusoidal perturbations, so that the angular velocity reached after
+# a pulse only depends on how the pulse is integrated: the default one and a pulse shorter than most adaptive steps
+PULSES = {
+    "default pulse": [3, 3.25],
+    "short pulse": [3.3, 3.32],
+}
+
+MODES = ("frame", "fused", "continuous")
+
+
+def get_config(pulse, mode, method):
+
+    return {
+        "environment": {
+            "fuse_skipped_frames": mode == "fused",
+        },
+        "force_model": {
+            "perturbations": {
+                "n_sinusoidal_perturbations": 0,
+                "constant_perturbations_times": [pulse, [0, 0], [0, 0]],
+            },
+        },
+        "propagator": {
+            "integration_method": method,
+            "time_horizon": 1000,
+            "continuous_propagation": mode == "continuous",
+        },
+    }
+
+
+def propagate(config, n_frames, duration):
+
+    # null actions from a spacecraft at rest, times and states of every frame are returned. As inside the
+    # environment, frames are propagated one at a time unless skipped frames are fused
+    propagator = Propagator(config)
+    is_fused = config["environment"]["fuse_skipped_frames"]
+    propagator.reset()
+
+    inertia_matrix = np.eye(3)
+    states = np.array([1, 0, 0, 0, 0, 0, 0], dtype=np.float64)
+    frame_times = list()
+    frame_states = list()
+
+    t_start = time.perf_counter()
+    while propagator.current_time < duration - 1e-9:
+
+        if is_fused:
+            _, times_chunk, states_chunk = propagator.propagate_frames(
+                states, propagator.null_action, n_frames, inertia_matrix, inertia_matrix
+            )
+
+        else:
+            times_chunk = np.empty(n_frames)
+            states_chunk = np.empty((n_frames, 7))
+            for frame in range(n_frames):
+                _, ode_solution = propagator.propagate(states, propagator.null_action, inertia_matrix, inertia_matrix)
+                states = np.take(ode_solution.y, -1, -1)
+                times_chunk[frame] = propagator.current_time
+                states_chunk[frame] = states
+
+        states = states_chunk[-1].copy()
+        frame_times.append(times_chunk)
+        frame_states.append(states_chunk)
+    run_time = time.perf_counter() - t_start
+
+    return np.concatenate(frame_times), np.concatenate(frame_states), run_time
+
+
+def get_reference(config, time_steps):
+
+    # tight solution of the same problem, split at the edges of the pulse so that they are integrated exactly
+    force_model = ForceModel(config)
+    inertia_matrix = np.eye(3)
+    boundaries = np.concatenate(([0], force_model.get_discontinuities(0, time_steps[-1]), [time_steps[-1]]))
+
+    states = np.array([1, 0, 0, 0, 0, 0, 0], dtype=np.float64)
+    frame_states = list()
+
+    for t_start, t_end in zip(boundaries[:-1], boundaries[1:]):
+
+        t_eval = time_steps[(time_steps > t_start) & (time_steps <= t_end)]
+        has_end = t_eval.shape[0] > 0 and t_eval[-1] == t_end
+
+        ode_solution = solve_ivp(
+            force_model.ode,
+            [t_start, t_end],
+            states,
+            method="DOP853",
+            t_eval=t_eval if has_end else np.append(t_eval, t_end),
+            args=(np.zeros(3), inertia_matrix, inertia_matrix),
+            rtol=1e-12,
+            atol=1e-12
+        )
+
+        frame_states.append(ode_solution.y[:, :t_eval.shape[0]].T)
+        states = ode_solution.y[:, -1]
+
+    return np.concatenate(frame_states)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="frame skipping modes against frame by frame propagation")
+    parser.add_argument("--method", default="RK45", help="adaptive integration method")
+    parser.add_argument("--n-frames", type=int, nargs="+", default=[100, 500], help="frames propagated per agent step")
+    parser.add_argument("--duration", type=float, default=10, help="propagated time [s]")
+    parser.add_argument("--tolerance", type=float, default=1e-2, help="allowed angular velocity error over the frame by frame one [rad/s]")
+    args = parser.parse_args()
+
+    print(f"{'case':>16}{'frames':>8}{'mode':>12}{'final wy [rad/s]':>18}{'max w error':>14}{'speedup':>9}")
+
+    failures = list()
+
+    for name, pulse in PULSES.items():
+        for n_frames in args.n_frames:
+
+            # every mode is compared against the tight reference, the frame by frame propagation sets the accuracy
+            # that the faster modes have to keep
+            frame_error = None
+            frame_time = None
+
+            for mode in MODES:
+
+                config = get_config(pulse, mode, args.method)
+                time_steps, frame_states, run_time = propagate(config, n_frames, args.duration)
+                reference = get_reference(config, time_steps)
+                error = np.max(np.abs(frame_states[:, 4:] - reference[:, 4:]))
+
+                if frame_error is None:
+                    frame_error, frame_time = error, run_time
+
+                elif error > frame_error + args.tolerance:
+                    failures.append(f"{name}, {n_frames} frames, {mode}")
+
+                print(
+                    f"{name:>16}{n_frames:>8}{mode:>12}{frame_states[-1, 5]:>18.4f}{error:>14.2e}"
+                    f"{frame_time / run_time:>8.1f}x"
+                )
+
+            print(f"{name:>16}{n_frames:>8}{'reference':>12}{reference[-1, 5]:>18.4f}{'-':>14}{'-':>9}")
+
+    if failures:
+        print("trajectories less accurate than the frame by frame propagation: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+
+    main()
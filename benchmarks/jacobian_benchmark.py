@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from environment import SpacecraftEnv
+from propagator import IMPLICIT_METHODS
+
+
+# stiff configuration: large spread of the products of inertia, on top of the default 50 N*m perturbation pulse
+STIFF_CONFIG = {
+    "spacecraft": {
+        "inertia": {
+            "use_random_moi": True,
+            "use_random_poi": True,
+            "random_moi_min": [0.5, 0.5, 0.5],
+            "random_moi_max": [10, 10, 10],
+            "random_poi_min": [-1, -1, -1],
+            "random_poi_max": [1, 1, 1],
+        },
+    },
+}
+
+
+def verify_jacobian(env, n_states, seed):
+
+    # compare the analytic jacobian against central finite differences on random states
+    force_model = env.propagator.force_model
+    inertia_matrix = env.spacecraft.inertia.matrix
+    inverse_inertia_matrix = env.spacecraft.inertia.inverse_matrix
+    rng = np.random.default_rng(seed)
+
+    max_difference = 0
+    step = 1e-6
+
+    for _ in range(n_states):
+
+        t = rng.uniform(0, 10)
+        x = rng.normal(size=7)
+        x[:4] /= np.linalg.norm(x[:4])
+        u = rng.uniform(-1, 1, 3)
+
+        jacobian = force_model.jacobian(t, x, u, inertia_matrix, inverse_inertia_matrix)
+
+        for idx in range(7):
+            dx = np.zeros(7)
+            dx[idx] = step
+            column = (
+                force_model.ode(t, x + dx, u, inertia_matrix, inverse_inertia_matrix) -
+                force_model.ode(t, x - dx, u, inertia_matrix, inverse_inertia_matrix)
+            ) / (2 * step)
+            max_difference = max(max_difference, np.max(np.abs(column - jacobian[:, idx])))
+
+    return max_difference
+
+
+def run_case(method, use_analytic_jacobian, n_steps, seed):
+
+    # inertia and initial attitude are drawn from the environment random stream, seeded by the config
+    config = dict(
+        STIFF_CONFIG,
+        environment={"use_random_seed": True, "random_seed": seed},
+        propagator={"integration_method": method}
+    )
+    env = SpacecraftEnv(config=config)
+
+    # without the analytic jacobian, scipy estimates it by finite differences
+    if not use_analytic_jacobian:
+        env.propagator.jacobian = None
+
+    # count right hand side evaluations, including the ones used by finite differences, and jacobian evaluations
+    force_model = env.propagator.force_model
+    ode = force_model.ode
+    jacobian = force_model.jacobian
+    n_evaluations = {"rhs": 0, "jacobian": 0}
+
+    def counting_ode(*args, **kwargs):
+        n_evaluations["rhs"] += 1
+        return ode(*args, **kwargs)
+
+    def counting_jacobian(*args, **kwargs):
+        n_evaluations["jacobian"] += 1
+        return jacobian(*args, **kwargs)
+
+    force_model.ode = counting_ode
+    if env.propagator.jacobian is not None:
+        env.propagator.jacobian = counting_jacobian
+
+    rng = np.random.default_rng(seed)
+    actions = rng.uniform(-1, 1, (n_steps, 3))
+
+    env.reset()
+
+    t_start = time.perf_counter()
+    for action in actions:
+        env.step(action)
+    step_time = time.perf_counter() - t_start
+
+    return {
+        "us_per_step": step_time / n_steps * 1e6,
+        "rhs_evaluations_per_step": n_evaluations["rhs"] / n_steps,
+        "jacobian_evaluations_per_step": n_evaluations["jacobian"] / n_steps,
+        "final_states": env.spacecraft.get_prop_states(),
+        "env": env,
+    }
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="analytic vs finite differences jacobian benchmark")
+    parser.add_argument("--n-steps", type=int, default=500, help="number of agent steps of each case")
+    parser.add_argument("--seed", type=int, default=0, help="seed of inertia, initial states and actions")
+    args = parser.parse_args()
+
+    for method in IMPLICIT_METHODS:
+
+        finite_differences = run_case(method, False, args.n_steps, args.seed)
+        analytic = run_case(method, True, args.n_steps, args.seed)
+
+        print(f"{method}:")
+        for name, result in (("finite differences", finite_differences), ("analytic", analytic)):
+            print(
+                f"{name:>22}: {result['us_per_step']:9.1f} us/step, "
+                f"{result['rhs_evaluations_per_step']:6.1f} rhs/step, "
+                f"{result['jacobian_evaluations_per_step']:6.2f} jacobians/step"
+            )
+
+        print(f"{'speedup':>22}: {finite_differences['us_per_step'] / analytic['us_per_step']:9.2f}x")
+        print(
+            f"{'final states difference':>22}: "
+            f"{np.max(np.abs(finite_differences['final_states'] - analytic['final_states'])):9.2e}"
+        )
+
+    print(f"max jacobian error vs finite differences: {verify_jacobian(analytic['env'], 100, args.seed):.2e}")
+
+
+if __name__ == "__main__":
+
+    main()
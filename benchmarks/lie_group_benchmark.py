@@ -0,0 +1,127 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from scipy.integrate import solve_ivp
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import quaternion as quat
+from propagator import Propagator
+from spacecraft import Inertia
+
+
+# the default perturbation pulse is a discontinuity of the dynamics, whose errors hide the ones of the methods
+UNPERTURBED_CONFIG = {
+    "force_model": {
+        "use_perturbations": False,
+    },
+}
+
+# asymmetric spacecraft, where the gyroscopic torque couples the angular velocity components
+ASYMMETRIC_CONFIG = dict(
+    UNPERTURBED_CONFIG,
+    spacecraft={
+        "inertia": {
+            "moi": [1, 2, 3],
+            "poi": [0.1, 0.2, 0.1],
+        },
+    },
+)
+
+METHODS = ("RK45", "rk4_fixed", "rkmk4_fixed")
+STEP_SIZES = (0.01, 0.02, 0.05, 0.1)
+
+
+def propagate(config, method, step_size, initial_states, duration):
+
+    # propagate with null actions, normalizing quaternions after each step as the environment does
+    propagator = Propagator(
+        dict(config, propagator={"integration_method": method, "integration_step": step_size, "time_horizon": 2 * duration})
+    )
+    inertia = Inertia(config)
+
+    propagator.reset()
+
+    states = initial_states.copy()
+    n_evaluations = 0
+    max_norm_error = 0
+
+    t_start = time.perf_counter()
+    for _ in range(int(round(duration / step_size))):
+        _, ode_solution = propagator.propagate(states, propagator.null_action, inertia.matrix, inertia.inverse_matrix)
+        states = ode_solution.y[:, -1].copy()
+        n_evaluations += ode_solution.nfev
+        max_norm_error = max(max_norm_error, abs(np.linalg.norm(states[:4]) - 1))
+        states[:4] = quat.normalize(states[:4])
+    run_time = time.perf_counter() - t_start
+
+    return states, n_evaluations, max_norm_error, run_time
+
+
+def reference_states(config, initial_states, duration):
+
+    propagator = Propagator(config)
+    inertia = Inertia(config)
+
+    ode_solution = solve_ivp(
+        fun=propagator.force_model.ode,
+        t_span=[0, duration],
+        y0=initial_states,
+        method="DOP853",
+        rtol=1e-12,
+        atol=1e-12,
+        args=(propagator.null_action, inertia.matrix, inertia.inverse_matrix)
+    )
+
+    return ode_solution.y[:, -1]
+
+
+def run_case(name, config, initial_states, duration):
+
+    reference = reference_states(config, initial_states, duration)
+
+    print(f"{name}: {duration} s at |w| = {np.linalg.norm(initial_states[4:]):.2f} rad/s")
+    print(
+        f"{'method':>12}{'step [s]':>10}{'attitude error [deg]':>22}{'w error [rad/s]':>17}"
+        f"{'norm drift':>12}{'rhs/s':>10}{'ms/s':>10}"
+    )
+
+    for method in METHODS:
+        for step_size in STEP_SIZES:
+
+            states, n_evaluations, max_norm_error, run_time = propagate(config, method, step_size, initial_states, duration)
+
+            # angle of the rotation between the propagated and the reference attitudes, through the logarithm
+            # instead of the arc cosine of the scalar part, which has no resolution below 1e-4 deg
+            quaternion_error = quat.product(quat.normalize(reference[:4]), quat.conjugate(states[:4]))
+            attitude_error = np.rad2deg(2 * np.linalg.norm(quat.log(quaternion_error * np.sign(quaternion_error[0]))))
+
+            print(
+                f"{method:>12}{step_size:>10.3f}{attitude_error:>22.3e}{np.max(np.abs(states[4:] - reference[4:])):>17.3e}"
+                f"{max_norm_error:>12.1e}{n_evaluations / duration:>10.0f}{run_time / duration * 1e3:>10.2f}"
+            )
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Lie group integrator accuracy vs cost benchmark")
+    parser.add_argument("--duration", type=float, default=10, help="propagated time [s]")
+    parser.add_argument(
+        "--angular-velocity", type=float, nargs=3, default=[2, -1, 1.5], help="initial angular velocity [rad/s]"
+    )
+    args = parser.parse_args()
+
+    initial_states = np.concatenate(([1, 0, 0, 0], args.angular_velocity)).astype(np.float64)
+
+    run_case("default config", {}, initial_states, args.duration)
+    print()
+    run_case("default config without perturbations", UNPERTURBED_CONFIG, initial_states, args.duration)
+    print()
+    run_case("asymmetric inertia without perturbations", ASYMMETRIC_CONFIG, initial_states, args.duration)
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,78 @@
+import os
+import sys
+import timeit
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from force_model import AttitudeDynamicsModel
+
+
+def legacy_quaternion_ode(x, u, d, inertia_matrix):
+
+    # attitude dynamics kernel as implemented before the plain ndarray one, kept as reference
+    sc_w = np.array([x[4], x[5], x[6]])
+
+    sc_q_matrix = np.matrix(
+        [
+            [-x[1], -x[2], -x[3]],
+            [x[0], -x[3], x[2]],
+            [x[3], x[0], -x[1]],
+            [-x[2], x[1], x[0]]
+        ]
+    )
+
+    sc_qe_dot = np.dot(sc_q_matrix, sc_w) / 2
+    sc_w_dot = - np.dot(inertia_matrix.I, np.cross(sc_w, np.dot(inertia_matrix.A, sc_w))) + \
+        np.dot(inertia_matrix.I, u) + np.dot(inertia_matrix.I, d)
+
+    x_dot = np.concatenate((sc_qe_dot.A, sc_w_dot.A), axis=None)
+
+    return x_dot
+
+
+if __name__ == "__main__":
+
+    n_calls = 20000
+
+    # define a generic spacecraft state
+    x = np.array([0.5, 0.5, 0.5, 0.5, 0.3, -0.2, 0.1])
+    u = np.array([0.1, -0.2, 0.3])
+    d = (0.01, 0.02, -0.01)
+    inertia_matrix = np.array(
+        [
+            [2.0, 0.1, 0.2],
+            [0.1, 3.0, 0.3],
+            [0.2, 0.3, 4.0]
+        ]
+    )
+    inverse_inertia_matrix = np.linalg.inv(inertia_matrix)
+    legacy_inertia_matrix = np.matrix(inertia_matrix)
+    out = np.empty(7)
+
+    attitude_dynamics = AttitudeDynamicsModel()
+
+    # verify that both kernels compute the same derivatives
+    max_difference = np.max(np.abs(
+        legacy_quaternion_ode(x, u, d, legacy_inertia_matrix) -
+        attitude_dynamics.quaternion_ode(x, u, d, inertia_matrix, inverse_inertia_matrix)
+    ))
+
+    timings = {
+        "legacy": timeit.timeit(
+            lambda: legacy_quaternion_ode(x, u, d, legacy_inertia_matrix),
+            number=n_calls
+        ),
+        "ndarray": timeit.timeit(
+            lambda: attitude_dynamics.quaternion_ode(x, u, d, inertia_matrix, inverse_inertia_matrix),
+            number=n_calls
+        ),
+        "ndarray + out buffer": timeit.timeit(
+            lambda: attitude_dynamics.quaternion_ode(x, u, d, inertia_matrix, inverse_inertia_matrix, out),
+            number=n_calls
+        ),
+    }
+
+    print(f"max derivative difference: {max_difference:.3e}")
+    for name, timing in timings.items():
+        print(f"{name:>22}: {timing / n_calls * 1e6:8.2f} us per call ({timings['legacy'] / timing:5.1f}x)")
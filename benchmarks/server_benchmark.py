@@ -0,0 +1,118 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import multiprocessing as mp
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from env_server import EnvServer, AsyncEnvClient
+from profiler import StageHistogram
+
+
+def serve(n_envs, path, port, ready):
+
+    server = EnvServer(n_envs, path=path, port=port)
+
+    async def main():
+        await server.start()
+        ready.set()
+        await server.serve_forever()
+
+    asyncio.run(main())
+
+
+async def run_client(address, env_ids, duration, histogram, seed):
+
+    # step the client environments with random actions, a single batched request per round trip,
+    # resetting the terminated ones with a single batched request too
+    client = await AsyncEnvClient.connect(**address)
+    rng = np.random.default_rng(seed)
+
+    await client.reset(env_ids)
+    n_steps = 0
+
+    t_end = time.perf_counter() + duration
+    while time.perf_counter() < t_end:
+
+        actions = rng.uniform(-1, 1, (len(env_ids), 3))
+
+        t_start = time.perf_counter()
+        _, _, terminated, truncated, _ = await client.step(env_ids, actions)
+        histogram.record(time.perf_counter() - t_start)
+        n_steps += len(env_ids)
+
+        is_done = terminated | truncated
+        if np.any(is_done):
+            await client.reset(env_ids[is_done])
+
+    await client.close()
+
+    return n_steps
+
+
+async def run_load(address, n_clients, batch_size, duration, seed):
+
+    histogram = StageHistogram()
+    env_ids = np.arange(n_clients * batch_size).reshape(n_clients, batch_size)
+
+    t_start = time.perf_counter()
+    n_steps = await asyncio.gather(
+        *[run_client(address, env_ids[idx], duration, histogram, seed + idx) for idx in range(n_clients)]
+    )
+    run_time = time.perf_counter() - t_start
+
+    return histogram.summary(), sum(n_steps) / run_time
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="environment server latency and throughput load generator")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16], help="numbers of concurrent clients")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 64], help="environments per request")
+    parser.add_argument("--duration", type=float, default=3, help="duration of each case [s]")
+    parser.add_argument("--tcp", action="store_true", help="use tcp on localhost instead of a unix domain socket")
+    parser.add_argument("--port", type=int, default=5556, help="tcp port")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the actions")
+    args = parser.parse_args()
+
+    n_envs = max(args.clients) * max(args.batch_sizes)
+
+    # the server runs inside its own process, so that the load generator does not compete with its event loop
+    path = None if args.tcp else os.path.join(tempfile.mkdtemp(), "env_server.sock")
+    address = {"port": args.port} if args.tcp else {"path": path}
+
+    ready = mp.Event()
+    process = mp.Process(target=serve, args=(n_envs, path, args.port, ready), daemon=True)
+    process.start()
+    ready.wait()
+
+    print(f"{'clients':>8}{'batch':>8}{'requests':>10}{'p50 [us]':>12}{'p90 [us]':>12}{'p99 [us]':>12}{'env steps/s':>14}")
+
+    try:
+        for n_clients in args.clients:
+            for batch_size in args.batch_sizes:
+
+                summary, steps_per_second = asyncio.run(
+                    run_load(address, n_clients, batch_size, args.duration, args.seed)
+                )
+
+                print(
+                    f"{n_clients:>8}{batch_size:>8}{summary['count']:>10}{summary['p50'] * 1e6:>12.1f}"
+                    f"{summary['p90'] * 1e6:>12.1f}{summary['p99'] * 1e6:>12.1f}{steps_per_second:>14.0f}"
+                )
+
+    finally:
+        process.terminate()
+        process.join()
+
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,240 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import itertools
+import resource
+import multiprocessing as mp
+import numpy as np
+import scipy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+
+# default sweep, every combination of these values is benchmarked
+SWEEP = {
+    "integration_method": [
+        "RK45", "RK23", "DOP853", "Radau", "BDF", "LSODA", "rk4_fixed", "rk8_fixed", "rkmk4_fixed", "euler_semi_implicit"
+    ],
+    "use_perturbations": [True, False],
+    "n_skipped_frames": [0, 4],
+    "fuse_skipped_frames": [False, True],
+    "random_inertia": [False, True],
+    "time_horizon": [20, 80, 320],
+}
+
+# reduced sweep, used for quick regression checks
+QUICK_SWEEP = {
+    "integration_method": ["RK45", "rk4_fixed"],
+    "use_perturbations": [True, False],
+    "n_skipped_frames": [0],
+    "fuse_skipped_frames": [False],
+    "random_inertia": [False],
+    "time_horizon": [80],
+}
+
+# gain of the damping policy [N m s]
+DAMPING_GAIN = 1
+
+
+def get_case_config(case):
+
+    return {
+        "environment": {
+            "n_skipped_frames": case["n_skipped_frames"],
+            "fuse_skipped_frames": case["fuse_skipped_frames"],
+        },
+        "spacecraft": {
+            "inertia": {
+                "use_random_moi": case["random_inertia"],
+                "use_random_poi": case["random_inertia"],
+            },
+        },
+        "force_model": {
+            "use_perturbations": case["use_perturbations"],
+        },
+        "propagator": {
+            "integration_method": case["integration_method"],
+            "time_horizon": case["time_horizon"],
+        },
+    }
+
+
+def run_case(case, n_steps, seed):
+
+    from environment import SpacecraftEnv
+
+    # inertia and initial attitudes are drawn from the environment random stream, seeded by the config
+    config = get_case_config(case)
+    config["environment"].update(use_random_seed=True, random_seed=seed)
+
+    env = SpacecraftEnv(config=config)
+
+    # count right hand side evaluations of the ode, including the ones used by numerical jacobians
+    force_model = env.propagator.force_model
+    ode = force_model.ode
+    n_evaluations = [0]
+
+    def counting_ode(*args, **kwargs):
+        n_evaluations[0] += 1
+        return ode(*args, **kwargs)
+
+    force_model.ode = counting_ode
+
+    # bounded damping policy. Random actions spin the spacecraft up until the reward terminates the episode after
+    # a few steps, so the time horizon, the perturbation pulse and the coasts would never be measured
+    propagator = env.propagator
+    low, high = env.action_space.low, env.action_space.high
+
+    env.reset()
+    step_time = 0
+    step = 0
+    n_episodes = 0
+
+    # episodes always run up to the time horizon, ignoring reward terminations, and the last one is completed
+    while True:
+
+        action = np.clip(-DAMPING_GAIN * env.spacecraft.attitude.angular_velocity, low, high).astype(np.float32)
+
+        t_start = time.perf_counter()
+        _, _, _, truncated, _ = env.step(action)
+        step_time += time.perf_counter() - t_start
+        step += 1
+
+        # resets are not timed
+        if truncated or propagator.current_time >= propagator.time_horizon:
+            n_episodes += 1
+
+            if step >= n_steps:
+                break
+
+            env.reset()
+
+    env.close()
+
+    # peak resident set size of the process, ru_maxrss is in kilobytes on linux and in bytes on macos
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / 2**20 if sys.platform == "darwin" else peak_rss / 2**10
+
+    return {
+        "case": case,
+        "n_steps": step,
+        "n_episodes": n_episodes,
+        "steps_per_second": step / step_time,
+        "us_per_step": step_time / step * 1e6,
+        "rhs_evaluations_per_step": n_evaluations[0] / step,
+        "peak_rss_mb": peak_rss_mb,
+    }
+
+
+def run_sweep(sweep, n_steps, seed):
+
+    names = list(sweep)
+    cases = [dict(zip(names, values)) for values in itertools.product(*sweep.values())]
+
+    # without skipped frames there is nothing to fuse, these cases would repeat the unfused ones
+    cases = [case for case in cases if not (case["fuse_skipped_frames"] and case["n_skipped_frames"] == 0)]
+
+    results = list()
+
+    # every case runs inside a fresh process, so that peak memory usages are not shared between cases
+    ctx = mp.get_context("spawn")
+
+    for idx, case in enumerate(cases):
+
+        with ctx.Pool(1) as pool:
+            result = pool.apply(run_case, (case, n_steps, seed))
+
+        results.append(result)
+
+        print(
+            f"[{idx + 1}/{len(cases)}] {format_case(case)}: "
+            f"{result['steps_per_second']:9.1f} steps/s, "
+            f"{result['us_per_step']:9.1f} us/step, "
+            f"{result['rhs_evaluations_per_step']:6.1f} rhs/step, "
+            f"{result['peak_rss_mb']:7.1f} MB"
+        )
+
+    return results
+
+
+def format_case(case):
+
+    return ", ".join(f"{name}={value}" for name, value in case.items())
+
+
+def compare(results, baseline, tolerance):
+
+    # match cases by their parameters
+    baseline_results = {format_case(result["case"]): result for result in baseline["results"]}
+    regressions = list()
+
+    for result in results:
+
+        key = format_case(result["case"])
+
+        if key not in baseline_results:
+            print(f"{key}: not in baseline")
+            continue
+
+        ratio = result["steps_per_second"] / baseline_results[key]["steps_per_second"]
+        is_regression = ratio < 1 - tolerance
+
+        if is_regression:
+            regressions.append(key)
+
+        print(f"{key}: {ratio:6.2f}x baseline throughput{'  <-- REGRESSION' if is_regression else ''}")
+
+    return regressions
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="SpacecraftEnv throughput benchmark")
+    parser.add_argument("--output", default="benchmark_results.json", help="path of the json results file")
+    parser.add_argument("--baseline", default=None, help="path of a json results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative throughput drop")
+    parser.add_argument("--n-steps", type=int, default=2000, help="minimum number of agent steps of each case, the last episode is always completed")
+    parser.add_argument("--seed", type=int, default=0, help="seed of initial states and inertia")
+    parser.add_argument("--quick", action="store_true", help="run a reduced sweep")
+    args = parser.parse_args()
+
+    results = run_sweep(QUICK_SWEEP if args.quick else SWEEP, args.n_steps, args.seed)
+
+    with open(args.output, "w") as output_file:
+        json.dump(
+            {
+                "metadata": {
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "platform": platform.platform(),
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                    "scipy": scipy.__version__,
+                    "n_steps": args.n_steps,
+                    "seed": args.seed,
+                },
+                "results": results,
+            },
+            output_file,
+            indent=4
+        )
+
+    print(f"results written to {args.output}")
+
+    if args.baseline is not None:
+
+        with open(args.baseline, "r") as baseline_file:
+            baseline = json.load(baseline_file)
+
+        regressions = compare(results, baseline, args.tolerance)
+
+        if regressions:
+            print(f"{len(regressions)} throughput regressions found")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+
+    main()
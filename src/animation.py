@@ -1,9 +1,28 @@
-import pygame
-from pygame.locals import *
-from OpenGL.GL import *
-from OpenGL.GLU import *
+import os
 import numpy as np
 import imageio
+import quaternion as quat
+
+
+# pygame and OpenGL are only needed by the interactive animation, they are imported on its first call,
+# so that the headless export and the rest of the environment run on machines without a display or libGL
+pygame = None
+gl = None
+glu = None
+
+
+def _import_interactive_modules():
+
+    global pygame, gl, glu
+
+    if pygame is not None:
+        return
+
+    import pygame as pygame_module
+    import OpenGL.GL as gl_module
+    import OpenGL.GLU as glu_module
+
+    pygame, gl, glu = pygame_module, gl_module, glu_module
 
 
 class Animation():
@@ -54,17 +73,149 @@ class Animation():
             ]
         )
 
+        # camera used by the software rasterizer, the same one defined by gluPerspective and gluLookAt
+        self.camera_position = np.array([0.5, 2, 3])
+        forward = - self.camera_position / np.linalg.norm(self.camera_position)
+        side = np.cross(forward, np.array([0, 0, 1]))
+        side /= np.linalg.norm(side)
+        self.camera_rotation = np.array([side, np.cross(side, forward), forward])
+        self.focal_length = 1 / np.tan(np.deg2rad(60) / 2)
+
+        # colors of the x, y and z reference frame axes
+        self.axes_colors = np.eye(3)
+
+        # colors of the vertices of each cube edge, interpolated along the edge as done by OpenGL
+        self.cube_edge_colors = self.cube_colors[self.cube_edges % 6]
+
+    def render_frame(self, rotation_matrix, target_rotation_matrix):
+
+        # render a frame without any window or OpenGL context, lines are rasterized with numpy
+        image = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+
+        rotated_vertices = np.dot(self.cube_vertices, rotation_matrix)
+        origins = np.zeros((3, 3))
+
+        self._rasterize_lines(
+            image,
+            [
+                (origins, target_rotation_matrix, self.axes_colors, self.axes_colors, 1),
+                (origins, rotation_matrix, self.axes_colors, self.axes_colors, 1),
+                (
+                    rotated_vertices[self.cube_edges[:, 0]],
+                    rotated_vertices[self.cube_edges[:, 1]],
+                    self.cube_edge_colors[:, 0],
+                    self.cube_edge_colors[:, 1],
+                    8
+                ),
+            ]
+        )
+
+        return image
+
+    def export(self, quaternions_list, target_quaternion, time_step, path, fps=None, frame_stride=1):
+
+        # headless export: frames are rendered as fast as possible and streamed to the video writer,
+        # a frame every frame_stride records. If fps is provided, the stride is chosen to play in real time
+        if fps is not None:
+            frame_stride = max(1, int(round(1 / (fps * time_step))))
+        else:
+            fps = 1 / (frame_stride * time_step)
+
+        target_rotation_matrix = quat.to_rotation_matrix(target_quaternion)
+        rotation_matrices = quat.to_rotation_matrix(quaternions_list[::frame_stride])
+
+        writer = self._get_writer(path, fps)
+
+        try:
+            for rotation_matrix in rotation_matrices:
+                writer.append_data(self.render_frame(rotation_matrix, target_rotation_matrix))
+        finally:
+            writer.close()
+
+        return len(rotation_matrices)
+
+    def _get_writer(self, path, fps):
+
+        # gif frames durations are defined in [ms], other formats (e.g. mp4 through imageio-ffmpeg) use fps
+        if os.path.splitext(path)[1].lower() == ".gif":
+            return imageio.get_writer(path, mode="I", duration=1000 / fps, loop=0)
+
+        try:
+            return imageio.get_writer(path, mode="I", fps=fps)
+        except ValueError as error:
+            raise ValueError(
+                f"no video writer available for {path}: install imageio-ffmpeg (pip install imageio[ffmpeg]) "
+                f"or export a .gif file instead"
+            ) from error
+
+    def _project(self, points):
+
+        # get pixel coordinates and depths of points of shape (..., 3)
+        camera_points = np.dot(points - self.camera_position, self.camera_rotation.T)
+        depths = camera_points[..., 2]
+
+        x = (self.focal_length * self.height / self.width * camera_points[..., 0] / depths + 1) * self.width / 2
+        y = (1 - self.focal_length * camera_points[..., 1] / depths) * self.height / 2
+
+        return x, y, depths
+
+    def _rasterize_lines(self, image, line_groups):
+
+        pixels = list()
+        depths = list()
+        colors = list()
+
+        for starts, ends, start_colors, end_colors, width in line_groups:
+
+            x0, y0, d0 = self._project(starts)
+            x1, y1, d1 = self._project(ends)
+
+            # sample every line at least once per pixel
+            n_samples = int(np.ceil(np.max(np.maximum(np.abs(x1 - x0), np.abs(y1 - y0))))) + 1
+            s = np.linspace(0, 1, n_samples)
+
+            x = x0[:, None] + s * (x1 - x0)[:, None]
+            y = y0[:, None] + s * (y1 - y0)[:, None]
+            d = d0[:, None] + s * (d1 - d0)[:, None]
+            c = start_colors[:, None] + s[:, None] * (end_colors - start_colors)[:, None]
+
+            # thick lines are obtained by offsetting samples across the main direction of each line
+            offsets = np.arange(width) - width // 2
+            is_horizontal = (np.abs(x1 - x0) >= np.abs(y1 - y0))[:, None, None]
+            x = x[..., None] + np.where(is_horizontal, 0, offsets)
+            y = y[..., None] + np.where(is_horizontal, offsets, 0)
+
+            pixels.append((np.floor(y).astype(int).ravel(), np.floor(x).astype(int).ravel()))
+            depths.append(np.broadcast_to(d[..., None], x.shape).ravel())
+            colors.append(np.broadcast_to(c[:, :, None], x.shape + (3,)).reshape(-1, 3))
+
+        rows = np.concatenate([row for row, _ in pixels])
+        columns = np.concatenate([column for _, column in pixels])
+        depths = np.concatenate(depths)
+        colors = np.concatenate(colors)
+
+        # keep samples inside the image and, as the OpenGL depth test, the nearest sample of each pixel
+        is_inside = (rows >= 0) & (rows < self.height) & (columns >= 0) & (columns < self.width)
+        flat_pixels = rows[is_inside] * self.width + columns[is_inside]
+        depths = depths[is_inside]
+        colors = colors[is_inside]
+
+        order = np.lexsort((depths, flat_pixels))
+        flat_pixels, first_samples = np.unique(flat_pixels[order], return_index=True)
+
+        image.reshape(-1, 3)[flat_pixels] = (colors[order][first_samples] * 255).astype(np.uint8)
+
     def _render_cube(self, rotation_matrix):
 
         rotated_vertices = np.dot(self.cube_vertices, rotation_matrix)
         
-        glLineWidth(8.0)
-        glBegin(GL_LINES)
+        gl.glLineWidth(8.0)
+        gl.glBegin(gl.GL_LINES)
         for edge in self.cube_edges:
             for vertex in edge:
-                glColor3fv(self.cube_colors[vertex % 6])
-                glVertex3fv(rotated_vertices[vertex])
-        glEnd()
+                gl.glColor3fv(self.cube_colors[vertex % 6])
+                gl.glVertex3fv(rotated_vertices[vertex])
+        gl.glEnd()
 
     def _render_fixed_rf(self, rotation_matrix):
 
@@ -72,21 +223,21 @@ class Animation():
         rf_y = np.dot(np.array([0, 1, 0]), rotation_matrix)
         rf_z = np.dot(np.array([0, 0, 1]), rotation_matrix)
 
-        glLineWidth(1.0)  # Set the line thickness to 1.0
-        glBegin(GL_LINES)
+        gl.glLineWidth(1.0)  # Set the line thickness to 1.0
+        gl.glBegin(gl.GL_LINES)
         # Draw x-axis in red
-        glColor3f(1.0, 0.0, 0.0)
-        glVertex3f(0, 0, 0)
-        glVertex3f(rf_x[0], rf_x[1], rf_x[2])
+        gl.glColor3f(1.0, 0.0, 0.0)
+        gl.glVertex3f(0, 0, 0)
+        gl.glVertex3f(rf_x[0], rf_x[1], rf_x[2])
         # Draw y-axis in green
-        glColor3f(0.0, 1.0, 0.0)
-        glVertex3f(0, 0, 0)
-        glVertex3f(rf_y[0], rf_y[1], rf_y[2])
+        gl.glColor3f(0.0, 1.0, 0.0)
+        gl.glVertex3f(0, 0, 0)
+        gl.glVertex3f(rf_y[0], rf_y[1], rf_y[2])
         # Draw z-axis in blue
-        glColor3f(0.0, 0.0, 1.0)
-        glVertex3f(0, 0, 0)
-        glVertex3f(rf_z[0], rf_z[1], rf_z[2])
-        glEnd()
+        gl.glColor3f(0.0, 0.0, 1.0)
+        gl.glVertex3f(0, 0, 0)
+        gl.glVertex3f(rf_z[0], rf_z[1], rf_z[2])
+        gl.glEnd()
 
     def _render_target_rf(self, rotation_matrix):
 
@@ -94,69 +245,56 @@ class Animation():
         rf_y = np.dot(np.array([0, 1, 0]), rotation_matrix)
         rf_z = np.dot(np.array([0, 0, 1]), rotation_matrix)
 
-        glLineWidth(1.0)  # Set the line thickness to 1.0
-        glBegin(GL_LINES)
+        gl.glLineWidth(1.0)  # Set the line thickness to 1.0
+        gl.glBegin(gl.GL_LINES)
         # Draw x-axis in red
-        glColor3f(1.0, 0.0, 0.0)
-        glVertex3f(0, 0, 0)
-        glVertex3f(rf_x[0], rf_x[1], rf_x[2])
+        gl.glColor3f(1.0, 0.0, 0.0)
+        gl.glVertex3f(0, 0, 0)
+        gl.glVertex3f(rf_x[0], rf_x[1], rf_x[2])
         # Draw y-axis in green
-        glColor3f(0.0, 1.0, 0.0)
-        glVertex3f(0, 0, 0)
-        glVertex3f(rf_y[0], rf_y[1], rf_y[2])
+        gl.glColor3f(0.0, 1.0, 0.0)
+        gl.glVertex3f(0, 0, 0)
+        gl.glVertex3f(rf_y[0], rf_y[1], rf_y[2])
         # Draw z-axis in blue
-        glColor3f(0.0, 0.0, 1.0)
-        glVertex3f(0, 0, 0)
-        glVertex3f(rf_z[0], rf_z[1], rf_z[2])
-        glEnd()
+        gl.glColor3f(0.0, 0.0, 1.0)
+        gl.glVertex3f(0, 0, 0)
+        gl.glVertex3f(rf_z[0], rf_z[1], rf_z[2])
+        gl.glEnd()
 
     def animate(self, quaternions_list, target_quaternion, time_step):
 
+        _import_interactive_modules()
+
         pygame.init()
-        pygame.display.set_mode((self.width, self.height), DOUBLEBUF|OPENGL)
+        pygame.display.set_mode((self.width, self.height), pygame.DOUBLEBUF | pygame.OPENGL)
 
         # Initialize OpenGL
-        glViewport(0, 0, self.width, self.height)
-        glMatrixMode(GL_PROJECTION)
-        glLoadIdentity()
-        gluPerspective(60, self.width / self.height, 0.1, 50.0)
+        gl.glViewport(0, 0, self.width, self.height)
+        gl.glMatrixMode(gl.GL_PROJECTION)
+        gl.glLoadIdentity()
+        glu.gluPerspective(60, self.width / self.height, 0.1, 50.0)
         # gluPerspective(45, self.width / self.height, 0.1, 50.0)
-        glMatrixMode(GL_MODELVIEW)
-        glLoadIdentity()
-        gluLookAt(0.5, 2, 3, 0, 0, 0, 0, 0, 1)
+        gl.glMatrixMode(gl.GL_MODELVIEW)
+        gl.glLoadIdentity()
+        glu.gluLookAt(0.5, 2, 3, 0, 0, 0, 0, 0, 1)
         # gluLookAt(3, 3, 3, 0, 0, 0, 0, 0, 1)
-        glEnable(GL_DEPTH_TEST)
+        gl.glEnable(gl.GL_DEPTH_TEST)
 
 
-        frames = list()
+        # stream frames to the writer, instead of keeping them in memory
+        writer = self._get_writer('cube_rotation.gif', 1 / time_step) if self.save_fig else None
 
-        q0, q1, q2, q3 = target_quaternion
-        target_rotation_matrix = np.array(
-            [
-                [1 - 2 * q2**2 - 2 * q3**2, 2 * q1 * q2 - 2 * q0 * q3, 2 * q1 * q3 + 2 * q0 * q2],
-                [2 * q1 * q2 + 2 * q0 * q3, 1 - 2 * q1**2 - 2 * q3**2, 2 * q2 * q3 - 2 * q0 * q1],
-                [2 * q1 * q3 - 2 * q0 * q2, 2 * q2 * q3 + 2 * q0 * q1, 1 - 2 * q1**2 - 2 * q2**2]
-            ],
-            dtype=np.float32
-        )
+        # get every rotation matrix at once
+        target_rotation_matrix = quat.to_rotation_matrix(target_quaternion).astype(np.float32)
+        rotation_matrices = quat.to_rotation_matrix(quaternions_list).astype(np.float32)
 
-        for quaternion in quaternions_list:
+        for rotation_matrix in rotation_matrices:
 
             for event in pygame.event.get():
-                if event.type == QUIT:
+                if event.type == pygame.QUIT:
                     pygame.quit()
                     quit()
 
-            q0, q1, q2, q3 = quaternion
-            rotation_matrix = np.array(
-                [
-                    [1 - 2 * q2**2 - 2 * q3**2, 2 * q1 * q2 - 2 * q0 * q3, 2 * q1 * q3 + 2 * q0 * q2],
-                    [2 * q1 * q2 + 2 * q0 * q3, 1 - 2 * q1**2 - 2 * q3**2, 2 * q2 * q3 - 2 * q0 * q1],
-                    [2 * q1 * q3 - 2 * q0 * q2, 2 * q2 * q3 + 2 * q0 * q1, 1 - 2 * q1**2 - 2 * q2**2]
-                ],
-                dtype=np.float32
-            )
-
             self._render_target_rf(target_rotation_matrix)
             self._render_fixed_rf(rotation_matrix)
             self._render_cube(rotation_matrix)
@@ -164,17 +302,16 @@ class Animation():
             pygame.display.flip()
             pygame.time.wait(int(time_step * 1000))
 
-            buffer = glReadPixels(0, 0, self.width, self.height, GL_RGB, GL_UNSIGNED_BYTE)
-            image = np.frombuffer(buffer, dtype=np.uint8).reshape(self.height, self.width, 3)
-            image = np.flipud(image)
-
-            if self.save_fig:
-                frames.append(image)
+            # read pixels back only when frames are saved
+            if writer is not None:
+                buffer = gl.glReadPixels(0, 0, self.width, self.height, gl.GL_RGB, gl.GL_UNSIGNED_BYTE)
+                image = np.frombuffer(buffer, dtype=np.uint8).reshape(self.height, self.width, 3)
+                writer.append_data(np.flipud(image))
 
-            glClear(GL_COLOR_BUFFER_BIT|GL_DEPTH_BUFFER_BIT)
+            gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
 
         pygame.quit()
 
-        if self.save_fig:
-            imageio.mimsave('cube_rotation.gif', frames, fps=1/time_step)
+        if writer is not None:
+            writer.close()
 
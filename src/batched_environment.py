@@ -0,0 +1,245 @@
+import numpy as np
+import quaternion as quat
+from gymnasium.vector import VectorEnv, AutoresetMode
+from gymnasium.vector.utils import batch_space
+from spacecraft import Spacecraft, ResetPool, sample_inertia_matrices
+from propagator import BatchedPropagator
+from observation_space import ObservationSpaceModel
+from action_space import ActionSpaceModel
+from reward import RewardModel
+from config import load_config
+
+
+class BatchedSpacecraftEnv(VectorEnv):
+
+    # terminated spacecraft are reset inside the step that terminates them
+    metadata = {"autoreset_mode": AutoresetMode.SAME_STEP}
+
+    def __init__(self, num_envs, config=None):
+
+        self.num_envs = num_envs
+
+        # parse config once and share it with every component
+        self.config = load_config(config)
+
+        self.spacecraft = Spacecraft(self.config)
+        self.propagator = BatchedPropagator(self.config)
+        self.observation_space_model = ObservationSpaceModel(self.config)
+        self.action_space_model = ActionSpaceModel(self.config)
+        self.reward_model = RewardModel(self.config)
+
+        self.n_skipped_frames = self.config.environment.n_skipped_frames
+
+        # without skipped frames, the previous frame is the previous step, tracked by the reward model itself
+        self.previous_frame_angular_errors = np.zeros(num_envs) if self.n_skipped_frames > 0 else None
+
+        # define single and batched observation spaces
+        self.single_observation_space = self.observation_space_model.get_observation_space()
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+
+        # define single and batched action spaces
+        self.single_action_space = self.action_space_model.get_action_space()
+        self.action_space = batch_space(self.single_action_space, num_envs)
+
+        # define random streams, one for each spacecraft, spawned from the config seed if requested.
+        # As for SpacecraftEnv, episodes are sampled from their own episode seeds, drawn from these streams
+        self._seed_lanes(self.config.environment.random_seed if self.config.environment.use_random_seed else None)
+
+        # define tensors of inertia and their inverses, each spacecraft gets its own inertia sample
+        self.inertia_matrices = np.zeros((num_envs, 3, 3))
+        self.inverse_inertia_matrices = np.zeros((num_envs, 3, 3))
+
+        for idx, rng in enumerate(self.lane_rngs):
+            self.inertia_matrices[idx], self.inverse_inertia_matrices[idx] = sample_inertia_matrices(
+                self.config.spacecraft.inertia,
+                1,
+                rng
+            )
+
+        self.resample_on_reset = self.config.spacecraft.inertia.resample_on_reset
+
+        # as for SpacecraftEnv, initial attitudes can be sampled in advance, with a reset pool for each spacecraft
+        reset_pool_size = self.config.spacecraft.attitude.reset_pool_size
+
+        if reset_pool_size > 0:
+            self.reset_pools = [ResetPool(self.spacecraft.attitude, reset_pool_size) for _ in range(num_envs)]
+        else:
+            self.reset_pools = None
+
+        # define batched observations, cast to the observation space dtype inside a single contiguous buffer
+        self.observations = np.zeros(self.observation_space.shape, dtype=self.observation_space.dtype)
+        self.reuse_observation_buffer = self.config.environment.reuse_observation_buffer
+
+        # define batched spacecraft states
+        self.states = np.zeros((num_envs, 7))
+        self.target_quaternions = np.zeros((num_envs, 4))
+        self.quaternion_errors = np.zeros((num_envs, 4))
+        self.angular_errors = np.zeros(num_envs)
+        self.current_times = np.zeros(num_envs)
+
+    def reset(self, seed=None, options=None):
+
+        # reseed the random streams of every spacecraft, if a seed is provided
+        if seed is not None:
+            self._seed_lanes(seed)
+
+        # reset every spacecraft of the batch
+        episode_seeds = self._reset_indices(np.arange(self.num_envs))
+
+        observations = self._get_observations()
+        infos = {
+            'episode_seed': episode_seeds,
+            '_episode_seed': np.ones(self.num_envs, dtype=bool),
+        }
+
+        return observations, infos
+
+    def step(self, actions):
+
+        actions = np.asarray(actions, dtype=np.float64).reshape(self.num_envs, 3)
+
+        # propagate spacecraft states
+        is_last_step = self._environment_step(actions)
+
+        # get environment observations
+        observations = self._get_observations()
+
+        # compute agent rewards
+        is_last_reward, rewards = self.reward_model.get_batch_reward(
+            self.quaternion_errors,
+            self.angular_errors,
+            self.states[:, 4:],
+            self.previous_frame_angular_errors
+        )
+
+        # check termination conditions
+        terminated = np.logical_or(is_last_reward, is_last_step)
+        truncated = np.zeros(self.num_envs, dtype=bool)
+
+        infos = {}
+
+        # autoreset terminated spacecraft, keeping their last observations inside infos
+        if np.any(terminated):
+
+            infos['final_obs'] = observations.copy()
+            infos['_final_obs'] = terminated.copy()
+
+            infos['episode_seed'] = self._reset_indices(np.flatnonzero(terminated))
+            infos['_episode_seed'] = terminated.copy()
+            observations = self._get_observations()
+
+        return observations, rewards, terminated, truncated, infos
+
+    def _get_observations(self):
+
+        np.copyto(self.observations, self.states)
+
+        if self.reuse_observation_buffer:
+            return self.observations
+
+        return self.observations.copy()
+
+    def _seed_lanes(self, seed):
+
+        self.lane_rngs = [np.random.default_rng(sequence) for sequence in np.random.SeedSequence(seed).spawn(self.num_envs)]
+
+    def _reset_indices(self, indices):
+
+        # episode seeds of every spacecraft, zero for the ones that are not reset
+        episode_seeds = np.zeros(self.num_envs, dtype=np.uint64)
+
+        for idx in indices:
+
+            # spacecraft are sampled one at a time, drawing from the same generator and in the same order as
+            # SpacecraftEnv, so that any episode can be replayed by a single environment with its episode seed
+            if self.reset_pools is not None:
+                episode_seed = self.reset_pools[idx].draw_episode_seed(self.lane_rngs[idx])
+            else:
+                episode_seed = int(self.lane_rngs[idx].integers(2**63))
+
+            rng = np.random.default_rng(episode_seed)
+            episode_seeds[idx] = episode_seed
+
+            # domain randomization: draw new tensors of inertia for the reset spacecraft only
+            if self.resample_on_reset:
+                self.inertia_matrices[idx], self.inverse_inertia_matrices[idx] = sample_inertia_matrices(
+                    self.config.spacecraft.inertia,
+                    1,
+                    rng
+                )
+
+            if self.reset_pools is not None:
+                quaternion, quaternion_error, angular_error = self.reset_pools[idx].get_sample(episode_seed)
+                self.states[idx, :4] = quaternion
+                self.states[idx, 4:] = self.config.spacecraft.attitude.initial_angular_velocity
+
+            else:
+                states, quaternion_errors, angular_errors = self.spacecraft.sample_initial_states(1, rng)
+                self.states[idx] = states[0]
+                quaternion_error, angular_error = quaternion_errors[0], angular_errors[0]
+
+            self.quaternion_errors[idx] = quaternion_error
+            self.angular_errors[idx] = angular_error
+
+        self.target_quaternions[indices] = self.config.spacecraft.attitude.target_quaternion
+        self.current_times[indices] = 0
+
+        # reset reward model rolling state
+        self.reward_model.reset_batch(self.angular_errors, indices)
+
+        return episode_seeds
+
+    def _environment_step(self, actions):
+
+        for frame in range(self.n_skipped_frames + 1):
+
+            if frame > 0:
+                actions = np.zeros((self.num_envs, 3))
+
+                # angular errors of the previous frame, compared by the rewards when frames are skipped
+                np.copyto(self.previous_frame_angular_errors, self.angular_errors)
+
+            # propagate spacecraft states
+            is_last_step, states, self.current_times = self.propagator.propagate(
+                self.states,
+                actions,
+                self.current_times,
+                self.inertia_matrices,
+                self.inverse_inertia_matrices
+            )
+
+            # update spacecraft states
+            self._update_states(states)
+
+        return is_last_step
+
+    def _update_states(self, states):
+
+        # normalize quaternions
+        quat.normalize(states[:, :4], out=states[:, :4])
+        self.states = states
+
+        # get Hamilton products between target quaternions and quaternion conjugates
+        quat.conjugate(self.states[:, :4], out=self.quaternion_errors)
+        quat.product(self.target_quaternions, self.quaternion_errors, out=self.quaternion_errors)
+
+        # update angular errors [deg]
+        quat.error_angle(self.quaternion_errors, out=self.angular_errors)
+
+
+if __name__ == "__main__":
+
+    import time
+
+    for num_envs in [1, 16, 256]:
+
+        env = BatchedSpacecraftEnv(num_envs)
+        env.reset()
+
+        t1 = time.time()
+        for i in range(200):
+            actions = env.action_space.sample()
+            env.step(actions)
+        t2 = time.time()
+
+        print(num_envs, num_envs * 200 / (t2 - t1))
@@ -0,0 +1,286 @@
+import math
+import traceback
+import multiprocessing as mp
+import numpy as np
+from environment import SpacecraftEnv
+from config import load_config
+
+
+# termination reasons of the episodes
+TIME_HORIZON = "time_horizon"
+REWARD_MODEL = "reward_model"
+MAX_STEPS = "max_steps"
+ERROR = "error"
+
+# statistics aggregated over the episodes of a campaign
+METRICS = ("final_angular_error", "settling_time", "control_effort", "total_reward", "n_steps")
+
+# number of failed episodes whose errors are kept by the campaign
+MAX_RECORDED_ERRORS = 100
+
+
+class RunningStatistics():
+    def __init__(self):
+
+        # streaming mean and variance with Welford updates, so that memory does not grow with the number of values
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, value):
+
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def summary(self):
+
+        if self.count == 0:
+            return {"count": 0, "mean": math.nan, "std": math.nan, "min": math.nan, "max": math.nan}
+
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "std": math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0,
+            "min": self.min,
+            "max": self.max,
+        }
+
+
+def run_episode(env, policy, episode_seed, settling_threshold=0.5, max_steps=None):
+
+    # randomized inertia and initial attitude are drawn from the episode seed only,
+    # so that every episode can be reproduced on its own. Simulation errors end the episode and are
+    # recorded with their traceback, while policy errors are raised, since they are bugs of the caller
+    try:
+        observation, _ = env.reset(options={"episode_seed": episode_seed})
+    except Exception as error:
+        return _get_error_result(error, 0)
+
+    total_reward = 0.0
+    n_steps = 0
+    terminated = False
+
+    while not terminated:
+
+        if max_steps is not None and n_steps == max_steps:
+            break
+
+        action = policy(observation)
+
+        try:
+            observation, reward, terminated, _, _ = env.step(action)
+        except Exception as error:
+            return _get_error_result(error, n_steps)
+
+        total_reward += reward
+        n_steps += 1
+
+    if not terminated:
+        termination_reason = MAX_STEPS
+    elif env.propagator.current_time >= env.propagator.time_horizon:
+        termination_reason = TIME_HORIZON
+    else:
+        termination_reason = REWARD_MODEL
+
+    time_steps = env.storage.time_steps
+    angular_errors = env.storage.angular_errors
+
+    # settling time: time of the first record after which the angular error stays below the threshold
+    is_outside = np.flatnonzero(angular_errors > settling_threshold)
+
+    if is_outside.size == 0:
+        settling_time = time_steps[0]
+    elif is_outside[-1] < time_steps.shape[0] - 1:
+        settling_time = time_steps[is_outside[-1] + 1]
+    else:
+        settling_time = math.nan
+
+    # control effort: integral of the action norm, each action being applied for one integration step
+    control_effort = np.sum(np.sqrt(np.sum(env.storage.actions**2, axis=1))) * env.propagator.integration_step
+
+    return {
+        "termination_reason": termination_reason,
+        "final_angular_error": float(angular_errors[-1]),
+        "settling_time": float(settling_time),
+        "control_effort": float(control_effort),
+        "total_reward": float(total_reward),
+        "n_steps": n_steps,
+    }
+
+
+def _get_error_result(error, n_steps):
+
+    return {
+        "termination_reason": ERROR,
+        "error": repr(error),
+        "traceback": traceback.format_exc(),
+        "error_step": n_steps,
+        **{metric: math.nan for metric in METRICS},
+    }
+
+
+# environment and policy of each pool worker, created once by the worker initializer
+_worker_env = None
+_worker_policy = None
+_worker_options = None
+
+
+def _init_worker(config, policy, settling_threshold, max_steps):
+
+    global _worker_env, _worker_policy, _worker_options
+
+    _worker_env = SpacecraftEnv(config)
+    _worker_policy = policy
+    _worker_options = (settling_threshold, max_steps)
+
+
+def _run_worker_episode(task):
+
+    episode_idx, episode_seed = task
+
+    return episode_idx, run_episode(_worker_env, _worker_policy, episode_seed, *_worker_options)
+
+
+class Campaign():
+    def __init__(self,
+        policy,
+        n_episodes,
+        config=None,
+        n_workers=None,
+        seed=None,
+        settling_threshold=0.5,
+        max_steps=None,
+        chunksize=1,
+        start_method=None
+    ):
+
+        # the policy maps observations to actions, it must be picklable unless n_workers is 0
+        self.policy = policy
+        self.n_episodes = n_episodes
+        self.n_workers = mp.cpu_count() if n_workers is None else n_workers
+        self.settling_threshold = settling_threshold
+        self.max_steps = max_steps
+        self.chunksize = chunksize
+        self.ctx = mp.get_context(start_method)
+
+        # every episode draws its own tensor of inertia, so that it is given by its episode seed alone
+        self.config = load_config(config).replace({"spacecraft": {"inertia": {"resample_on_reset": True}}})
+
+        # campaign root seed, its entropy is kept so that campaigns without seed can be reproduced too
+        self.seed_sequence = np.random.SeedSequence(seed)
+
+        self.reset()
+
+    def reset(self):
+
+        self.n_completed = 0
+        self.statistics = {metric: RunningStatistics() for metric in METRICS}
+        self.termination_reasons = dict()
+
+        # errors of the first failed episodes, by episode index
+        self.errors = dict()
+
+    @property
+    def progress(self):
+
+        return self.n_completed / self.n_episodes if self.n_episodes else 1.0
+
+    def get_episode_seed(self, episode_idx):
+
+        # drawn from the episode_idx-th child of the root seed sequence, independent of the workers.
+        # The episode can be replayed by any environment built with the campaign config, through
+        # env.reset(options={"episode_seed": episode_seed})
+        seed_sequence = np.random.SeedSequence(self.seed_sequence.entropy, spawn_key=(episode_idx,))
+
+        return int(seed_sequence.generate_state(1, np.uint64)[0] >> np.uint64(1))
+
+    def run_episode(self, episode_idx, env=None):
+
+        # run a single episode of the campaign inside the current process, e.g. to inspect an outlier
+        env = SpacecraftEnv(self.config) if env is None else env
+
+        return run_episode(
+            env,
+            self.policy,
+            self.get_episode_seed(episode_idx),
+            self.settling_threshold,
+            self.max_steps
+        )
+
+    def run(self, callback=None, callback_interval=100):
+
+        # episodes are aggregated as soon as they complete, the callback gets the campaign every
+        # callback_interval episodes, so that progress and partial summaries are available mid run
+        self.reset()
+
+        tasks = ((idx, self.get_episode_seed(idx)) for idx in range(self.n_episodes))
+
+        if self.n_workers == 0:
+            _init_worker(self.config, self.policy, self.settling_threshold, self.max_steps)
+            self._aggregate(map(_run_worker_episode, tasks), callback, callback_interval)
+
+        else:
+            with self.ctx.Pool(
+                self.n_workers,
+                initializer=_init_worker,
+                initargs=(self.config, self.policy, self.settling_threshold, self.max_steps)
+            ) as pool:
+                self._aggregate(pool.imap_unordered(_run_worker_episode, tasks, self.chunksize), callback, callback_interval)
+
+        return self.summary()
+
+    def summary(self):
+
+        return {
+            "n_episodes": self.n_episodes,
+            "n_completed": self.n_completed,
+            "seed_entropy": self.seed_sequence.entropy,
+            "termination_reasons": dict(self.termination_reasons),
+            "errors": dict(self.errors),
+            **{metric: statistics.summary() for metric, statistics in self.statistics.items()},
+        }
+
+    def _aggregate(self, results, callback, callback_interval):
+
+        for episode_idx, result in results:
+
+            reason = result["termination_reason"]
+            self.termination_reasons[reason] = self.termination_reasons.get(reason, 0) + 1
+
+            if reason == ERROR and len(self.errors) < MAX_RECORDED_ERRORS:
+                self.errors[episode_idx] = {key: result[key] for key in ("error", "traceback", "error_step")}
+
+            # undefined metrics, e.g. settling times of episodes never settled, are left out of the statistics
+            for metric, statistics in self.statistics.items():
+                if not math.isnan(result[metric]):
+                    statistics.update(result[metric])
+
+            self.n_completed += 1
+
+            if callback is not None and (self.n_completed % callback_interval == 0 or self.n_completed == self.n_episodes):
+                callback(self)
+
+
+if __name__ == "__main__":
+
+    import time
+
+    def zero_policy(observation):
+        return np.zeros(3)
+
+    def print_progress(campaign):
+        print(f"{campaign.progress:6.1%} {campaign.summary()['final_angular_error']}")
+
+    t1 = time.time()
+    campaign = Campaign(zero_policy, 16, n_workers=4, seed=0, max_steps=200)
+    summary = campaign.run(print_progress, callback_interval=4)
+    t2 = time.time()
+
+    print(summary)
+    print(t2 - t1)
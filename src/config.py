@@ -0,0 +1,325 @@
+import os
+import copy
+import dataclasses
+import functools
+import typing
+import tomli
+from integrators import FIXED_STEP_METHODS
+
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "configs", "config.toml")
+
+MODELS = ("model_1", "model_2")
+FRAMES = ("fixed", "rotating")
+SINKS = ("none", "memmap")
+ODES = ("quaternion",)
+INTEGRATION_METHODS = ("RK45", "RK23", "DOP853", "Radau", "BDF", "LSODA") + FIXED_STEP_METHODS
+
+
+def _check(condition, message):
+
+    if not condition:
+        raise ValueError(message)
+
+
+@dataclasses.dataclass(frozen=True)
+class ObservationSpaceConfig:
+    model: str
+
+    def __post_init__(self):
+        _check(self.model in MODELS, f"observation_space.model must be one of {MODELS}")
+
+
+@dataclasses.dataclass(frozen=True)
+class ActionSpaceConfig:
+    model: str
+
+    def __post_init__(self):
+        _check(self.model in MODELS, f"action_space.model must be one of {MODELS}")
+
+
+@dataclasses.dataclass(frozen=True)
+class RewardModelConfig:
+    model: str
+
+    def __post_init__(self):
+        _check(self.model in MODELS, f"reward_model.model must be one of {MODELS}")
+
+
+@dataclasses.dataclass(frozen=True)
+class StorageConfig:
+    sink: str
+    sink_directory: str
+    sink_chunk_size: int
+    sink_queue_size: int
+
+    def __post_init__(self):
+        _check(self.sink in SINKS, f"storage.sink must be one of {SINKS}")
+        _check(self.sink_chunk_size > 0, "storage.sink_chunk_size must be positive")
+        _check(self.sink_queue_size > 0, "storage.sink_queue_size must be positive")
+
+
+@dataclasses.dataclass(frozen=True)
+class EnvironmentConfig:
+    n_skipped_frames: int
+    fuse_skipped_frames: bool
+    use_random_seed: bool
+    random_seed: int
+    profile: bool
+    reuse_observation_buffer: bool
+    observation_space: ObservationSpaceConfig
+    action_space: ActionSpaceConfig
+    reward_model: RewardModelConfig
+    storage: StorageConfig
+
+    def __post_init__(self):
+        _check(self.n_skipped_frames >= 0, "environment.n_skipped_frames must be greater or equal to 0")
+        _check(self.random_seed >= 0, "environment.random_seed must be greater or equal to 0")
+
+
+@dataclasses.dataclass(frozen=True)
+class InertiaConfig:
+    moi: typing.Tuple[float, ...]
+    poi: typing.Tuple[float, ...]
+    use_random_moi: bool
+    use_random_poi: bool
+    random_moi_max: typing.Tuple[float, ...]
+    random_moi_min: typing.Tuple[float, ...]
+    random_poi_max: typing.Tuple[float, ...]
+    random_poi_min: typing.Tuple[float, ...]
+    resample_on_reset: bool
+
+    def __post_init__(self):
+        for name in ("moi", "poi", "random_moi_max", "random_moi_min", "random_poi_max", "random_poi_min"):
+            _check(len(getattr(self, name)) == 3, f"spacecraft.inertia.{name} must have 3 components")
+        _check(all(moi > 0 for moi in self.moi), "spacecraft.inertia.moi components must be positive")
+        _check(
+            all(low <= high for low, high in zip(self.random_moi_min, self.random_moi_max)),
+            "spacecraft.inertia.random_moi_min must not exceed random_moi_max"
+        )
+        _check(
+            all(low <= high for low, high in zip(self.random_poi_min, self.random_poi_max)),
+            "spacecraft.inertia.random_poi_min must not exceed random_poi_max"
+        )
+
+
+@dataclasses.dataclass(frozen=True)
+class AttitudeConfig:
+    representation: str
+    initial_angular_error_max: float
+    initial_angular_error_min: float
+    target_quaternion: typing.Tuple[float, ...]
+    initial_angular_velocity: typing.Tuple[float, ...]
+    reset_pool_size: int
+
+    def __post_init__(self):
+        _check(
+            0 <= self.initial_angular_error_min <= self.initial_angular_error_max <= 360,
+            "spacecraft.attitude initial angular errors must satisfy 0 <= min <= max <= 360"
+        )
+        _check(len(self.target_quaternion) == 4, "spacecraft.attitude.target_quaternion must have 4 components")
+        _check(
+            abs(sum(q**2 for q in self.target_quaternion) - 1) < 1e-6,
+            "spacecraft.attitude.target_quaternion must be a unit quaternion"
+        )
+        _check(len(self.initial_angular_velocity) == 3, "spacecraft.attitude.initial_angular_velocity must have 3 components")
+        _check(self.reset_pool_size >= 0, "spacecraft.attitude.reset_pool_size must be greater or equal to 0")
+
+
+@dataclasses.dataclass(frozen=True)
+class SpacecraftConfig:
+    inertia: InertiaConfig
+    attitude: AttitudeConfig
+
+
+@dataclasses.dataclass(frozen=True)
+class AttitudeDynamicsConfig:
+    ode: str
+
+    def __post_init__(self):
+        _check(self.ode in ODES, f"force_model.attitude_dynamics.ode must be one of {ODES}")
+
+
+@dataclasses.dataclass(frozen=True)
+class PerturbationsConfig:
+    n_constant_perturbations: int
+    constant_perturbations_amplitudes: typing.Tuple[typing.Tuple[float, ...], ...]
+    constant_perturbations_times: typing.Tuple[typing.Tuple[float, ...], ...]
+    constant_perturbation_frames: typing.Tuple[str, ...]
+    n_sinusoidal_perturbations: int
+    sinusoidal_perturbations_amplitudes: typing.Tuple[typing.Tuple[float, ...], ...]
+    sinusoidal_perturbations_periods: typing.Tuple[typing.Tuple[float, ...], ...]
+    sinusoidal_perturbations_frames: typing.Tuple[str, ...]
+
+    def __post_init__(self):
+        for prefix, names in (
+            ("constant", ("constant_perturbations_amplitudes", "constant_perturbations_times", "constant_perturbation_frames")),
+            ("sinusoidal", ("sinusoidal_perturbations_amplitudes", "sinusoidal_perturbations_periods", "sinusoidal_perturbations_frames")),
+        ):
+            n_perturbations = getattr(self, f"n_{prefix}_perturbations")
+            _check(n_perturbations >= 0, f"force_model.perturbations.n_{prefix}_perturbations must be greater or equal to 0")
+            for name in names:
+                _check(
+                    len(getattr(self, name)) >= n_perturbations,
+                    f"force_model.perturbations.{name} must define at least n_{prefix}_perturbations entries"
+                )
+        _check(
+            all(frame in FRAMES for frame in self.constant_perturbation_frames + self.sinusoidal_perturbations_frames),
+            f"force_model.perturbations frames must be one of {FRAMES}"
+        )
+
+
+@dataclasses.dataclass(frozen=True)
+class ForceModelConfig:
+    use_perturbations: bool
+    attitude_dynamics: AttitudeDynamicsConfig
+    perturbations: PerturbationsConfig
+
+
+@dataclasses.dataclass(frozen=True)
+class PropagatorConfig:
+    integration_step: float
+    time_horizon: float
+    integration_method: str
+    continuous_propagation: bool
+
+    def __post_init__(self):
+        _check(self.integration_step > 0, "propagator.integration_step must be positive")
+        _check(self.time_horizon > 0, "propagator.time_horizon must be positive")
+        _check(
+            self.integration_method in INTEGRATION_METHODS,
+            f"propagator.integration_method must be one of {INTEGRATION_METHODS}"
+        )
+        _check(
+            not (self.continuous_propagation and self.integration_method in FIXED_STEP_METHODS),
+            "propagator.continuous_propagation requires an adaptive integration_method"
+        )
+
+
+@dataclasses.dataclass(frozen=True)
+class Config:
+    environment: EnvironmentConfig
+    spacecraft: SpacecraftConfig
+    force_model: ForceModelConfig
+    propagator: PropagatorConfig
+
+    def to_dict(self):
+
+        return _to_dict(self)
+
+    def replace(self, overrides):
+
+        # get a new config object, with the provided (possibly partial) dictionary merged over this one
+        return config_from_dict(_merge(self.to_dict(), overrides))
+
+
+def load_config(config=None):
+
+    # accept a config object, a dictionary merged over the default config, a path to a toml file or None
+    if isinstance(config, Config):
+        return config
+
+    if config is None:
+        return default_config()
+
+    if isinstance(config, dict):
+        return default_config().replace(config)
+
+    if isinstance(config, (str, os.PathLike)):
+        return config_from_file(os.fspath(config))
+
+    raise TypeError(f"config must be a Config, a dict, a path or None, got {type(config).__name__}")
+
+
+@functools.lru_cache(maxsize=None)
+def default_config():
+
+    # the default config file is parsed only once per process
+    return config_from_file(DEFAULT_CONFIG_PATH)
+
+
+def config_from_file(path):
+
+    with open(path, "rb") as config_file:
+        return config_from_dict(tomli.load(config_file))
+
+
+def config_from_dict(data):
+
+    return _build(Config, data, "")
+
+
+def _build(cls, data, path):
+
+    if not isinstance(data, dict):
+        raise TypeError(f"config section '{path or 'root'}' must be a table")
+
+    fields = {field.name for field in dataclasses.fields(cls)}
+    unknown = set(data) - fields
+    missing = fields - set(data)
+
+    if unknown:
+        raise ValueError(f"unknown config keys in '{path or 'root'}': {sorted(unknown)}")
+    if missing:
+        raise ValueError(f"missing config keys in '{path or 'root'}': {sorted(missing)}")
+
+    hints = typing.get_type_hints(cls)
+
+    return cls(**{
+        name: _convert(hints[name], data[name], f"{path}.{name}" if path else name)
+        for name in fields
+    })
+
+
+def _convert(hint, value, path):
+
+    if dataclasses.is_dataclass(hint):
+        return _build(hint, value, path)
+
+    if typing.get_origin(hint) is tuple:
+
+        if not isinstance(value, (list, tuple)):
+            raise TypeError(f"config key '{path}' must be a list")
+
+        item_hint = typing.get_args(hint)[0]
+
+        return tuple(_convert(item_hint, item, f"{path}[{idx}]") for idx, item in enumerate(value))
+
+    # bool is a subclass of int, so it is checked separately
+    if hint is bool:
+        valid = isinstance(value, bool)
+    elif hint is float:
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+    elif hint is int:
+        valid = isinstance(value, int) and not isinstance(value, bool)
+    else:
+        valid = isinstance(value, hint)
+
+    if not valid:
+        raise TypeError(f"config key '{path}' must be of type {hint.__name__}, got {type(value).__name__}")
+
+    return hint(value)
+
+
+def _to_dict(value):
+
+    if dataclasses.is_dataclass(value):
+        return {field.name: _to_dict(getattr(value, field.name)) for field in dataclasses.fields(value)}
+
+    if isinstance(value, tuple):
+        return [_to_dict(item) for item in value]
+
+    return value
+
+
+def _merge(base, overrides):
+
+    merged = copy.deepcopy(base)
+
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+
+    return merged
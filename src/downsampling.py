@@ -0,0 +1,103 @@
+import numpy as np
+
+
+# shape preserving decimation of long time series, used to plot episodes with a bounded number of points.
+# Every function returns the sorted indices of the points to keep, always including the first and the last one
+
+
+def lttb_indices(x, y, n_points):
+
+    # largest triangle three buckets: the first and the last points are kept, the others are split into
+    # n_points - 2 buckets and, for each bucket, the point forming the largest triangle with the previously
+    # selected point and the mean point of the next bucket is kept
+    n = x.shape[0]
+
+    if n_points >= n or n_points < 3:
+        return np.arange(n)
+
+    edges = (np.arange(n_points - 1) * (n - 2) / (n_points - 2)).astype(int) + 1
+    edges[-1] = n - 1
+
+    indices = np.empty(n_points, dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    # mean points of every bucket, the last point is the mean of the bucket after the last one
+    bucket_lengths = np.diff(edges)
+    mean_x = np.append(np.add.reduceat(x[:-1], edges[:-1]) / bucket_lengths, x[-1])
+    mean_y = np.append(np.add.reduceat(y[:-1], edges[:-1]) / bucket_lengths, y[-1])
+
+    selected = 0
+
+    for bucket in range(n_points - 2):
+
+        start, end = edges[bucket], edges[bucket + 1]
+
+        # twice the triangle areas, the constant factor does not change the maximum
+        areas = np.abs(
+            (x[selected] - mean_x[bucket + 1]) * (y[start:end] - y[selected]) -
+            (x[selected] - x[start:end]) * (mean_y[bucket + 1] - y[selected])
+        )
+
+        selected = start + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+
+    return indices
+
+
+def min_max_indices(x, y, n_points):
+
+    # min-max bucketing: points are split into n_points / 2 buckets and, for each bucket,
+    # the points with the minimum and the maximum values are kept
+    n = x.shape[0]
+
+    if n_points >= n or n_points < 4:
+        return np.arange(n)
+
+    n_buckets = (n_points - 2) // 2
+    bucket_size = int(np.ceil((n - 2) / n_buckets))
+
+    # pad inner points so that every bucket has the same size, padding values are never selected
+    values = np.full(n_buckets * bucket_size, np.nan)
+    values[:n - 2] = y[1:-1]
+    values = values.reshape(n_buckets, bucket_size)
+
+    # buckets made only of padding values are dropped
+    is_valid = ~np.all(np.isnan(values), axis=1)
+    values = values[is_valid]
+    offsets = 1 + bucket_size * np.flatnonzero(is_valid)
+
+    indices = np.concatenate(
+        (
+            [0],
+            offsets + np.nanargmin(values, axis=1),
+            offsets + np.nanargmax(values, axis=1),
+            [n - 1]
+        )
+    )
+
+    return np.unique(indices)
+
+
+METHODS = {
+    "lttb": lttb_indices,
+    "min_max": min_max_indices,
+}
+
+
+def downsample(x, y, n_points, method="lttb"):
+
+    # y can be an array of shape (n,) or (n, m): each of the m series is decimated on its own,
+    # so a list of (x, y) pairs is returned, one for each series
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64).reshape(x.shape[0], -1)
+
+    series = list()
+
+    for column in range(y.shape[1]):
+
+        values = np.ascontiguousarray(y[:, column])
+        indices = METHODS[method](x, values, n_points)
+        series.append((x[indices], values[indices]))
+
+    return series
@@ -0,0 +1,409 @@
+import socket
+import struct
+import asyncio
+import concurrent.futures
+import numpy as np
+from environment import SpacecraftEnv
+from config import load_config
+
+
+# binary protocol: every request is a header (command, number of environments n) followed by a body whose size
+# is given by the command and n. Every response is a header (status, n) followed by the body of the command or,
+# if the status is ERROR, by an utf-8 error message of n bytes. Arrays are little endian and stored one after
+# the other, each one covering the n requested environments:
+#
+#   INFO   request: -                                   response: n_envs, observation size, action size (uint32)
+#   RESET  request: env ids (uint32), seeds (int64,     response: observations (float32, n x 7),
+#                   negative for no seed)                         episode seeds (uint64)
+#   STEP   request: env ids (uint32), actions           response: observations (float32, n x 7), rewards (float64),
+#                   (float32, n x 3)                              flags (uint8: terminated, truncated, error bits)
+#   CLOSE  request: -                                   no response, the connection is closed
+#
+# Non finite actions are rejected: the environment is not stepped and only its error bit is set
+INFO = 0
+RESET = 1
+STEP = 2
+CLOSE = 3
+
+OK = 0
+ERROR = 1
+
+TERMINATED = 1
+TRUNCATED = 2
+STEP_ERROR = 4
+
+HEADER = struct.Struct("<BI")
+INFO_BODY = struct.Struct("<III")
+
+OBSERVATION_SIZE = 7
+ACTION_SIZE = 3
+
+
+def get_request_body_size(command, n):
+
+    if command == RESET:
+        return n * (4 + 8)
+
+    if command == STEP:
+        return n * (4 + 4 * ACTION_SIZE)
+
+    return 0
+
+
+def get_response_body_size(command, n):
+
+    if command == INFO:
+        return INFO_BODY.size
+
+    if command == RESET:
+        return n * (4 * OBSERVATION_SIZE + 8)
+
+    if command == STEP:
+        return n * (4 * OBSERVATION_SIZE + 8 + 1)
+
+    return 0
+
+
+def encode_reset_request(env_ids, seeds=None):
+
+    env_ids = np.asarray(env_ids, dtype="<u4")
+    seeds = np.full(env_ids.shape[0], -1, dtype="<i8") if seeds is None else np.asarray(seeds, dtype="<i8")
+
+    return HEADER.pack(RESET, env_ids.shape[0]) + env_ids.tobytes() + seeds.tobytes()
+
+
+def encode_step_request(env_ids, actions):
+
+    env_ids = np.asarray(env_ids, dtype="<u4")
+    actions = np.asarray(actions, dtype="<f4").reshape(env_ids.shape[0], ACTION_SIZE)
+
+    return HEADER.pack(STEP, env_ids.shape[0]) + env_ids.tobytes() + actions.tobytes()
+
+
+def decode_response(command, n, body):
+
+    if command == INFO:
+        return INFO_BODY.unpack(body)
+
+    observations = np.frombuffer(body, dtype="<f4", count=n * OBSERVATION_SIZE).reshape(n, OBSERVATION_SIZE)
+    offset = 4 * OBSERVATION_SIZE * n
+
+    if command == RESET:
+        episode_seeds = np.frombuffer(body, dtype="<u8", count=n, offset=offset)
+        return observations, episode_seeds
+
+    rewards = np.frombuffer(body, dtype="<f8", count=n, offset=offset)
+    flags = np.frombuffer(body, dtype=np.uint8, count=n, offset=offset + 8 * n)
+
+    return (
+        observations,
+        rewards,
+        (flags & TERMINATED).astype(bool),
+        (flags & TRUNCATED).astype(bool),
+        (flags & STEP_ERROR).astype(bool)
+    )
+
+
+class EnvServer():
+    def __init__(self, n_envs, config=None, path=None, host="127.0.0.1", port=0):
+
+        # environments are hosted on a unix domain socket if a path is provided, on a tcp socket otherwise
+        self.n_envs = n_envs
+        self.config = load_config(config)
+        self.path = path
+        self.host = host
+        self.port = port
+
+        # every environment gets its own child stream of the config seed, from which its tensor of inertia is drawn,
+        # and writes its observations inside a row of a single (n_envs, 7) float32 array, from which responses are gathered
+        seed_sequences = np.random.SeedSequence(
+            self.config.environment.random_seed if self.config.environment.use_random_seed else None
+        ).spawn(n_envs)
+
+        self.envs = [SpacecraftEnv(self.config, seed_sequence) for seed_sequence in seed_sequences]
+        self.observations = np.zeros((n_envs, OBSERVATION_SIZE), dtype=np.float32)
+
+        for idx, env in enumerate(self.envs):
+            env.set_observation_buffer(self.observations[idx])
+
+        # environments are stepped by a single thread, outside the event loop, so that a long step does not
+        # stall the other connections and environments are never stepped concurrently
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+        self.server = None
+
+    @property
+    def address(self):
+
+        # address to connect the clients to, known once the server is started
+        if self.path is not None:
+            return self.path
+
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def start(self):
+
+        if self.path is not None:
+            self.server = await asyncio.start_unix_server(self._handle_connection, self.path)
+        else:
+            self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+
+        return self.address
+
+    async def serve_forever(self):
+
+        if self.server is None:
+            await self.start()
+
+        async with self.server:
+            await self.server.serve_forever()
+
+    def run(self):
+
+        asyncio.run(self.serve_forever())
+
+    def close(self):
+
+        if self.server is not None:
+            self.server.close()
+
+        self.executor.shutdown()
+
+        for env in self.envs:
+            env.close()
+
+    async def _handle_connection(self, reader, writer):
+
+        try:
+            while True:
+
+                try:
+                    command, n = HEADER.unpack(await reader.readexactly(HEADER.size))
+                except asyncio.IncompleteReadError:
+                    break
+
+                if command == CLOSE:
+                    break
+
+                # the body size of unknown commands is unknown too, so the connection cannot be kept
+                if command not in (INFO, RESET, STEP):
+                    writer.write(self._encode_error(f"unknown command {command}"))
+                    await writer.drain()
+                    break
+
+                # a request covers every environment at most once, larger bodies are never buffered. Since the body
+                # is not read, the connection cannot be kept
+                if n > self.n_envs:
+                    writer.write(self._encode_error(f"requests cover at most {self.n_envs} environments, got {n}"))
+                    await writer.drain()
+                    break
+
+                body = await reader.readexactly(get_request_body_size(command, n))
+
+                # any failure of the request is sent back to the client, the connection is kept
+                try:
+                    response = await asyncio.get_running_loop().run_in_executor(
+                        self.executor, self._handle_request, command, n, body
+                    )
+                except ValueError as error:
+                    response = self._encode_error(str(error))
+                except Exception as error:
+                    response = self._encode_error(repr(error))
+
+                writer.write(response)
+                await writer.drain()
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+        finally:
+            writer.close()
+
+    def _handle_request(self, command, n, body):
+
+        if command == INFO:
+            return HEADER.pack(OK, 0) + INFO_BODY.pack(self.n_envs, OBSERVATION_SIZE, ACTION_SIZE)
+
+        env_ids = np.frombuffer(body, dtype="<u4", count=n)
+
+        if n > 0 and env_ids.max() >= self.n_envs:
+            raise ValueError(f"environment ids must be lower than {self.n_envs}")
+
+        # an environment cannot be reset or stepped twice by the same request
+        if np.unique(env_ids).shape[0] != n:
+            raise ValueError("environment ids must be unique")
+
+        if command == RESET:
+            return self._reset(env_ids, np.frombuffer(body, dtype="<i8", count=n, offset=4 * n))
+
+        return self._step(env_ids, np.frombuffer(body, dtype="<f4", count=n * ACTION_SIZE, offset=4 * n).reshape(n, ACTION_SIZE))
+
+    def _reset(self, env_ids, seeds):
+
+        episode_seeds = np.zeros(env_ids.shape[0], dtype="<u8")
+
+        for idx, (env_id, seed) in enumerate(zip(env_ids.tolist(), seeds.tolist())):
+            _, info = self.envs[env_id].reset(seed=seed if seed >= 0 else None)
+            episode_seeds[idx] = info['episode_seed']
+
+        return HEADER.pack(OK, env_ids.shape[0]) + self.observations[env_ids].tobytes() + episode_seeds.tobytes()
+
+    def _step(self, env_ids, actions):
+
+        n = env_ids.shape[0]
+        rewards = np.zeros(n, dtype="<f8")
+        flags = np.zeros(n, dtype=np.uint8)
+
+        # non finite actions never reach the solver, which can loop forever on them
+        is_finite = np.all(np.isfinite(actions), axis=1)
+
+        for idx, env_id in enumerate(env_ids.tolist()):
+
+            if not is_finite[idx]:
+                flags[idx] = STEP_ERROR
+                continue
+
+            try:
+                _, reward, terminated, truncated, _ = self.envs[env_id].step(actions[idx].astype(np.float64))
+
+            except Exception:
+                # a failing environment is reported as truncated, the client is expected to reset it
+                flags[idx] = TRUNCATED | STEP_ERROR
+                continue
+
+            rewards[idx] = reward
+            flags[idx] = TERMINATED * bool(terminated) | TRUNCATED * bool(truncated)
+
+        return HEADER.pack(OK, n) + self.observations[env_ids].tobytes() + rewards.tobytes() + flags.tobytes()
+
+    def _encode_error(self, message):
+
+        message = message.encode("utf-8")
+
+        return HEADER.pack(ERROR, len(message)) + message
+
+
+class EnvClient():
+    def __init__(self, path=None, host="127.0.0.1", port=None):
+
+        # blocking client, e.g. for an inference process stepping a batch of environments per round trip
+        if path is not None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(path)
+        else:
+            self.socket = socket.create_connection((host, port))
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def info(self):
+
+        return self._request(INFO, HEADER.pack(INFO, 0))
+
+    def reset(self, env_ids, seeds=None):
+
+        return self._request(RESET, encode_reset_request(env_ids, seeds))
+
+    def step(self, env_ids, actions):
+
+        return self._request(STEP, encode_step_request(env_ids, actions))
+
+    def close(self):
+
+        try:
+            self.socket.sendall(HEADER.pack(CLOSE, 0))
+        except OSError:
+            pass
+
+        self.socket.close()
+
+    def _request(self, command, request):
+
+        self.socket.sendall(request)
+
+        status, n = HEADER.unpack(self._receive(HEADER.size))
+
+        if status == ERROR:
+            raise RuntimeError(self._receive(n).decode("utf-8"))
+
+        return decode_response(command, n, self._receive(get_response_body_size(command, n)))
+
+    def _receive(self, size):
+
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        received = 0
+
+        while received < size:
+            n_bytes = self.socket.recv_into(view[received:])
+            if n_bytes == 0:
+                raise ConnectionError("connection closed by the server")
+            received += n_bytes
+
+        return buffer
+
+
+class AsyncEnvClient():
+    def __init__(self, reader, writer):
+
+        # asyncio client, e.g. to run many concurrent clients inside a single process
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, path=None, host="127.0.0.1", port=None):
+
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+
+        return cls(reader, writer)
+
+    async def info(self):
+
+        return await self._request(INFO, HEADER.pack(INFO, 0))
+
+    async def reset(self, env_ids, seeds=None):
+
+        return await self._request(RESET, encode_reset_request(env_ids, seeds))
+
+    async def step(self, env_ids, actions):
+
+        return await self._request(STEP, encode_step_request(env_ids, actions))
+
+    async def close(self):
+
+        try:
+            self.writer.write(HEADER.pack(CLOSE, 0))
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+
+        self.writer.close()
+
+    async def _request(self, command, request):
+
+        self.writer.write(request)
+        await self.writer.drain()
+
+        status, n = HEADER.unpack(await self.reader.readexactly(HEADER.size))
+
+        if status == ERROR:
+            raise RuntimeError((await self.reader.readexactly(n)).decode("utf-8"))
+
+        return decode_response(command, n, await self.reader.readexactly(get_response_body_size(command, n)))
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="host SpacecraftEnv instances behind a local socket")
+    parser.add_argument("--n-envs", type=int, default=64, help="number of hosted environments")
+    parser.add_argument("--config", type=str, default=None, help="path of the config file")
+    parser.add_argument("--path", type=str, default=None, help="unix domain socket path, tcp is used if not provided")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="tcp host")
+    parser.add_argument("--port", type=int, default=5555, help="tcp port")
+    args = parser.parse_args()
+
+    server = EnvServer(args.n_envs, args.config, args.path, args.host, args.port)
+    server.run()
@@ -1,4 +1,3 @@
-import tomli
 import numpy as np
 from gymnasium import Env
 from spacecraft import Spacecraft
@@ -7,35 +6,84 @@ from storage import Storage
 from observation_space import ObservationSpaceModel
 from action_space import ActionSpaceModel
 from reward import RewardModel
+from profiler import StepProfiler
+from config import load_config
 
 
-# get config data
-with open("configs/config.toml", "rb") as config_file:
-    CFG = tomli.load(config_file)
+# layout of the compact buffers returned by SpacecraftEnv.get_state: quaternion, angular velocity, time,
+# target quaternion, tensor of inertia and its inverse (row major) and the previous angular error of the reward
+STATE_SLICES = {
+    "quaternion": slice(0, 4),
+    "angular_velocity": slice(4, 7),
+    "time": slice(7, 8),
+    "target_quaternion": slice(8, 12),
+    "inertia_matrix": slice(12, 21),
+    "inverse_inertia_matrix": slice(21, 30),
+    "previous_angular_error": slice(30, 31),
+}
+STATE_SIZE = 31
 
 
 class SpacecraftEnv(Env):
-    def __init__(self):
+    def __init__(self, config=None, rng=None):
 
-        self.spacecraft = Spacecraft()
-        self.propagator = Propagator()
-        self.storage = Storage()
-        self.observation_space_model = ObservationSpaceModel()
-        self.action_space_model = ActionSpaceModel()
-        self.reward_model = RewardModel()
+        # parse config once and share it with every component
+        self.config = load_config(config)
 
-        self.n_skipped_frames = CFG['environment']['n_skipped_frames']
+        # environment random stream, seeded by the config if requested, unless a stream is provided (anything accepted
+        # by np.random.default_rng, e.g. a child SeedSequence). It is given before the tensor of inertia is drawn.
+        # Every episode gets its own generator, seeded by an episode seed drawn from this stream, so that it can be
+        # replayed on its own
+        if rng is None:
+            rng = self.config.environment.random_seed if self.config.environment.use_random_seed else None
+
+        self.np_random = np.random.default_rng(rng)
+
+        self.spacecraft = Spacecraft(self.config, self.np_random)
+        self.propagator = Propagator(self.config)
+        self.storage = Storage(self.config)
+        self.observation_space_model = ObservationSpaceModel(self.config)
+        self.action_space_model = ActionSpaceModel(self.config)
+        self.reward_model = RewardModel(self.config)
+
+        self.n_skipped_frames = self.config.environment.n_skipped_frames
+        self.fuse_skipped_frames = self.config.environment.fuse_skipped_frames
+
+        # without skipped frames, the previous frame is the previous step, tracked by the reward model itself
+        self.previous_frame_angular_error = None
 
         # define observation space
         self.observation_space = self.observation_space_model.get_observation_space()
 
+        # observations are cast to the observation space dtype only once, writing them inside a preallocated
+        # buffer if requested, which can also be provided by the caller through set_observation_buffer
+        self.observation_buffer = None
+
+        if self.config.environment.reuse_observation_buffer:
+            self.observation_buffer = np.empty(self.observation_space.shape, dtype=self.observation_space.dtype)
+
         # define action space
         self.action_space = self.action_space_model.get_action_space()
 
-    def reset(self):
+        # define step profiler, disabled unless requested
+        self.profiler = None
+
+        if self.config.environment.profile:
+            self.enable_profiling()
+
+    def reset(self, seed=None, options=None):
+
+        # reseed the environment random stream, if a seed is provided
+        super().reset(seed=seed)
+
+        # draw the episode seed, unless an episode is replayed
+        episode_seed = None if options is None else options.get("episode_seed")
+
+        if episode_seed is None:
+            episode_seed = self.spacecraft.draw_episode_seed(self.np_random)
 
         # reset spacecraft object
-        self.spacecraft.reset()
+        self.spacecraft.reset(episode_seed)
 
         # reset propagator object
         self.propagator.reset()
@@ -48,8 +96,11 @@ class SpacecraftEnv(Env):
             self.spacecraft.attitude.angular_velocity
         )
 
+        # reset reward model rolling state
+        self.reward_model.reset(self.spacecraft.attitude.angular_error)
+
         observation = self._get_observation()
-        info = {}
+        info = {"episode_seed": episode_seed}
 
         return observation, info
 
@@ -62,7 +113,12 @@ class SpacecraftEnv(Env):
         observation = self._get_observation()
 
         # compute agent reward
-        is_last_reward, reward = self.reward_model.get_reward(self.storage)
+        is_last_reward, reward = self.reward_model.get_reward(
+            self.spacecraft.attitude.quaternion_error,
+            self.spacecraft.attitude.angular_error,
+            self.spacecraft.attitude.angular_velocity,
+            self.previous_frame_angular_error
+        )
 
         # check termination condition
         if is_last_reward or is_last_step:
@@ -72,13 +128,79 @@ class SpacecraftEnv(Env):
 
         info = {}
 
+        if self.profiler is not None:
+            info['profile'] = self.profiler.get_step_durations()
+
         return observation, reward, terminated, False, info
 
+    def get_state(self, out=None):
+
+        # snapshot of the minimal numeric states needed to resume the episode, written inside out if provided
+        if out is None:
+            out = np.empty(STATE_SIZE)
+
+        attitude = self.spacecraft.attitude
+        inertia = self.spacecraft.inertia
+
+        out[0:4] = attitude.current_quaternion
+        out[4:7] = attitude.angular_velocity
+        out[7] = self.propagator.current_time
+        out[8:12] = attitude.target_quaternion
+        out[12:21] = inertia.matrix.ravel()
+        out[21:30] = inertia.inverse_matrix.ravel()
+        out[30] = self.reward_model.previous_angular_error
+
+        return out
+
+    def set_state(self, state):
+
+        # restore a snapshot returned by get_state, e.g. to branch rollouts from the same states.
+        # Records are detached from the previous ones, i.e. a new episode starting at the restored time step
+        state = np.asarray(state, dtype=np.float64)
+        current_time = float(state[7])
+
+        self.spacecraft.attitude.set_states(state[0:4], state[4:7], state[8:12])
+        self.spacecraft.inertia.set_matrices(state[12:21], state[21:30])
+        self.propagator.set_time(current_time)
+
+        self.storage.reset(
+            self.spacecraft.attitude.current_quaternion,
+            self.spacecraft.attitude.quaternion_error,
+            self.spacecraft.attitude.angular_error,
+            self.spacecraft.attitude.angular_velocity,
+            current_time
+        )
+
+        self.reward_model.reset(state[30])
+
+        return self._get_observation()
+
+    def get_observation(self, out=None):
+
+        # current observation, written inside out if provided
+        if out is None:
+            return self._get_observation().copy()
+
+        return self.storage.get_env_states(out=out)
+
+    def set_observation_buffer(self, buffer):
+
+        # observations of every following step and reset are written inside the provided buffer,
+        # e.g. a row of a (N, 7) array shared by several environments
+        if buffer.shape != self.observation_space.shape or buffer.dtype != self.observation_space.dtype:
+            raise ValueError(
+                f"observation buffer must have shape {self.observation_space.shape} and dtype {self.observation_space.dtype}"
+            )
+
+        self.observation_buffer = buffer
+
     def render(self):
         pass
 
     def close(self):
-        pass
+
+        # close storage sink, if any
+        self.storage.close()
 
     def render_animation(self):
 
@@ -87,21 +209,68 @@ class SpacecraftEnv(Env):
             self.propagator.integration_step
         )
 
-    def plot_results(self):
+    def export_animation(self, path, fps=None, frame_stride=1):
+
+        # render the episode animation headlessly and write it to a video file, e.g. gif or mp4
+        return self.storage.export_animation(
+            self.spacecraft.attitude.target_quaternion,
+            self.propagator.integration_step,
+            path,
+            fps,
+            frame_stride
+        )
+
+    def enable_profiling(self):
+
+        if self.profiler is not None:
+            return
+
+        self.profiler = StepProfiler()
+
+        # replace the methods called during a step with timed versions of them,
+        # so that there is no overhead at all when profiling is disabled
+        self.step = self.profiler.wrap_step(self.step)
+        self._environment_step = self.profiler.wrap('environment_step', self._environment_step)
+        self._get_observation = self.profiler.wrap('observation', self._get_observation)
+        self.propagator.propagate = self.profiler.wrap('propagate', self.propagator.propagate)
+        self.propagator.propagate_frames = self.profiler.wrap('propagate', self.propagator.propagate_frames)
+        self.spacecraft.update_states = self.profiler.wrap('update_states', self.spacecraft.update_states)
+        self.spacecraft.update_frame_states = self.profiler.wrap('update_states', self.spacecraft.update_frame_states)
+        self.storage.update_records = self.profiler.wrap('update_records', self.storage.update_records)
+        self.storage.update_frame_records = self.profiler.wrap('update_records', self.storage.update_frame_records)
+        self.reward_model.get_reward = self.profiler.wrap('reward', self.reward_model.get_reward)
 
-        self.storage.plot_results()
+    def profile_report(self):
+
+        if self.profiler is None:
+            return "profiling is disabled"
+
+        return self.profiler.report()
+
+    def plot_results(self, max_points=2000, method="lttb", output_directory=None, show=True):
+
+        self.storage.plot_results(max_points, method, output_directory, show)
 
     def _get_observation(self):
 
-        return self.storage.get_env_states()
+        if self.observation_buffer is None:
+            return self.storage.get_env_states().astype(self.observation_space.dtype)
+
+        return self.storage.get_env_states(out=self.observation_buffer)
 
     def _environment_step(self, action):
 
+        if self.fuse_skipped_frames:
+            return self._fused_environment_step(action)
+
         for frame in range(self.n_skipped_frames + 1):
 
             if frame > 0:
                 action = np.array([0, 0, 0])
 
+                # angular error of the previous frame, compared by the rewards when frames are skipped
+                self.previous_frame_angular_error = self.spacecraft.attitude.angular_error
+
             # get spacecraft states
             states = self.spacecraft.get_prop_states()
 
@@ -109,7 +278,8 @@ class SpacecraftEnv(Env):
             is_last_step, ode_solution = self.propagator.propagate(
                 states,
                 action,
-                self.spacecraft.inertia.matrix
+                self.spacecraft.inertia.matrix,
+                self.spacecraft.inertia.inverse_matrix
             )
 
             # update spacecraft states
@@ -127,6 +297,45 @@ class SpacecraftEnv(Env):
 
         return is_last_step
 
+    def _fused_environment_step(self, action):
+
+        n_frames = self.n_skipped_frames + 1
+
+        # get spacecraft states
+        states = self.spacecraft.get_prop_states()
+
+        # propagate spacecraft states over every frame at once
+        is_last_step, time_steps, frame_states = self.propagator.propagate_frames(
+            states,
+            action,
+            n_frames,
+            self.spacecraft.inertia.matrix,
+            self.spacecraft.inertia.inverse_matrix
+        )
+
+        # update spacecraft states
+        quaternions, quaternion_errors, angular_errors = self.spacecraft.update_frame_states(frame_states)
+
+        # angular error of the previous frame, compared by the rewards when frames are skipped
+        if n_frames > 1:
+            self.previous_frame_angular_error = angular_errors[-2]
+
+        # the agent action is applied to the first frame only
+        actions = np.zeros((n_frames, 3))
+        actions[0] = action
+
+        # update records
+        self.storage.update_frame_records(
+            time_steps,
+            quaternions,
+            quaternion_errors,
+            angular_errors,
+            frame_states[:, 4:],
+            actions
+        )
+
+        return is_last_step
+
 
 if __name__ == "__main__":
 
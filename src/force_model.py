@@ -1,169 +1,336 @@
+import math
 import numpy as np
-import tomli
+import quaternion as quat
+from config import load_config
 
 
-# get config data
-with open("configs/config.toml", "rb") as config_file:
-    CFG = tomli.load(config_file)
+class PerturbationsModel():
+    def __init__(self, config=None):
 
+        config = load_config(config)
 
-class PerturbationsModel():
-    def __init__(self):
-        
-        self.n_constant_perturbations = CFG['force_model']['perturbations']['n_constant_perturbations']
-        self.constant_perturbations_amplitudes = CFG['force_model']['perturbations']['constant_perturbations_amplitudes']
-        self.constant_perturbations_times = CFG['force_model']['perturbations']['constant_perturbations_times']
-        self.constant_perturbation_frames = CFG['force_model']['perturbations']['constant_perturbation_frames']
-        self.n_sinusoidal_perturbations = CFG['force_model']['perturbations']['n_sinusoidal_perturbations']
-        self.sinusoidal_perturbations_amplitudes = CFG['force_model']['perturbations']['sinusoidal_perturbations_amplitudes']
-        self.sinusoidal_perturbations_periods = CFG['force_model']['perturbations']['sinusoidal_perturbations_periods']
-        self.sinusoidal_perturbations_frames = CFG['force_model']['perturbations']['sinusoidal_perturbations_frames']
-
-        self.torques = self._get_torques()
-
-    def _get_torques(self):
-
-        torques = {
-            'constant_perturbations_amplitudes': list(),
-            'constant_perturbations_times': list(),
-            'constant_perturbation_frames': list(),
-            'sinusoidal_perturbations_amplitudes': list(),
-            'sinusoidal_perturbations_frames': list()
-        }
+        self.n_constant_perturbations = config.force_model.perturbations.n_constant_perturbations
+        self.constant_perturbations_amplitudes = config.force_model.perturbations.constant_perturbations_amplitudes
+        self.constant_perturbations_times = config.force_model.perturbations.constant_perturbations_times
+        self.constant_perturbation_frames = config.force_model.perturbations.constant_perturbation_frames
+        self.n_sinusoidal_perturbations = config.force_model.perturbations.n_sinusoidal_perturbations
+        self.sinusoidal_perturbations_amplitudes = config.force_model.perturbations.sinusoidal_perturbations_amplitudes
+        self.sinusoidal_perturbations_periods = config.force_model.perturbations.sinusoidal_perturbations_periods
+        self.sinusoidal_perturbations_frames = config.force_model.perturbations.sinusoidal_perturbations_frames
 
-        # add constant perturbations
-        for idx in range(self.n_constant_perturbations):
+        self._compile_torques()
 
-            torques['constant_perturbations_amplitudes'].append(
-                self.constant_perturbations_amplitudes[idx]
-            )
+    def _compile_torques(self):
 
-            torques['constant_perturbations_times'].append(
-                self.constant_perturbations_times[idx]
-            )
+        amplitudes = list()
+        angular_frequencies = list()
+        time_windows = list()
+        frames = list()
+
+        # add constant perturbations, i.e. null angular frequencies inside their time windows
+        for idx in range(self.n_constant_perturbations):
 
-            torques['constant_perturbation_frames'].append(
-                self.constant_perturbation_frames[idx]
+            amplitudes.append(self.constant_perturbations_amplitudes[idx])
+            angular_frequencies.append([0, 0, 0])
+            time_windows.append(self.constant_perturbations_times[idx])
+            frames.append(self.constant_perturbation_frames[idx])
+
+        # add sinusoidal perturbations, always active. Components with non positive periods are null
+        for idx in range(self.n_sinusoidal_perturbations):
+
+            periods = np.array(self.sinusoidal_perturbations_periods[idx], dtype=np.float64)
+            has_period = periods > 0
+
+            amplitudes.append(np.where(has_period, self.sinusoidal_perturbations_amplitudes[idx], 0))
+            angular_frequencies.append(np.where(has_period, 2 * np.pi / np.where(has_period, periods, 1), 0))
+            time_windows.append([-np.inf, np.inf])
+            frames.append(self.sinusoidal_perturbations_frames[idx])
+
+        # define dense perturbations arrays
+        self.amplitudes = np.array(amplitudes, dtype=np.float64).reshape(-1, 3)
+        self.angular_frequencies = np.array(angular_frequencies, dtype=np.float64).reshape(-1, 3)
+        self.time_windows = np.array(time_windows, dtype=np.float64).reshape(-1, 2)
+        self.fixed_frame_mask = np.array([frame == 'fixed' for frame in frames], dtype=bool)
+        self.rotating_frame_mask = np.array([frame == 'rotating' for frame in frames], dtype=bool)
+
+        # flatten non null perturbation components, since null ones never contribute to the torques
+        terms = [
+            (k, axis)
+            for k in range(self.amplitudes.shape[0])
+            for axis in range(3)
+            if self.amplitudes[k, axis] != 0 and (self.fixed_frame_mask[k] or self.rotating_frame_mask[k])
+        ]
+
+        self.term_amplitudes = np.array([self.amplitudes[k, axis] for k, axis in terms], dtype=np.float64)
+        self.term_angular_frequencies = np.array([self.angular_frequencies[k, axis] for k, axis in terms], dtype=np.float64)
+        self.term_time_windows = np.array([self.time_windows[k] for k, _ in terms], dtype=np.float64).reshape(-1, 2)
+
+        # matrix summing every component by reference frame and axis:
+        # the first three rows give rotating frame torques, the last three fixed frame ones
+        self.term_weights = np.zeros((6, len(terms)))
+        for idx, (k, axis) in enumerate(terms):
+            self.term_weights[3 * int(self.fixed_frame_mask[k]) + axis, idx] = 1
+
+        # python tuples of the same components, used by the single state ode
+        self.scalar_terms = tuple(
+            (
+                float(self.term_time_windows[idx, 0]),
+                float(self.term_time_windows[idx, 1]),
+                3 * int(self.fixed_frame_mask[k]) + axis,
+                float(self.term_amplitudes[idx]),
+                float(self.term_angular_frequencies[idx])
             )
+            for idx, (k, axis) in enumerate(terms)
+        )
 
-        # add sinusoidal perturbations
-        for i in range(self.n_sinusoidal_perturbations):
+        # finite edges of the time windows, where torques are discontinuous
+        edges = self.term_time_windows.ravel()
+        self.discontinuities = np.unique(edges[np.isfinite(edges)])
 
-            perturbation_lambdas = list()
+    def torques(self, t, x):
 
-            for j in range(3):
-                if self.sinusoidal_perturbations_periods[i][j] > 0:
-                    perturbation_lambdas.append(
-                        lambda t, ii=i, jj=j: self.sinusoidal_perturbations_amplitudes[ii][jj] * np.cos(2 * np.pi * 1 / self.sinusoidal_perturbations_periods[ii][jj] * t)
-                    )
-                else:
-                    perturbation_lambdas.append(
-                        lambda t: 0
-                    )
+        # t can be a scalar or an array of shape (...), x an array of shape (..., 7).
+        # Components are stored along the first axis: (n_terms, ...)
+        t = np.asarray(t, dtype=np.float64)
+        term_shape = (-1,) + (1,) * t.ndim
 
-            torques['sinusoidal_perturbations_amplitudes'].append(perturbation_lambdas)
+        # compute every component, masking the ones outside their time windows
+        is_active = np.logical_and(
+            self.term_time_windows[:, 0].reshape(term_shape) <= t,
+            self.term_time_windows[:, 1].reshape(term_shape) >= t
+        )
+        components = np.cos(self.term_angular_frequencies.reshape(term_shape) * t)
+        components *= self.term_amplitudes.reshape(term_shape) * is_active
 
-            torques['sinusoidal_perturbations_frames'].append(
-                self.sinusoidal_perturbations_frames[i]
-            )
+        # sum components by reference frame and axis
+        torques = np.moveaxis(np.tensordot(self.term_weights, components, axes=1), 0, -1)
 
-        return torques
+        # rotate fixed frame torques into the spacecraft frame, i.e. torques @ R(q)
+        return torques[..., :3] + quat.rotate(x[..., :4], torques[..., 3:], inverse=True)
 
     def ode(self, t, x):
 
-        torques = np.array([0.0, 0.0, 0.0])
+        rx, ry, rz, fx, fy, fz = self._scalar_torques(t)
 
-        # build rotation matrix
-        rotation_matrix = np.array(
-            [
-                [1 - 2 * x[2]**2 - 2 * x[3]**2, 2 * x[1] * x[2] - 2 * x[0] * x[3], 2 * x[1] * x[3] + 2 * x[0] * x[2]],
-                [2 * x[1] * x[2] + 2 * x[0] * x[3], 1 - 2 * x[1]**2 - 2 * x[3]**2, 2 * x[2] * x[3] - 2 * x[0] * x[1]],
-                [2 * x[1] * x[3] - 2 * x[0] * x[2], 2 * x[2] * x[3] + 2 * x[0] * x[1], 1 - 2 * x[1]**2 - 2 * x[2]**2]
-            ],
-            dtype=np.float32
-        )
+        # rotate fixed frame torques into the spacecraft frame, i.e. torques @ R(q) as in quaternion.to_rotation_matrix.
+        # The matrix is written with python floats, since numpy calls dominate the cost of a single state ode
+        if fx or fy or fz:
+            q0, q1, q2, q3 = x[:4].tolist()
+            rx += (1 - 2 * q2**2 - 2 * q3**2) * fx + (2 * q1 * q2 + 2 * q0 * q3) * fy + (2 * q1 * q3 - 2 * q0 * q2) * fz
+            ry += (2 * q1 * q2 - 2 * q0 * q3) * fx + (1 - 2 * q1**2 - 2 * q3**2) * fy + (2 * q2 * q3 + 2 * q0 * q1) * fz
+            rz += (2 * q1 * q3 + 2 * q0 * q2) * fx + (2 * q2 * q3 - 2 * q0 * q1) * fy + (1 - 2 * q1**2 - 2 * q2**2) * fz
 
-        # compute constant disturbances
-        for idx, time_range in enumerate(self.torques['constant_perturbations_times']):
+        return (rx, ry, rz)
 
-            if time_range[0] <= t and time_range[1] >= t:
+    def jacobian(self, t, x):
 
-                if self.torques['constant_perturbation_frames'][idx] == 'rotating':
-                    torques += np.array(self.torques['constant_perturbations_amplitudes'][idx])
+        # derivatives of the torques with respect to the quaternion, only fixed frame torques depend on it
+        _, _, _, fx, fy, fz = self._scalar_torques(t)
 
-                elif self.torques['constant_perturbation_frames'][idx] == 'fixed':
-                    torque = np.array(self.torques['constant_perturbations_amplitudes'][idx])
-                    torques += np.dot(torque, rotation_matrix)
+        if not (fx or fy or fz):
+            return None
 
-        # compute sinusoidal disturbances
-        for idx, lambda_torque in enumerate(self.torques['sinusoidal_perturbations_amplitudes']):
+        q0, q1, q2, q3 = x[:4].tolist()
 
-            if self.torques['sinusoidal_perturbations_frames'][idx] == 'rotating':
-                torques += np.array(
-                    [
-                        lambda_torque[0](t),
-                        lambda_torque[1](t),
-                        lambda_torque[2](t)
-                    ]
-                )
+        return np.array(
+            [
+                [
+                    2 * q3 * fy - 2 * q2 * fz,
+                    2 * q2 * fy + 2 * q3 * fz,
+                    - 4 * q2 * fx + 2 * q1 * fy - 2 * q0 * fz,
+                    - 4 * q3 * fx + 2 * q0 * fy + 2 * q1 * fz
+                ],
+                [
+                    - 2 * q3 * fx + 2 * q1 * fz,
+                    2 * q2 * fx - 4 * q1 * fy + 2 * q0 * fz,
+                    2 * q1 * fx + 2 * q3 * fz,
+                    - 2 * q0 * fx - 4 * q3 * fy + 2 * q2 * fz
+                ],
+                [
+                    2 * q2 * fx - 2 * q1 * fy,
+                    2 * q3 * fx - 2 * q0 * fy - 4 * q1 * fz,
+                    2 * q0 * fx + 2 * q3 * fy - 4 * q2 * fz,
+                    2 * q1 * fx + 2 * q2 * fy
+                ],
+            ]
+        )
+
+    def _scalar_torques(self, t):
 
-            elif self.torques['sinusoidal_perturbations_frames'][idx] == 'fixed':
-                torque = np.array(
-                    [
-                        lambda_torque[0](t),
-                        lambda_torque[1](t),
-                        lambda_torque[2](t)
-                    ]
-                )
-                torques += np.dot(torque, rotation_matrix)
+        # for a single state, looping over the few compiled components is cheaper than numpy calls.
+        # Rotating frame torques are followed by fixed frame ones
+        torques = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+
+        for start_time, end_time, idx, amplitude, angular_frequency in self.scalar_terms:
+            if start_time <= t <= end_time:
+                torques[idx] += amplitude * math.cos(angular_frequency * t)
 
         return torques
 
+    def batch_ode(self, t, x):
+
+        return self.torques(t, x)
+
 
 class AttitudeDynamicsModel():
-    def __init__(self):
+    def __init__(self, config=None):
+
+        config = load_config(config)
 
         ode_map = {
             "quaternion": self.quaternion_ode
         }
 
-        self.ode = ode_map[CFG['force_model']['attitude_dynamics']['ode']]
-
-    def quaternion_ode(self, x, u, d, inertia_matrix):
+        jacobian_map = {
+            "quaternion": self.quaternion_jacobian
+        }
 
-        # get spacecraft angular velocity components
-        sc_w = np.array([x[4], x[5], x[6]])
+        batch_ode_map = {
+            "quaternion": self.batch_quaternion_ode
+        }
 
-        # get spacecraft quaternion matrix
-        sc_q_matrix = np.matrix(
-            [
-                [-x[1], -x[2], -x[3]],
-                [x[0], -x[3], x[2]],
-                [x[3], x[0], -x[1]],
-                [-x[2], x[1], x[0]]
-            ]
+        self.ode = ode_map[config.force_model.attitude_dynamics.ode]
+        self.jacobian = jacobian_map[config.force_model.attitude_dynamics.ode]
+        self.batch_ode = batch_ode_map[config.force_model.attitude_dynamics.ode]
+
+    def quaternion_ode(self, x, u, d, inertia_matrix, inverse_inertia_matrix, out=None):
+
+        if out is None:
+            out = np.empty(7)
+
+        # get spacecraft quaternion and angular velocity components as python floats,
+        # for 7 states scalar arithmetic is much cheaper than numpy calls
+        q0, q1, q2, q3, wx, wy, wz = x.tolist()
+        ux, uy, uz = u.tolist()
+        dx, dy, dz = d
+        (i00, i01, i02), (i10, i11, i12), (i20, i21, i22) = inertia_matrix.tolist()
+        (j00, j01, j02), (j10, j11, j12), (j20, j21, j22) = inverse_inertia_matrix.tolist()
+
+        # compute quaternion derivatives
+        out[0] = (- q1 * wx - q2 * wy - q3 * wz) / 2
+        out[1] = (q0 * wx - q3 * wy + q2 * wz) / 2
+        out[2] = (q3 * wx + q0 * wy - q1 * wz) / 2
+        out[3] = (- q2 * wx + q1 * wy + q0 * wz) / 2
+
+        # compute spacecraft angular momentum
+        hx = i00 * wx + i01 * wy + i02 * wz
+        hy = i10 * wx + i11 * wy + i12 * wz
+        hz = i20 * wx + i21 * wy + i22 * wz
+
+        # compute net torque: control + disturbances - gyroscopic term
+        tx = ux + dx - (wy * hz - wz * hy)
+        ty = uy + dy - (wz * hx - wx * hz)
+        tz = uz + dz - (wx * hy - wy * hx)
+
+        # compute angular velocity derivatives
+        out[4] = j00 * tx + j01 * ty + j02 * tz
+        out[5] = j10 * tx + j11 * ty + j12 * tz
+        out[6] = j20 * tx + j21 * ty + j22 * tz
+
+        return out
+
+    def quaternion_jacobian(self, x, u, d_jac, inertia_matrix, inverse_inertia_matrix, out=None):
+
+        if out is None:
+            out = np.empty((7, 7))
+
+        # as for the ode, scalar arithmetic is much cheaper than numpy calls for a 7x7 matrix
+        q0, q1, q2, q3, wx, wy, wz = x.tolist()
+        (i00, i01, i02), (i10, i11, i12), (i20, i21, i22) = inertia_matrix.tolist()
+        j0, j1, j2 = inverse_inertia_matrix.tolist()
+
+        # compute spacecraft angular momentum
+        hx = i00 * wx + i01 * wy + i02 * wz
+        hy = i10 * wx + i11 * wy + i12 * wz
+        hz = i20 * wx + i21 * wy + i22 * wz
+
+        # derivatives of the net torque with respect to the angular velocity: - d(w x Iw)/dw = [Iw]x - [w]x I
+        g0 = (wz * i10 - wy * i20, wz * i11 - wy * i21 - hz, wz * i12 - wy * i22 + hy)
+        g1 = (wx * i20 - wz * i00 + hz, wx * i21 - wz * i01, wx * i22 - wz * i02 - hx)
+        g2 = (wy * i00 - wx * i10 - hy, wy * i01 - wx * i11 + hx, wy * i02 - wx * i12)
+
+        # derivatives of the net torque with respect to the quaternion, not null only for attitude dependent disturbances
+        if d_jac is None:
+            d0 = d1 = d2 = (0.0, 0.0, 0.0, 0.0)
+        else:
+            d0, d1, d2 = d_jac.tolist()
+
+        out[:] = [
+            # derivatives of the quaternion derivatives
+            [0, - wx / 2, - wy / 2, - wz / 2, - q1 / 2, - q2 / 2, - q3 / 2],
+            [wx / 2, 0, wz / 2, - wy / 2, q0 / 2, - q3 / 2, q2 / 2],
+            [wy / 2, - wz / 2, 0, wx / 2, q3 / 2, q0 / 2, - q1 / 2],
+            [wz / 2, wy / 2, - wx / 2, 0, - q2 / 2, q1 / 2, q0 / 2],
+        ] + [
+            # derivatives of the angular velocity derivatives, i.e. the inverse inertia times the net torque ones
+            [j[0] * d0[k] + j[1] * d1[k] + j[2] * d2[k] for k in range(4)] +
+            [j[0] * g0[k] + j[1] * g1[k] + j[2] * g2[k] for k in range(3)]
+            for j in (j0, j1, j2)
+        ]
+
+        return out
+
+    def batch_quaternion_ode(self, x, u, d, inertia_matrices, inverse_inertia_matrices, out=None):
+
+        if out is None:
+            out = np.empty_like(x)
+
+        x_dot = out
+
+        # get spacecraft quaternion and angular velocity components
+        q0, q1, q2, q3 = x[:, 0], x[:, 1], x[:, 2], x[:, 3]
+        sc_w = x[:, 4:]
+        wx, wy, wz = sc_w[:, 0], sc_w[:, 1], sc_w[:, 2]
+
+        # compute quaternion derivatives
+        x_dot[:, 0] = (- q1 * wx - q2 * wy - q3 * wz) / 2
+        x_dot[:, 1] = (q0 * wx - q3 * wy + q2 * wz) / 2
+        x_dot[:, 2] = (q3 * wx + q0 * wy - q1 * wz) / 2
+        x_dot[:, 3] = (- q2 * wx + q1 * wy + q0 * wz) / 2
+
+        # compute angular velocity derivatives
+        sc_h = np.einsum('nij,nj->ni', inertia_matrices, sc_w)
+        x_dot[:, 4:] = np.einsum(
+            'nij,nj->ni',
+            inverse_inertia_matrices,
+            u + d - np.cross(sc_w, sc_h)
         )
 
-        # compute derivatives
-        sc_qe_dot = np.dot(sc_q_matrix, sc_w) / 2
-        sc_w_dot = - np.dot(inertia_matrix.I, np.cross(sc_w, np.dot(inertia_matrix.A, sc_w))) + \
-            np.dot(inertia_matrix.I, u) + np.dot(inertia_matrix.I, d)
-
-        x_dot = np.concatenate((sc_qe_dot.A, sc_w_dot.A), axis=None)
-
         return x_dot
 
 
 class ForceModel():
-    def __init__(self):
+    def __init__(self, config=None):
 
-        self.attitude_dynamics = AttitudeDynamicsModel()
-        self.perturbations = PerturbationsModel()
+        config = load_config(config)
+
+        self.attitude_dynamics = AttitudeDynamicsModel(config)
+        self.perturbations = PerturbationsModel(config)
         self.attitude_ode = self.attitude_dynamics.ode
         self.perturbations_ode = self.perturbations.ode
-        self.use_perturbations = CFG['force_model']['use_perturbations']
+        self.attitude_jacobian = self.attitude_dynamics.jacobian
+        self.perturbations_jacobian = self.perturbations.jacobian
+        self.batch_attitude_ode = self.attitude_dynamics.batch_ode
+        self.batch_perturbations_ode = self.perturbations.batch_ode
+        self.use_perturbations = config.force_model.use_perturbations
+
+        self.null_disturbances = (0.0, 0.0, 0.0)
+
+        # adaptive solvers must not step across these times, or they can skip short perturbations
+        if self.use_perturbations:
+            self.discontinuities = self.perturbations.discontinuities
+        else:
+            self.discontinuities = np.zeros(0)
 
-    def ode(self, t, x, u, inertia_matrix):
+    def get_discontinuities(self, t_start, t_end):
+
+        # times of the torque discontinuities strictly between t_start and t_end
+        idx_start = np.searchsorted(self.discontinuities, t_start, side="right")
+        idx_end = np.searchsorted(self.discontinuities, t_end, side="left")
+
+        return self.discontinuities[idx_start:idx_end]
+
+    def ode(self, t, x, u, inertia_matrix, inverse_inertia_matrix, out=None):
 
         if self.use_perturbations:
 
@@ -171,10 +338,40 @@ class ForceModel():
             disturbances = self.perturbations_ode(t, x)
 
         else:
-            disturbances = np.array([0, 0, 0])
+            disturbances = self.null_disturbances
 
         # compute spacecraft attitude
-        x_dot = self.attitude_ode(x, u, disturbances, inertia_matrix)
+        x_dot = self.attitude_ode(x, u, disturbances, inertia_matrix, inverse_inertia_matrix, out)
+
+        return x_dot
+
+    def jacobian(self, t, x, u, inertia_matrix, inverse_inertia_matrix, out=None):
+
+        if self.use_perturbations:
+
+            # compute derivatives of the torque disturbances with respect to the states
+            disturbances_jacobian = self.perturbations_jacobian(t, x)
+
+        else:
+            disturbances_jacobian = None
+
+        # compute the jacobian of the spacecraft attitude ode, used by implicit integration methods
+        jacobian = self.attitude_jacobian(x, u, disturbances_jacobian, inertia_matrix, inverse_inertia_matrix, out)
+
+        return jacobian
+
+    def batch_ode(self, t, x, u, inertia_matrices, inverse_inertia_matrices, out=None):
+
+        if self.use_perturbations:
+
+            # compute torque disturbances for every spacecraft of the batch
+            disturbances = self.batch_perturbations_ode(t, x)
+
+        else:
+            disturbances = np.zeros((x.shape[0], 3))
+
+        # compute spacecraft attitudes
+        x_dot = self.batch_attitude_ode(x, u, disturbances, inertia_matrices, inverse_inertia_matrices, out)
 
         return x_dot
 
@@ -0,0 +1,311 @@
+import numpy as np
+import quaternion as quat
+
+
+# classic 4th order Runge-Kutta tableau
+RK4_TABLEAU = {
+    "A": np.array(
+        [
+            [0, 0, 0, 0],
+            [1 / 2, 0, 0, 0],
+            [0, 1 / 2, 0, 0],
+            [0, 0, 1, 0]
+        ]
+    ),
+    "B": np.array([1 / 6, 1 / 3, 1 / 3, 1 / 6]),
+    "C": np.array([0, 1 / 2, 1 / 2, 1]),
+}
+
+# 8th order Runge-Kutta tableau, i.e. the 12 stages of the DOP853 method of Hairer et al. without error estimation.
+# Coefficients are those of the DOP853 Fortran code, also used by scipy
+RK8_A = np.zeros((12, 12))
+RK8_A[1, 0] = 5.26001519587677318785587544488e-2
+
+RK8_A[2, 0] = 1.97250569845378994544595329183e-2
+RK8_A[2, 1] = 5.91751709536136983633785987549e-2
+
+RK8_A[3, 0] = 2.95875854768068491816892993775e-2
+RK8_A[3, 2] = 8.87627564304205475450678981324e-2
+
+RK8_A[4, 0] = 2.41365134159266685502369798665e-1
+RK8_A[4, 2] = -8.84549479328286085344864962717e-1
+RK8_A[4, 3] = 9.24834003261792003115737966543e-1
+
+RK8_A[5, 0] = 3.7037037037037037037037037037e-2
+RK8_A[5, 3] = 1.70828608729473871279604482173e-1
+RK8_A[5, 4] = 1.25467687566822425016691814123e-1
+
+RK8_A[6, 0] = 3.7109375e-2
+RK8_A[6, 3] = 1.70252211019544039314978060272e-1
+RK8_A[6, 4] = 6.02165389804559606850219397283e-2
+RK8_A[6, 5] = -1.7578125e-2
+
+RK8_A[7, 0] = 3.70920001185047927108779319836e-2
+RK8_A[7, 3] = 1.70383925712239993810214054705e-1
+RK8_A[7, 4] = 1.07262030446373284651809199168e-1
+RK8_A[7, 5] = -1.53194377486244017527936158236e-2
+RK8_A[7, 6] = 8.27378916381402288758473766002e-3
+
+RK8_A[8, 0] = 6.24110958716075717114429577812e-1
+RK8_A[8, 3] = -3.36089262944694129406857109825
+RK8_A[8, 4] = -8.68219346841726006818189891453e-1
+RK8_A[8, 5] = 2.75920996994467083049415600797e1
+RK8_A[8, 6] = 2.01540675504778934086186788979e1
+RK8_A[8, 7] = -4.34898841810699588477366255144e1
+
+RK8_A[9, 0] = 4.77662536438264365890433908527e-1
+RK8_A[9, 3] = -2.48811461997166764192642586468
+RK8_A[9, 4] = -5.90290826836842996371446475743e-1
+RK8_A[9, 5] = 2.12300514481811942347288949897e1
+RK8_A[9, 6] = 1.52792336328824235832596922938e1
+RK8_A[9, 7] = -3.32882109689848629194453265587e1
+RK8_A[9, 8] = -2.03312017085086261358222928593e-2
+
+RK8_A[10, 0] = -9.3714243008598732571704021658e-1
+RK8_A[10, 3] = 5.18637242884406370830023853209
+RK8_A[10, 4] = 1.09143734899672957818500254654
+RK8_A[10, 5] = -8.14978701074692612513997267357
+RK8_A[10, 6] = -1.85200656599969598641566180701e1
+RK8_A[10, 7] = 2.27394870993505042818970056734e1
+RK8_A[10, 8] = 2.49360555267965238987089396762
+RK8_A[10, 9] = -3.0467644718982195003823669022
+
+RK8_A[11, 0] = 2.27331014751653820792359768449
+RK8_A[11, 3] = -1.05344954667372501984066689879e1
+RK8_A[11, 4] = -2.00087205822486249909675718444
+RK8_A[11, 5] = -1.79589318631187989172765950534e1
+RK8_A[11, 6] = 2.79488845294199600508499808837e1
+RK8_A[11, 7] = -2.85899827713502369474065508674
+RK8_A[11, 8] = -8.87285693353062954433549289258
+RK8_A[11, 9] = 1.23605671757943030647266201528e1
+RK8_A[11, 10] = 6.43392746015763530355970484046e-1
+
+RK8_B = np.zeros(12)
+RK8_B[0] = 5.42937341165687622380535766363e-2
+RK8_B[5] = 4.45031289275240888144113950566
+RK8_B[6] = 1.89151789931450038304281599044
+RK8_B[7] = -5.8012039600105847814672114227
+RK8_B[8] = 3.1116436695781989440891606237e-1
+RK8_B[9] = -1.52160949662516078556178806805e-1
+RK8_B[10] = 2.01365400804030348374776537501e-1
+RK8_B[11] = 4.47106157277725905176885569043e-2
+
+RK8_C = np.array(
+    [
+        0.0,
+        0.526001519587677318785587544488e-01,
+        0.789002279381515978178381316732e-01,
+        0.118350341907227396726757197510,
+        0.281649658092772603273242802490,
+        0.333333333333333333333333333333,
+        0.25,
+        0.307692307692307692307692307692,
+        0.651282051282051282051282051282,
+        0.6,
+        0.857142857142857142857142857142,
+        1.0,
+    ]
+)
+
+RK8_TABLEAU = {
+    "A": RK8_A,
+    "B": RK8_B,
+    "C": RK8_C,
+}
+
+FIXED_STEP_METHODS = ("rk4_fixed", "rk8_fixed", "euler_semi_implicit", "rkmk4_fixed")
+
+
+class FixedStepSolution():
+    def __init__(self):
+
+        # mimics the fields of the scipy OdeResult object used by the environment
+        self.t = np.zeros(2)
+        self.y = None
+        self.nfev = 0
+
+
+class FixedStepIntegrator():
+    def __init__(self, method):
+
+        # define mapping dictionary
+        self.step_method_map = {
+            "rk4_fixed": self._runge_kutta_step,
+            "rk8_fixed": self._runge_kutta_step,
+            "euler_semi_implicit": self._semi_implicit_euler_step,
+            "rkmk4_fixed": self._lie_group_step,
+        }
+
+        tableau_map = {
+            "rk4_fixed": RK4_TABLEAU,
+            "rk8_fixed": RK8_TABLEAU,
+            "euler_semi_implicit": None,
+            "rkmk4_fixed": RK4_TABLEAU,
+        }
+
+        self.method = method
+        self.step_method = self.step_method_map[method]
+        self.tableau = tableau_map[method]
+        self.n_stages = 2 if self.tableau is None else len(self.tableau["B"])
+
+        self.solution = FixedStepSolution()
+        self.states_shape = None
+
+    def integrate(self, fun, t, states, step, args=()):
+
+        # allocate buffers only when the shape of the propagated states changes
+        if states.shape != self.states_shape:
+            self._allocate_buffers(states.shape)
+
+        self.step_method(fun, t, states, step, args)
+
+        # update solution object
+        self.solution.t[0] = t
+        self.solution.t[1] = t + step
+        self.solution.nfev = self.n_stages
+
+        return self.solution
+
+    def _allocate_buffers(self, states_shape):
+
+        self.states_shape = states_shape
+        n_states = int(np.prod(states_shape))
+
+        # define stage derivatives, stage states and output states buffers
+        self.k = np.zeros((self.n_stages, n_states))
+        self.k_views = [k.reshape(states_shape) for k in self.k]
+        self.stage_states = np.zeros(n_states)
+        self.stage_states_view = self.stage_states.reshape(states_shape)
+        self.states = np.zeros(n_states)
+        self.states_view = self.states.reshape(states_shape)
+
+        # the scipy OdeResult stores states along the first axis and time along the last one
+        self.solution.y = self.states.reshape(states_shape + (1,))
+
+        # define Lie algebra buffers of the geometric methods, i.e. rotation vectors of shape (..., 3)
+        algebra_shape = states_shape[:-1] + (3,)
+        n_algebra = int(np.prod(algebra_shape))
+        self.algebra_k = np.zeros((self.n_stages, n_algebra))
+        self.algebra_k_views = [k.reshape(algebra_shape) for k in self.algebra_k]
+        self.rotation_vectors = np.zeros(n_algebra)
+        self.rotation_vectors_view = self.rotation_vectors.reshape(algebra_shape)
+        self.rotation_quaternions = np.zeros(states_shape[:-1] + (4,))
+
+    def _runge_kutta_step(self, fun, t, states, step, args):
+
+        a = self.tableau["A"]
+        b = self.tableau["B"]
+        c = self.tableau["C"]
+
+        flat_states = states.reshape(-1)
+
+        for stage in range(self.n_stages):
+
+            if stage == 0:
+                stage_states = states
+
+            else:
+                # y_i = y_0 + h * sum_j(a_ij * k_j)
+                np.dot(a[stage, :stage], self.k[:stage], out=self.stage_states)
+                self.stage_states *= step
+                self.stage_states += flat_states
+                stage_states = self.stage_states_view
+
+            fun(t + c[stage] * step, stage_states, *args, out=self.k_views[stage])
+
+        # y_1 = y_0 + h * sum_i(b_i * k_i)
+        np.dot(b, self.k, out=self.states)
+        self.states *= step
+        self.states += flat_states
+
+    def _semi_implicit_euler_step(self, fun, t, states, step, args):
+
+        # update angular velocity first, using the derivatives evaluated at the current states
+        fun(t, states, *args, out=self.k_views[0])
+        self.stage_states_view[...] = states
+        self.stage_states_view[..., 4:] += step * self.k_views[0][..., 4:]
+
+        # then update the quaternion, using the already updated angular velocity
+        fun(t, self.stage_states_view, *args, out=self.k_views[1])
+        self.states_view[...] = self.stage_states_view
+        self.states_view[..., :4] = states[..., :4] + step * self.k_views[1][..., :4]
+
+    def _lie_group_step(self, fun, t, states, step, args):
+
+        # Runge-Kutta-Munthe-Kaas step: quaternions are updated through the exponential map, q = q_0 * exp(theta / 2),
+        # with the body frame rotation vector theta integrated in the Lie algebra instead of the quaternion components,
+        # so that quaternions never leave the unit sphere. Angular velocities are integrated with the classic method
+        a = self.tableau["A"]
+        b = self.tableau["B"]
+        c = self.tableau["C"]
+
+        flat_states = states.reshape(-1)
+        quaternions = states[..., :4]
+
+        for stage in range(self.n_stages):
+
+            if stage == 0:
+                stage_states = states
+                self.rotation_vectors[:] = 0
+
+            else:
+                # w_i = w_0 + h * sum_j(a_ij * k_j), the linear combination of the quaternions is replaced below
+                np.dot(a[stage, :stage], self.k[:stage], out=self.stage_states)
+                self.stage_states *= step
+                self.stage_states += flat_states
+
+                # theta_i = h * sum_j(a_ij * dtheta_j), q_i = q_0 * exp(theta_i / 2)
+                np.dot(a[stage, :stage], self.algebra_k[:stage], out=self.rotation_vectors)
+                self.rotation_vectors *= step
+                self._exponential_update(quaternions, self.stage_states_view[..., :4])
+                stage_states = self.stage_states_view
+
+            fun(t + c[stage] * step, stage_states, *args, out=self.k_views[stage])
+
+            # rotation vector derivative, given by the inverse of the derivative of the exponential map
+            self._inverse_exponential_derivative(
+                self.rotation_vectors_view,
+                stage_states[..., 4:],
+                self.algebra_k_views[stage]
+            )
+
+        # w_1 = w_0 + h * sum_i(b_i * k_i)
+        np.dot(b, self.k, out=self.states)
+        self.states *= step
+        self.states += flat_states
+
+        # theta = h * sum_i(b_i * dtheta_i), q_1 = q_0 * exp(theta / 2)
+        np.dot(b, self.algebra_k, out=self.rotation_vectors)
+        self.rotation_vectors *= step
+        self._exponential_update(quaternions, self.states_view[..., :4])
+
+    def _exponential_update(self, quaternions, out):
+
+        quat.exp(self.rotation_vectors_view * 0.5, out=self.rotation_quaternions)
+        quat.product(quaternions, self.rotation_quaternions, out=out)
+
+    def _inverse_exponential_derivative(self, theta, w, out):
+
+        # dexp^-1(w) = w + theta x w / 2 + theta x (theta x w) / 12, truncated at the terms needed by 4th order methods.
+        # Single spacecraft states are handled with python floats, since numpy calls dominate their cost
+        if theta.ndim == 1:
+            theta_x, theta_y, theta_z = theta.tolist()
+            wx, wy, wz = w.tolist()
+        else:
+            theta_x, theta_y, theta_z = theta[..., 0], theta[..., 1], theta[..., 2]
+            wx, wy, wz = w[..., 0], w[..., 1], w[..., 2]
+
+        cx = theta_y * wz - theta_z * wy
+        cy = theta_z * wx - theta_x * wz
+        cz = theta_x * wy - theta_y * wx
+
+        rx = wx + cx / 2 + (theta_y * cz - theta_z * cy) / 12
+        ry = wy + cy / 2 + (theta_z * cx - theta_x * cz) / 12
+        rz = wz + cz / 2 + (theta_x * cy - theta_y * cx) / 12
+
+        if theta.ndim == 1:
+            out[:] = (rx, ry, rz)
+        else:
+            out[..., 0] = rx
+            out[..., 1] = ry
+            out[..., 2] = rz
@@ -1,15 +1,12 @@
-import tomli
 import numpy as np
 from gymnasium import spaces
-
-
-# get config data
-with open("configs/config.toml", "rb") as config_file:
-    CFG = tomli.load(config_file)
+from config import load_config
 
 
 class ObservationSpaceModel():
-    def __init__(self):
+    def __init__(self, config=None):
+
+        config = load_config(config)
 
         # define mapping dictionary
         self.observation_model_map = {
@@ -17,7 +14,7 @@ class ObservationSpaceModel():
             "model_2": self._model_2,
         }
 
-        self.model = CFG['environment']['observation_space']['model']
+        self.model = config.environment.observation_space.model
 
     def get_observation_space(self):
 
@@ -0,0 +1,143 @@
+import math
+import time
+import functools
+import numpy as np
+
+
+class StageHistogram():
+    def __init__(self, min_duration=1e-7, max_duration=1e2, growth_factor=1.05):
+
+        # log-spaced bins, each one growth_factor times wider than the previous one,
+        # so that memory does not grow with the number of recorded durations
+        self.min_duration = min_duration
+        self.log_growth_factor = math.log(growth_factor)
+        self.n_bins = int(math.ceil(math.log(max_duration / min_duration) / self.log_growth_factor)) + 1
+        self.bin_edges = min_duration * np.exp(self.log_growth_factor * np.arange(self.n_bins + 1))
+
+        self.reset()
+
+    def reset(self):
+
+        self.counts = [0] * self.n_bins
+        self.n_records = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+
+    def record(self, duration):
+
+        if duration > self.min_duration:
+            idx = min(int(math.log(duration / self.min_duration) / self.log_growth_factor), self.n_bins - 1)
+        else:
+            idx = 0
+
+        self.counts[idx] += 1
+        self.n_records += 1
+        self.total_duration += duration
+        self.max_duration = max(self.max_duration, duration)
+
+    def percentile(self, percent):
+
+        if self.n_records == 0:
+            return 0.0
+
+        # upper edge of the bin containing the requested percentile
+        cumulative_counts = np.cumsum(self.counts)
+        idx = int(np.searchsorted(cumulative_counts, percent / 100 * self.n_records))
+
+        return float(min(self.bin_edges[idx + 1], self.max_duration))
+
+    def summary(self):
+
+        return {
+            "count": self.n_records,
+            "total": self.total_duration,
+            "mean": self.total_duration / self.n_records if self.n_records else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max_duration,
+        }
+
+
+class StepProfiler():
+    def __init__(self):
+
+        self.histograms = dict()
+        self.step_durations = dict()
+        self.is_stepping = False
+
+    def reset(self):
+
+        for histogram in self.histograms.values():
+            histogram.reset()
+
+        self.step_durations = dict()
+
+    def wrap(self, stage, method):
+
+        # get a timed version of the provided method, recording its durations under the stage name
+        histogram = self.histograms.setdefault(stage, StageHistogram())
+
+        # stages are only timed inside a step, calls from reset or set_state are not recorded
+        @functools.wraps(method)
+        def timed_method(*args, **kwargs):
+            if not self.is_stepping:
+                return method(*args, **kwargs)
+            t_start = time.perf_counter()
+            result = method(*args, **kwargs)
+            duration = time.perf_counter() - t_start
+            histogram.record(duration)
+            self.step_durations[stage] = self.step_durations.get(stage, 0.0) + duration
+            return result
+
+        return timed_method
+
+    def wrap_step(self, method, stage="step"):
+
+        # get a timed version of the step method, inside which the stages are timed
+        histogram = self.histograms.setdefault(stage, StageHistogram())
+
+        @functools.wraps(method)
+        def timed_step(*args, **kwargs):
+            self.start_step()
+            t_start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                self.is_stepping = False
+            duration = time.perf_counter() - t_start
+            histogram.record(duration)
+            self.step_durations[stage] = duration
+            return result
+
+        return timed_step
+
+    def start_step(self):
+
+        # stages can be called several times per step (e.g. skipped frames), their durations are accumulated.
+        # Every step gets a new dict, so that durations returned by previous steps are never modified
+        self.step_durations = dict()
+        self.is_stepping = True
+
+    def get_step_durations(self):
+
+        return self.step_durations
+
+    def summary(self):
+
+        return {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+
+    def report(self):
+
+        lines = [
+            f"{'stage':<16}{'count':>10}{'total [s]':>12}{'mean [us]':>12}{'p50 [us]':>12}{'p90 [us]':>12}{'p99 [us]':>12}{'max [us]':>12}"
+        ]
+
+        for stage, summary in self.summary().items():
+            lines.append(
+                f"{stage:<16}{summary['count']:>10}{summary['total']:>12.3f}"
+                f"{summary['mean'] * 1e6:>12.1f}{summary['p50'] * 1e6:>12.1f}"
+                f"{summary['p90'] * 1e6:>12.1f}{summary['p99'] * 1e6:>12.1f}{summary['max'] * 1e6:>12.1f}"
+            )
+
+        return "\n".join(lines)
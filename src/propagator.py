@@ -1,29 +1,79 @@
-import tomli
 import numpy as np
 from force_model import ForceModel
-from scipy.integrate import solve_ivp
+from integrators import FixedStepIntegrator, FixedStepSolution, FIXED_STEP_METHODS
+from scipy.integrate import solve_ivp, RK45, RK23, DOP853, Radau, BDF, LSODA
+from config import load_config
+
+
+# integration methods that use the jacobian of the ode. LSODA is left out: it stays non stiff on these
+# dynamics, where it never evaluates the jacobian, and passing it only adds overhead to its steps
+IMPLICIT_METHODS = ("Radau", "BDF")
 
-# get config data
-with open("configs/config.toml", "rb") as config_file:
-    CFG = tomli.load(config_file)
 
 class Propagator():
-    def __init__(self):
+    def __init__(self, config=None):
 
-        self.integration_step = CFG['propagator']['integration_step']
-        self.time_horizon = CFG['propagator']['time_horizon']
-        self.integration_method = CFG['propagator']['integration_method']
-        self.force_model = ForceModel()
+        config = load_config(config)
+
+        self.integration_step = config.propagator.integration_step
+        self.time_horizon = config.propagator.time_horizon
+        self.integration_method = config.propagator.integration_method
+        self.force_model = ForceModel(config)
         self.current_time = None
+        self.null_action = np.zeros(3)
+
+        # provide the analytic jacobian to implicit methods, so that it is not estimated by finite differences
+        if self.integration_method in IMPLICIT_METHODS:
+            self.jacobian = self.force_model.jacobian
+        else:
+            self.jacobian = None
+
+        # use the in-house fixed step integrator instead of solve_ivp
+        if self.integration_method in FIXED_STEP_METHODS:
+            self.fixed_step_integrator = FixedStepIntegrator(self.integration_method)
+        else:
+            self.fixed_step_integrator = None
+
+        # keep a single solver object for the whole episode instead of calling solve_ivp at every step
+        self.continuous_propagation = config.propagator.continuous_propagation
+        self.solver_map = {
+            "RK45": RK45,
+            "RK23": RK23,
+            "DOP853": DOP853,
+            "Radau": Radau,
+            "BDF": BDF,
+            "LSODA": LSODA,
+        }
+        self.solver = None
+        self.solver_action = None
+        self.solver_step_size = None
+        self.dense_output = None
+        self.continuous_solution = FixedStepSolution()
 
     def reset(self):
         
         self.current_time = 0
 
-    def propagate(self, states, action, inertia_matrix):
+        # the solver is restarted at the beginning of every episode
+        self.solver = None
+        self.solver_step_size = None
+        self.dense_output = None
+
+    def set_time(self, current_time):
+
+        self.current_time = current_time
+
+        # the solver is restarted from the restored states, its step size estimate is kept
+        self.solver = None
+        self.dense_output = None
+
+    def propagate(self, states, action, inertia_matrix, inverse_inertia_matrix):
 
         # integrate ode
-        ode_solution = self._integrate_ode(states, action, inertia_matrix)
+        if self.continuous_propagation:
+            ode_solution = self._propagate_continuous(self.current_time, states, action, inertia_matrix, inverse_inertia_matrix)
+        else:
+            ode_solution = self._integrate_ode(self.current_time, states, action, inertia_matrix, inverse_inertia_matrix)
 
         # update current time
         self.current_time = ode_solution.t[-1]
@@ -36,24 +86,322 @@ class Propagator():
 
         return is_last_step, ode_solution
 
-    def _integrate_ode(self, states, action, inertia_matrix):
+    def propagate_frames(self, states, action, n_frames, inertia_matrix, inverse_inertia_matrix):
+
+        # the control is piecewise constant: the action is held over the first frame and null over the
+        # remaining ones, so a single solve per constant segment is enough. States are sampled at every frame
+        time_steps = self.current_time + self.integration_step * np.arange(1, n_frames + 1)
+        frame_states = np.empty((n_frames, states.shape[0]))
+
+        # integrate ode over the first frame
+        if self.continuous_propagation:
+            ode_solution = self._propagate_continuous(self.current_time, states, action, inertia_matrix, inverse_inertia_matrix)
+        else:
+            ode_solution = self._integrate_ode(self.current_time, states, action, inertia_matrix, inverse_inertia_matrix)
+
+        frame_states[0] = np.take(ode_solution.y, -1, -1)
+
+        # integrate ode over the skipped frames
+        if self.continuous_propagation:
+            for frame in range(1, n_frames):
+                ode_solution = self._propagate_continuous(
+                    time_steps[frame - 1],
+                    frame_states[frame - 1],
+                    self.null_action,
+                    inertia_matrix,
+                    inverse_inertia_matrix
+                )
+                frame_states[frame] = np.take(ode_solution.y, -1, -1)
+
+        elif n_frames > 1:
+            self._integrate_frames(frame_states, time_steps, inertia_matrix, inverse_inertia_matrix)
+
+        # update current time
+        self.current_time = time_steps[-1]
+
+        # check termination condition
+        if self.current_time >= self.time_horizon:
+            is_last_step = True
+        else:
+            is_last_step = False
+
+        return is_last_step, time_steps, frame_states
+
+    def _integrate_frames(self, frame_states, time_steps, inertia_matrix, inverse_inertia_matrix):
+
+        args = (self.null_action, inertia_matrix, inverse_inertia_matrix)
+
+        # fixed step methods take exactly one step per frame
+        if self.fixed_step_integrator is not None:
+
+            for frame in range(1, frame_states.shape[0]):
+                ode_solution = self._integrate_fixed_step(time_steps[frame - 1], frame_states[frame - 1], args)
+                frame_states[frame] = np.take(ode_solution.y, -1, -1)
+
+            return
+
+        # adaptive methods choose their own steps, frame states are interpolated at the requested times.
+        # Steps are limited to a frame, as for the frame by frame propagation, and the solve is split at the
+        # perturbation discontinuities, so that short perturbations are never stepped over
+        boundaries = np.concatenate(
+            ([time_steps[0]], self.force_model.get_discontinuities(time_steps[0], time_steps[-1]), [time_steps[-1]])
+        )
+
+        frame = 1
+        segment_states = frame_states[0]
+
+        for t_start, t_end in zip(boundaries[:-1], boundaries[1:]):
+
+            # frames inside the segment, plus its end if it is not a frame
+            last_frame = np.searchsorted(time_steps, t_end, side="right")
+            t_eval = time_steps[frame:last_frame]
+            has_end = t_eval.shape[0] > 0 and t_eval[-1] == t_end
+
+            ode_solution = solve_ivp(
+                fun=self.force_model.ode,
+                t_span=[t_start, t_end],
+                y0=segment_states,
+                method=self.integration_method,
+                t_eval=t_eval if has_end else np.append(t_eval, t_end),
+                args=args,
+                max_step=self.integration_step,
+                **self._get_solver_options()
+            )
+
+            frame_states[frame:last_frame] = ode_solution.y[:, :t_eval.shape[0]].T
+            segment_states = ode_solution.y[:, -1]
+            frame = last_frame
+
+    def _propagate_continuous(self, current_time, states, action, inertia_matrix, inverse_inertia_matrix):
+
+        # the control is a discontinuity of the ode, so the solver is restarted whenever the action changes.
+        # Otherwise, the provided states are ignored and the solver keeps integrating its own states
+        if self.solver is None or not np.array_equal(action, self.solver_action):
+            self._start_solver(current_time, states, action, inertia_matrix, inverse_inertia_matrix)
+
+        next_time = current_time + self.integration_step
+
+        # advance the solver until its last step covers the requested time. The solver is bounded by the next
+        # perturbation discontinuity, once reached it is restarted from there, so that no perturbation is stepped over
+        while self.solver.t < next_time:
+
+            if self.solver.status == "finished":
+                self._start_solver(self.solver.t, self.solver.y, self.solver_action, inertia_matrix, inverse_inertia_matrix)
+
+            message = self.solver.step()
+
+            if self.solver.status == "failed":
+                raise RuntimeError(f"continuous propagation failed at t={self.solver.t}: {message}")
+
+            self.dense_output = None
+
+        # sample the states at the requested time from the interpolant of the last step
+        if self.dense_output is None:
+            self.dense_output = self.solver.dense_output()
+
+        solution = self.continuous_solution
+        solution.t[0] = current_time
+        solution.t[1] = next_time
+        solution.y = self.dense_output(next_time).reshape(-1, 1)
+        solution.nfev = self.solver.nfev
+
+        return solution
+
+    def _start_solver(self, current_time, states, action, inertia_matrix, inverse_inertia_matrix):
+
+        # keep the step size reached by the previous solver, so that it is not estimated again
+        if self.solver is not None and self.solver.step_size is not None:
+            self.solver_step_size = self.solver.step_size
+
+        self.solver_action = np.array(action, dtype=np.float64)
+
+        # bind the held action, since scipy solver objects do not accept extra ode arguments
+        solver_action = self.solver_action
+        force_model = self.force_model
+
+        def ode(t, x):
+            return force_model.ode(t, x, solver_action, inertia_matrix, inverse_inertia_matrix)
+
+        solver_options = dict()
+
+        if self.jacobian is not None:
+            jacobian = self.jacobian
+            solver_options["jac"] = lambda t, x: jacobian(t, x, solver_action, inertia_matrix, inverse_inertia_matrix)
+
+        # integrate up to the next perturbation discontinuity, if any. Steps are not limited otherwise, the solver
+        # is restarted at the discontinuity, so that no perturbation is stepped over
+        discontinuities = self.force_model.get_discontinuities(current_time, np.inf)
+        t_bound = discontinuities[0] if discontinuities.shape[0] > 0 else np.inf
+
+        first_step = self.solver_step_size
+        if first_step is not None:
+            first_step = min(first_step, t_bound - current_time)
+
+        self.solver = self.solver_map[self.integration_method](
+            ode,
+            current_time,
+            np.array(states, dtype=np.float64),
+            t_bound,
+            first_step=first_step,
+            **solver_options
+        )
+        self.dense_output = None
+
+    def _integrate_ode(self, current_time, states, action, inertia_matrix, inverse_inertia_matrix):
+
+        if self.fixed_step_integrator is not None:
+            return self._integrate_fixed_step(current_time, states, (action, inertia_matrix, inverse_inertia_matrix))
 
         ode_solution = solve_ivp(
             fun=self.force_model.ode,
-            t_span=[self.current_time,self.current_time + self.integration_step],
+            t_span=[current_time, current_time + self.integration_step],
             y0=states,
             method=self.integration_method,
             dense_output=False,
-            args=(action, inertia_matrix)
+            args=(action, inertia_matrix, inverse_inertia_matrix),
+            **self._get_solver_options()
         )
 
         return ode_solution
 
+    def _integrate_fixed_step(self, current_time, states, args):
+
+        next_time = current_time + self.integration_step
+        discontinuities = self.force_model.get_discontinuities(current_time, next_time)
+
+        if discontinuities.shape[0] == 0:
+            return self.fixed_step_integrator.integrate(self.force_model.ode, current_time, states, self.integration_step, args=args)
+
+        # a step across a perturbation discontinuity is split there, so that no stage mixes the torques of both sides.
+        # Time windows include their edges, so every segment stops just before and restarts just after them
+        t_starts = np.concatenate(([current_time], np.nextafter(discontinuities, np.inf)))
+        t_ends = np.append(np.nextafter(discontinuities, -np.inf), next_time)
+        nfev = 0
+
+        for t_start, t_end in zip(t_starts, t_ends):
+            ode_solution = self.fixed_step_integrator.integrate(self.force_model.ode, t_start, states, t_end - t_start, args=args)
+            states = np.take(ode_solution.y, -1, -1).copy()
+            nfev += ode_solution.nfev
+
+        ode_solution.t[0] = current_time
+        ode_solution.t[1] = next_time
+        ode_solution.nfev = nfev
+
+        return ode_solution
+
+    def _get_solver_options(self):
+
+        # explicit methods warn about unused options, so the jacobian is passed only when it is used
+        if self.jacobian is None:
+            return {}
+
+        return {"jac": self.jacobian}
+
+
+class BatchedPropagator():
+    def __init__(self, config=None):
+
+        config = load_config(config)
+
+        self.integration_step = config.propagator.integration_step
+        self.time_horizon = config.propagator.time_horizon
+        self.integration_method = config.propagator.integration_method
+        self.force_model = ForceModel(config)
+        self.config = config
+
+        # use the in-house fixed step integrator instead of solve_ivp
+        if self.integration_method in FIXED_STEP_METHODS:
+            self.fixed_step_integrator = FixedStepIntegrator(self.integration_method)
+        else:
+            self.fixed_step_integrator = None
+
+        # single spacecraft propagator, used for the steps split at perturbation discontinuities
+        self.lane_propagator = None
+
+    def propagate(self, states, actions, current_times, inertia_matrices, inverse_inertia_matrices):
+
+        # integrate ode
+        ode_solution = self._integrate_ode(
+            states,
+            actions,
+            current_times,
+            inertia_matrices,
+            inverse_inertia_matrices
+        )
+
+        # get propagated states and times
+        next_states = np.take(ode_solution.y, -1, -1).reshape(states.shape)
+
+        # as for Propagator, fixed steps across a perturbation discontinuity are split there. Such steps are rare,
+        # the spacecraft crossing one are integrated again on their own
+        if self.fixed_step_integrator is not None and self.force_model.discontinuities.shape[0] > 0:
+
+            discontinuities = self.force_model.discontinuities
+            is_crossing = (
+                np.searchsorted(discontinuities, current_times, side="right") <
+                np.searchsorted(discontinuities, current_times + self.integration_step, side="left")
+            )
+
+            for idx in np.flatnonzero(is_crossing):
+
+                if self.lane_propagator is None:
+                    self.lane_propagator = Propagator(self.config)
+
+                lane_solution = self.lane_propagator._integrate_fixed_step(
+                    current_times[idx],
+                    states[idx],
+                    (actions[idx], inertia_matrices[idx], inverse_inertia_matrices[idx])
+                )
+                next_states[idx] = np.take(lane_solution.y, -1, -1)
+
+        states = next_states
+        current_times = current_times + ode_solution.t[-1]
+
+        # check termination condition
+        is_last_step = current_times >= self.time_horizon
+
+        return is_last_step, states, current_times
+
+    def _integrate_ode(self, states, actions, current_times, inertia_matrices, inverse_inertia_matrices):
+
+        n_states = states.shape
+
+        # every spacecraft of the batch is integrated over the same relative time span,
+        # starting from its own current time
+        def batch_ode(t, x, out=None):
+            return self.force_model.batch_ode(
+                current_times + t,
+                x.reshape(n_states),
+                actions,
+                inertia_matrices,
+                inverse_inertia_matrices,
+                None if out is None else out.reshape(n_states)
+            ).ravel()
+
+        if self.fixed_step_integrator is not None:
+            return self.fixed_step_integrator.integrate(
+                batch_ode,
+                0,
+                states,
+                self.integration_step
+            )
+
+        ode_solution = solve_ivp(
+            fun=batch_ode,
+            t_span=[0, self.integration_step],
+            y0=states.ravel(),
+            method=self.integration_method,
+            dense_output=False
+        )
+
+        return ode_solution
+
+
 if __name__ == "__main__":
 
     states = np.array([1, 0, 0, 0, 0, 0, 0])
     action = np.array([0, 0, 0.1])
-    inertia_matrix = np.matrix(
+    inertia_matrix = np.array(
         [
             [1, 0, 0],
             [0, 1, 0],
@@ -64,7 +412,7 @@ if __name__ == "__main__":
     prop = Propagator()
 
     prop.reset()
-    sol, b = prop.propagate(states, action, inertia_matrix)
+    b, sol = prop.propagate(states, action, inertia_matrix, np.linalg.inv(inertia_matrix))
 
     x = sol.y[0:-1]
     x1 = np.take(sol.y, -1, -1)
@@ -0,0 +1,219 @@
+import math
+import numpy as np
+
+# numba is an optional dependency, when available the hottest kernels are compiled as generalized ufuncs
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+# every function works on quaternions stored along the last axis, i.e. arrays of shape (..., 4),
+# using the scalar first convention q = [q0, q1, q2, q3]. Results are written inside out, if provided.
+# Single quaternions are handled with python floats, since numpy calls dominate their cost
+
+
+def product(p, q, out=None):
+
+    # Hamilton product p * q
+    if _product_kernel is not None:
+        return _product_kernel(p, q) if out is None else _product_kernel(p, q, out)
+
+    p = np.asarray(p, dtype=np.float64)
+    q = np.asarray(q, dtype=np.float64)
+
+    if out is None:
+        out = np.empty(np.broadcast_shapes(p.shape, q.shape))
+
+    if out.ndim == 1:
+        p0, p1, p2, p3 = p.tolist()
+        q0, q1, q2, q3 = q.tolist()
+    else:
+        p0, p1, p2, p3 = p[..., 0], p[..., 1], p[..., 2], p[..., 3]
+        q0, q1, q2, q3 = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+
+    # components are computed before being written, so that out can be one of the inputs
+    r0 = p0 * q0 - p1 * q1 - p2 * q2 - p3 * q3
+    r1 = p0 * q1 + p1 * q0 + p2 * q3 - p3 * q2
+    r2 = p0 * q2 - p1 * q3 + p2 * q0 + p3 * q1
+    r3 = p0 * q3 + p1 * q2 - p2 * q1 + p3 * q0
+
+    if out.ndim == 1:
+        out[:] = (r0, r1, r2, r3)
+    else:
+        out[..., 0] = r0
+        out[..., 1] = r1
+        out[..., 2] = r2
+        out[..., 3] = r3
+
+    return out
+
+
+def conjugate(q, out=None):
+
+    q = np.asarray(q, dtype=np.float64)
+
+    if out is None:
+        out = np.empty(q.shape)
+
+    if q.ndim == 1:
+        q0, q1, q2, q3 = q.tolist()
+        out[:] = (q0, - q1, - q2, - q3)
+        return out
+
+    out[..., 0] = q[..., 0]
+    np.negative(q[..., 1:], out=out[..., 1:])
+
+    return out
+
+
+def normalize(q, out=None):
+
+    if _normalize_kernel is not None:
+        return _normalize_kernel(q) if out is None else _normalize_kernel(q, out)
+
+    q = np.asarray(q, dtype=np.float64)
+
+    if q.ndim == 1:
+        q0, q1, q2, q3 = q.tolist()
+        return np.divide(q, math.sqrt(q0**2 + q1**2 + q2**2 + q3**2), out=out)
+
+    return np.divide(q, np.sqrt(np.sum(q**2, axis=-1, keepdims=True)), out=out)
+
+
+def to_rotation_matrix(q, out=None):
+
+    # rotation matrix of shape (..., 3, 3) mapping spacecraft frame vectors into the fixed frame
+    q = np.asarray(q, dtype=np.float64)
+
+    if out is None:
+        out = np.empty(q.shape[:-1] + (3, 3))
+
+    q0, q1, q2, q3 = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+
+    out[..., 0, 0] = 1 - 2 * q2**2 - 2 * q3**2
+    out[..., 0, 1] = 2 * q1 * q2 - 2 * q0 * q3
+    out[..., 0, 2] = 2 * q1 * q3 + 2 * q0 * q2
+    out[..., 1, 0] = 2 * q1 * q2 + 2 * q0 * q3
+    out[..., 1, 1] = 1 - 2 * q1**2 - 2 * q3**2
+    out[..., 1, 2] = 2 * q2 * q3 - 2 * q0 * q1
+    out[..., 2, 0] = 2 * q1 * q3 - 2 * q0 * q2
+    out[..., 2, 1] = 2 * q2 * q3 + 2 * q0 * q1
+    out[..., 2, 2] = 1 - 2 * q1**2 - 2 * q2**2
+
+    return out
+
+
+def rotate(q, v, inverse=False, out=None):
+
+    # rotate vectors of shape (..., 3) from the spacecraft frame into the fixed frame, i.e. R(q) v,
+    # or from the fixed frame into the spacecraft frame if inverse, i.e. v R(q).
+    # Uses v' = v + 2 q0 (r x v) + 2 r x (r x v), with r the vector part of q (negated if inverse)
+    q = np.asarray(q, dtype=np.float64)
+    v = np.asarray(v, dtype=np.float64)
+
+    if out is None:
+        out = np.empty(np.broadcast_shapes(q.shape[:-1] + (3,), v.shape))
+
+    sign = -1 if inverse else 1
+    q0, q1, q2, q3 = q[..., 0], sign * q[..., 1], sign * q[..., 2], sign * q[..., 3]
+    vx, vy, vz = v[..., 0], v[..., 1], v[..., 2]
+
+    cx = q2 * vz - q3 * vy
+    cy = q3 * vx - q1 * vz
+    cz = q1 * vy - q2 * vx
+
+    rx = vx + 2 * (q0 * cx + q2 * cz - q3 * cy)
+    ry = vy + 2 * (q0 * cy + q3 * cx - q1 * cz)
+    rz = vz + 2 * (q0 * cz + q1 * cy - q2 * cx)
+
+    out[..., 0] = rx
+    out[..., 1] = ry
+    out[..., 2] = rz
+
+    return out
+
+
+def error_angle(quaternion_error, out=None):
+
+    # angle [deg] of the rotation described by a quaternion error, in [0, 360]
+    quaternion_error = np.asarray(quaternion_error, dtype=np.float64)
+
+    if quaternion_error.ndim == 1 and out is None:
+        return math.degrees(2 * math.acos(min(max(float(quaternion_error[0]), -1.0), 1.0)))
+
+    return np.multiply(np.arccos(np.clip(quaternion_error[..., 0], -1, 1)), 360 / np.pi, out=out)
+
+
+def exp(v, out=None):
+
+    # exponential of the pure quaternion [0, v], with v of shape (..., 3): [cos|v|, sin|v| v / |v|].
+    # The unit quaternion of a rotation of angle phi about the unit axis n is exp(phi n / 2)
+    v = np.asarray(v, dtype=np.float64)
+
+    if out is None:
+        out = np.empty(v.shape[:-1] + (4,))
+
+    if v.ndim == 1:
+        vx, vy, vz = v.tolist()
+        norm = math.sqrt(vx**2 + vy**2 + vz**2)
+        sinc = math.sin(norm) / norm if norm > 0 else 1.0
+        out[:] = (math.cos(norm), vx * sinc, vy * sinc, vz * sinc)
+        return out
+
+    norm = np.sqrt(np.sum(v**2, axis=-1))
+
+    # sin(x) / x, well defined for null vectors
+    sinc = np.sinc(norm / np.pi)
+
+    out[..., 1:] = v * sinc[..., None]
+    np.cos(norm, out=out[..., 0])
+
+    return out
+
+
+def log(q, out=None):
+
+    # logarithm of unit quaternions, i.e. the inverse of exp: vectors of shape (..., 3) of norm in [0, pi]
+    q = np.asarray(q, dtype=np.float64)
+
+    if out is None:
+        out = np.empty(q.shape[:-1] + (3,))
+
+    vector_norm = np.sqrt(np.sum(q[..., 1:]**2, axis=-1))
+    angle = np.arctan2(vector_norm, q[..., 0])
+
+    # angle / |r|, which tends to 1 / q0 for null vector parts
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.where(vector_norm > 0, angle / vector_norm, 1 / q[..., 0])
+
+    np.multiply(q[..., 1:], scale[..., None], out=out)
+
+    return out
+
+
+_product_kernel = None
+_normalize_kernel = None
+
+if numba is not None:
+
+    @numba.guvectorize(["void(float64[:], float64[:], float64[:])"], "(n),(n)->(n)", nopython=True, cache=True)
+    def _product_kernel(p, q, out):
+
+        p0, p1, p2, p3 = p[0], p[1], p[2], p[3]
+        q0, q1, q2, q3 = q[0], q[1], q[2], q[3]
+
+        out[0] = p0 * q0 - p1 * q1 - p2 * q2 - p3 * q3
+        out[1] = p0 * q1 + p1 * q0 + p2 * q3 - p3 * q2
+        out[2] = p0 * q2 - p1 * q3 + p2 * q0 + p3 * q1
+        out[3] = p0 * q3 + p1 * q2 - p2 * q1 + p3 * q0
+
+    @numba.guvectorize(["void(float64[:], float64[:])"], "(n)->(n)", nopython=True, cache=True)
+    def _normalize_kernel(q, out):
+
+        norm = np.sqrt(q[0]**2 + q[1]**2 + q[2]**2 + q[3]**2)
+
+        out[0] = q[0] / norm
+        out[1] = q[1] / norm
+        out[2] = q[2] / norm
+        out[3] = q[3] / norm
@@ -1,14 +1,12 @@
-import tomli
+import math
 import numpy as np
-
-
-# get config data
-with open("configs/config.toml", "rb") as config_file:
-    CFG = tomli.load(config_file)
+from config import load_config
 
 
 class RewardModel():
-    def __init__(self):
+    def __init__(self, config=None):
+
+        config = load_config(config)
 
         # define mapping dictionary
         self.reward_model_map = {
@@ -16,27 +14,73 @@ class RewardModel():
             "model_2": self._model_2,
         }
 
-        self.model = CFG['environment']['reward_model']['model']
+        self.batch_reward_model_map = {
+            "model_1": self._batch_model_1,
+            "model_2": self._batch_model_2,
+        }
+
+        self.model = config.environment.reward_model.model
+
+        # rolling state: angular errors of the previous frame, the only history needed by the rewards.
+        # With skipped frames, the previous frame is provided by the environment, as it is not the previous step
+        self.previous_angular_error = None
+        self.previous_angular_errors = None
+
+    def reset(self, angular_error):
+
+        self.previous_angular_error = float(angular_error)
+
+    def reset_batch(self, angular_errors, indices):
+
+        # reset the rolling state of the provided spacecraft of the batch only
+        if self.previous_angular_errors is None or self.previous_angular_errors.shape != angular_errors.shape:
+            self.previous_angular_errors = np.array(angular_errors, dtype=np.float64)
+
+        self.previous_angular_errors[indices] = angular_errors[indices]
+
+    def get_reward(self, quaternion_error, angular_error, angular_velocity, previous_angular_error=None):
+
+        # single spacecraft states are handled with python floats, since numpy calls dominate their cost
+        angular_error = float(angular_error)
+        wx, wy, wz = angular_velocity.tolist()
+
+        is_last_reward, reward = self.reward_model_map[self.model](
+            quaternion_error.tolist(),
+            angular_error,
+            self.previous_angular_error if previous_angular_error is None else float(previous_angular_error),
+            math.sqrt(wx**2 + wy**2 + wz**2)
+        )
+
+        self.previous_angular_error = angular_error
+
+        return is_last_reward, reward
 
-    def get_reward(self, storage):
+    def get_batch_reward(self, quaternion_errors, angular_errors, angular_velocities, previous_angular_errors=None):
 
-        return self.reward_model_map[self.model](storage)
+        # quaternion errors, angular errors and angular velocities are arrays of shape (N, 4), (N,) and (N, 3)
+        is_last_reward, rewards = self.batch_reward_model_map[self.model](
+            quaternion_errors,
+            angular_errors,
+            self.previous_angular_errors if previous_angular_errors is None else previous_angular_errors,
+            np.sqrt(np.sum(angular_velocities**2, axis=1))
+        )
 
-    def _model_1(self, storage):
+        self.previous_angular_errors[:] = angular_errors
 
-        # get spacecraft angular velocity norm
-        sc_w_norm = np.sqrt(np.sum(storage.angular_velocities[-1]**2))
+        return is_last_reward, rewards
+
+    def _model_1(self, quaternion_error, angular_error, previous_angular_error, sc_w_norm):
 
         # if spacecraft angular velocity norm greater than threshold -> terminate episode
-        is_last_reward = bool(sc_w_norm > 0.5)
+        is_last_reward = sc_w_norm > 0.5
 
         if not is_last_reward:
 
             # check angular error
-            if storage.angular_errors[-1] > 0.5:
+            if angular_error > 0.5:
 
                 # if current angular error lower then previous -> discrete positive reward. Negative otherwise
-                if storage.angular_errors[-1] < storage.angular_errors[-2]:
+                if angular_error < previous_angular_error:
                     reward = 0.1
                 else:
                     reward = -0.1
@@ -44,29 +88,64 @@ class RewardModel():
             else:
 
                 # continuous reward, dependent on angular error
-                reward = np.dot(
-                    np.array([1, -1, -1, -1]),
-                    np.array(
-                        [
-                            storage.quaternion_errors[-1][0]**2,
-                            storage.quaternion_errors[-1][1]**2,
-                            storage.quaternion_errors[-1][2]**2,
-                            storage.quaternion_errors[-1][3]**2
-                        ]
-                    )
-                )
+                q0, q1, q2, q3 = quaternion_error
+                reward = q0**2 - q1**2 - q2**2 - q3**2
 
         else:
 
             # compute a termination reward if this is the last episode
-            if storage.angular_errors[-1] < 0.5:
+            if angular_error < 0.5:
                 reward = 10
             else:
                 reward = -10
 
         return is_last_reward, reward
 
-    def _model_2(self):
-        pass
+    def _batch_model_1(self, quaternion_errors, angular_errors, previous_angular_errors, sc_w_norms):
+
+        # if spacecraft angular velocity norm greater than threshold -> terminate episode
+        is_last_reward = sc_w_norms > 0.5
+
+        # discrete reward, positive if current angular error lower than previous one
+        rewards = np.where(angular_errors < previous_angular_errors, 0.1, -0.1)
+
+        # continuous reward, dependent on angular error
+        is_aligned = angular_errors <= 0.5
+        rewards[is_aligned] = quaternion_errors[is_aligned, 0]**2 - np.sum(quaternion_errors[is_aligned, 1:]**2, axis=1)
+
+        # compute a termination reward for the last episodes
+        rewards[is_last_reward] = np.where(angular_errors[is_last_reward] < 0.5, 10, -10)
+
+        return is_last_reward, rewards
+
+    def _model_2(self, quaternion_error, angular_error, previous_angular_error, sc_w_norm):
+
+        # if spacecraft angular velocity norm greater than threshold -> terminate episode with a penalty
+        if sc_w_norm > 0.5:
+            return True, -10
+
+        # dense shaped reward: attitude error cost, progress towards the target and angular velocity cost [deg -> 1/180]
+        reward = - angular_error / 180 + 10 * (previous_angular_error - angular_error) / 180 - 0.1 * sc_w_norm
+
+        # bonus while aligned with the target, dependent on angular error
+        if angular_error <= 0.5:
+            q0, q1, q2, q3 = quaternion_error
+            reward += q0**2 - q1**2 - q2**2 - q3**2
+
+        return False, reward
+
+    def _batch_model_2(self, quaternion_errors, angular_errors, previous_angular_errors, sc_w_norms):
+
+        # if spacecraft angular velocity norm greater than threshold -> terminate episode with a penalty
+        is_last_reward = sc_w_norms > 0.5
+
+        # dense shaped reward: attitude error cost, progress towards the target and angular velocity cost [deg -> 1/180]
+        rewards = - angular_errors / 180 + 10 * (previous_angular_errors - angular_errors) / 180 - 0.1 * sc_w_norms
+
+        # bonus while aligned with the target, dependent on angular error
+        is_aligned = angular_errors <= 0.5
+        rewards[is_aligned] += quaternion_errors[is_aligned, 0]**2 - np.sum(quaternion_errors[is_aligned, 1:]**2, axis=1)
 
+        rewards[is_last_reward] = -10
 
+        return is_last_reward, rewards
@@ -1,54 +1,105 @@
-import tomli
+import math
 import numpy as np
+import quaternion as quat
+from config import load_config
 
-# get config data
-with open("configs/config.toml", "rb") as config_file:
-    CFG = tomli.load(config_file)
 
+def sample_inertia_matrices(inertia_config, n, rng=None, max_rounds=1000):
 
-class Inertia():
-    def __init__(self):
+    # sample n tensors of inertia of shape (3, 3) at once, together with their inverses.
+    # Random tensors are physically valid: positive definite, with principal moments satisfying
+    # the triangle inequality. Invalid samples are drawn again, until every tensor is valid.
+    # rng is anything accepted by np.random.default_rng, e.g. a seed or a Generator
+    rng = np.random.default_rng(rng)
+    matrices = np.empty((n, 3, 3))
+    is_pending = np.ones(n, dtype=bool)
 
-        # define moments of inertia
-        if CFG['spacecraft']['inertia']['use_random_moi']:
+    for _ in range(max_rounds):
 
-            self.moi = list()
-            
-            for idx in range(3):
-                self.moi.append(np.random.uniform(
-                    CFG['spacecraft']['inertia']['random_moi_min'][idx],
-                    CFG['spacecraft']['inertia']['random_moi_max'][idx],
-                ))
+        idx = np.flatnonzero(is_pending)
 
+        # define moments of inertia
+        if inertia_config.use_random_moi:
+            moi = rng.uniform(inertia_config.random_moi_min, inertia_config.random_moi_max, (idx.size, 3))
         else:
-            self.moi = CFG['spacecraft']['inertia']['moi']
+            moi = np.broadcast_to(np.array(inertia_config.moi, dtype=np.float64), (idx.size, 3))
 
         # define products of inertia
-        if CFG['spacecraft']['inertia']['use_random_poi']:        
+        if inertia_config.use_random_poi:
+            poi = rng.uniform(inertia_config.random_poi_min, inertia_config.random_poi_max, (idx.size, 3))
+        else:
+            poi = np.broadcast_to(np.array(inertia_config.poi, dtype=np.float64), (idx.size, 3))
 
-            self.poi = list()
-            
-            for idx in range(3):
-                self.poi.append(np.random.uniform(
-                    CFG['spacecraft']['inertia']['random_poi_min'][idx],
-                    CFG['spacecraft']['inertia']['random_poi_max'][idx],
-                ))
+        candidates = _build_inertia_matrices(moi, poi)
 
+        # tensors defined by the config only are used as they are
+        if not (inertia_config.use_random_moi or inertia_config.use_random_poi):
+            is_valid = np.ones(idx.size, dtype=bool)
         else:
-            self.poi = CFG['spacecraft']['inertia']['poi']
-
-        # define tensor of inertia
-        self.matrix = np.matrix(
-            [
-                [self.moi[0], self.poi[0], self.poi[1]],
-                [self.poi[0], self.moi[1], self.poi[2]],
-                [self.poi[1], self.poi[2], self.moi[2]],
-            ]
-        )
+            is_valid = _is_valid_inertia_matrix(candidates)
+
+        matrices[idx[is_valid]] = candidates[is_valid]
+        is_pending[idx[is_valid]] = False
+
+        if not np.any(is_pending):
+            # the inverses are computed only once, since the dynamics need them at every ode evaluation
+            return matrices, np.linalg.inv(matrices)
+
+    raise ValueError("spacecraft.inertia random boundaries do not produce physically valid tensors of inertia")
+
+
+def _build_inertia_matrices(moi, poi):
+
+    # tensors of inertia of shape (n, 3, 3) from moments and products of inertia of shape (n, 3)
+    matrices = np.empty((moi.shape[0], 3, 3))
+
+    matrices[:, [0, 1, 2], [0, 1, 2]] = moi
+    matrices[:, [0, 1, 0, 2, 1, 2], [1, 0, 2, 0, 2, 1]] = poi[:, [0, 0, 1, 1, 2, 2]]
+
+    return matrices
+
+
+def _is_valid_inertia_matrix(matrices):
+
+    # principal moments of inertia in ascending order
+    principal_moi = np.linalg.eigvalsh(matrices)
+
+    return (principal_moi[:, 0] > 0) & (principal_moi[:, 0] + principal_moi[:, 1] >= principal_moi[:, 2])
+
+
+class Inertia():
+    def __init__(self, config=None, rng=None):
+
+        self.config = load_config(config)
+
+        # define tensor of inertia and its inverse
+        self.resample(rng)
+
+    def resample(self, rng=None):
+
+        # draw a new tensor of inertia, if random, and precompute its inverse
+        matrices, inverse_matrices = sample_inertia_matrices(self.config.spacecraft.inertia, 1, rng)
+        self.set_matrices(matrices[0], inverse_matrices[0])
+
+    def set_matrices(self, matrix, inverse_matrix):
+
+        # restore a tensor of inertia together with its inverse, so that no inversion is needed
+        self.matrix = np.array(matrix, dtype=np.float64).reshape(3, 3)
+        self.inverse_matrix = np.array(inverse_matrix, dtype=np.float64).reshape(3, 3)
+
+        m = self.matrix.ravel().tolist()
+        self.moi = [m[0], m[4], m[8]]
+        self.poi = [m[1], m[2], m[5]]
 
 
 class Attitude():
-    def __init__(self):
+    def __init__(self, config=None):
+
+        self.config = load_config(config)
+
+        # initial attitudes can be sampled in advance, many at once
+        self.reset_pool_size = self.config.spacecraft.attitude.reset_pool_size
+        self.reset_pool = ResetPool(self, self.reset_pool_size) if self.reset_pool_size > 0 else None
 
         self.angular_velocity = None
         self.target_quaternion = None
@@ -56,7 +107,9 @@ class Attitude():
         self.quaternion_error = None
         self.angular_error = None
 
-    def init_states(self):
+    def init_states(self, rng=None, episode_seed=None):
+
+        rng = np.random.default_rng(rng)
 
         # get initial angular velocity
         self._init_angular_velocity()
@@ -65,7 +118,7 @@ class Attitude():
         self._init_target_quaternion()
 
         # get initial quaternion
-        self._init_quaternion()
+        self._init_quaternion(rng, episode_seed)
 
     def update_states(self, states):
 
@@ -73,13 +126,41 @@ class Attitude():
         self.angular_velocity = states[4:]
 
         # normalize and update quaternion
-        self.current_quaternion = self._normalize_quaternion(states[0:4])
+        self.current_quaternion = quat.normalize(states[0:4])
 
         # update quaternion error
         self.quaternion_error = self._get_quaternion_error(self.current_quaternion)
 
         # update angular error
-        self.angular_error = self._get_angular_error(self.quaternion_error)
+        self.angular_error = quat.error_angle(self.quaternion_error)
+
+    def update_frame_states(self, frame_states):
+
+        # normalize quaternions of every frame
+        quaternions = quat.normalize(frame_states[:, :4])
+
+        # get quaternion and angular errors of every frame
+        quaternion_errors = self._get_quaternion_error(quaternions)
+        angular_errors = quat.error_angle(quaternion_errors)
+
+        # the current states are the ones of the last frame
+        self.angular_velocity = frame_states[-1, 4:]
+        self.current_quaternion = quaternions[-1]
+        self.quaternion_error = quaternion_errors[-1]
+        self.angular_error = angular_errors[-1]
+
+        return quaternions, quaternion_errors, angular_errors
+
+    def set_states(self, quaternion, angular_velocity, target_quaternion):
+
+        # restore states, copying them so that they never share memory with the provided arrays
+        self.target_quaternion = np.array(target_quaternion, dtype=np.float64)
+        self.angular_velocity = np.array(angular_velocity, dtype=np.float64)
+        self.current_quaternion = np.array(quaternion, dtype=np.float64)
+
+        # errors are not stored, since they are given by the quaternions
+        self.quaternion_error = self._get_quaternion_error(self.current_quaternion)
+        self.angular_error = quat.error_angle(self.quaternion_error)
 
     def get_states(self):
 
@@ -95,90 +176,200 @@ class Attitude():
 
     def _init_angular_velocity(self):
 
-        self.angular_velocity = np.array(CFG['spacecraft']['attitude']['initial_angular_velocity'])
+        self.angular_velocity = np.array(self.config.spacecraft.attitude.initial_angular_velocity)
 
     def _init_target_quaternion(self):
         
-        self.target_quaternion = np.array(CFG['spacecraft']['attitude']['target_quaternion'])
+        self.target_quaternion = np.array(self.config.spacecraft.attitude.target_quaternion)
+
+    def _init_quaternion(self, rng, episode_seed):
+
+        if self.reset_pool is not None:
+
+            # pooled attitudes are given by the episode seed, drawn from the pool if not provided
+            if episode_seed is None:
+                episode_seed = self.reset_pool.draw_episode_seed(rng)
+
+            quaternion, quaternion_error, angular_error = self.reset_pool.get_sample(episode_seed)
+
+        else:
+            quaternions, quaternion_errors, angular_errors = self._sample_quaternions(1, rng)
+            quaternion, quaternion_error, angular_error = quaternions[0], quaternion_errors[0], angular_errors[0]
+
+        # store quaternions
+        self.current_quaternion = quaternion
+        self.quaternion_error = quaternion_error
+        self.angular_error = angular_error
+
+    def sample_initial_states(self, n, rng=None):
+
+        # sample n initial states at once, with their quaternion and angular errors
+        quaternions, quaternion_errors, angular_errors = self._sample_quaternions(n, np.random.default_rng(rng))
+
+        states = np.empty((n, 7))
+        states[:, :4] = quaternions
+        states[:, 4:] = self.config.spacecraft.attitude.initial_angular_velocity
+
+        return states, quaternion_errors, angular_errors
+
+    def _sample_quaternions(self, n, rng):
 
-    def _init_quaternion(self):
+        # define maximum and minimum initial angular error boundaries [rad]
+        max_error = np.deg2rad(self.config.spacecraft.attitude.initial_angular_error_max)
+        min_error = np.deg2rad(self.config.spacecraft.attitude.initial_angular_error_min)
+        target_quaternion = np.array(self.config.spacecraft.attitude.target_quaternion, dtype=np.float64)
 
-        # define maximum and minimum initial angular error boundaries
-        max_error = CFG['spacecraft']['attitude']['initial_angular_error_max']
-        min_error = CFG['spacecraft']['attitude']['initial_angular_error_min']
+        # for attitudes uniformly distributed on SO(3), the error angle phi in [0, 2pi] has density
+        # proportional to sin(phi/2)^2, i.e. cumulative distribution proportional to phi - sin(phi).
+        # Error angles are sampled inside the boundaries by inverting it
+        angular_errors = self._invert_error_distribution(
+            rng.uniform(min_error - np.sin(min_error), max_error - np.sin(max_error), n),
+            min_error,
+            max_error
+        )
+
+        # rotation axes uniformly distributed on the unit sphere
+        axes = rng.normal(size=(n, 3))
+        axes /= np.sqrt(np.sum(axes**2, axis=1, keepdims=True))
+
+        # quaternion errors given by the axis-angle pairs
+        quaternion_errors = quat.exp(axes * (angular_errors / 2)[:, None])
 
-        while True:
+        # since q_e = q_t * conj(q), the quaternion is q = conj(q_e) * q_t
+        quaternions = quat.product(quat.conjugate(quaternion_errors), target_quaternion)
 
-            # generate a random initial quaternion
-            raw_quaternion = 2 * np.random.random_sample((1, 4))[0] - 1
+        return quaternions, quaternion_errors, np.rad2deg(angular_errors)
 
-            # normalize the quaterion
-            unit_quaternion = self._normalize_quaternion(raw_quaternion)
+    def _invert_error_distribution(self, values, min_error, max_error):
 
-            # compute the quaternion error
-            quaternion_error = self._get_quaternion_error(unit_quaternion)
+        # solve phi - sin(phi) = value with newton iterations, falling back to bisection
+        # whenever an iteration leaves the bracket (the derivative vanishes at phi = 0).
+        # Single values are handled with python floats, since numpy calls dominate their cost
+        if values.shape == (1,):
+            return np.array([self._invert_error_value(float(values[0]), float(min_error), float(max_error))])
 
-            # get angular error [deg]
-            angular_error = self._get_angular_error(quaternion_error)
+        low = np.full(values.shape, min_error)
+        high = np.full(values.shape, max_error)
+        angles = np.clip(np.cbrt(6 * values), low, high)
 
-            # verify that the angular error between the initial and the target quaternion is within the provided boundaries
-            if angular_error >= min_error and angular_error <= max_error:
+        for _ in range(50):
+
+            residuals = angles - np.sin(angles) - values
+
+            if np.all(np.abs(residuals) < 1e-13):
                 break
 
-        # store quaternions
-        self.current_quaternion = unit_quaternion
-        self.quaternion_error = quaternion_error
-        self.angular_error = angular_error
+            np.copyto(high, angles, where=residuals > 0)
+            np.copyto(low, angles, where=residuals <= 0)
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                angles = angles - residuals / (1 - np.cos(angles))
+
+            is_outside = ~((angles > low) & (angles < high))
+            angles[is_outside] = (low[is_outside] + high[is_outside]) / 2
+
+        return angles
+
+    def _invert_error_value(self, value, low, high):
+
+        angle = min(max((6 * value)**(1 / 3), low), high)
+
+        for _ in range(50):
+
+            residual = angle - math.sin(angle) - value
+
+            if abs(residual) < 1e-13:
+                break
+
+            if residual > 0:
+                high = angle
+            else:
+                low = angle
 
-    def _normalize_quaternion(self, quaternion):
+            derivative = 1 - math.cos(angle)
+            angle = angle - residual / derivative if derivative > 0 else low
 
-        quaternion_norm = np.sqrt(np.sum(quaternion**2))
-        unit_quaternion = quaternion / quaternion_norm
+            if not low < angle < high:
+                angle = (low + high) / 2
 
-        return unit_quaternion
+        return angle
 
     def _get_quaternion_error(self, quaternion):
 
-        # get quaternion conjugate
-        q_conj = np.array(
-            [
-                quaternion[0],
-                - quaternion[1],
-                - quaternion[2],
-                - quaternion[3]
-            ]
-        )
+        # Hamilton product between the target quaternion and the quaternion conjugate
+        return quat.product(self.target_quaternion, quat.conjugate(quaternion))
 
-        # get Hamilton product
-        q_error = np.array(
-            [
-                self.target_quaternion[0] * q_conj[0] - self.target_quaternion[1] * q_conj[1] - self.target_quaternion[2] * q_conj[2] - self.target_quaternion[3] * q_conj[3],
-                self.target_quaternion[0] * q_conj[1] + self.target_quaternion[1] * q_conj[0] + self.target_quaternion[2] * q_conj[3] - self.target_quaternion[3] * q_conj[2],
-                self.target_quaternion[0] * q_conj[2] - self.target_quaternion[1] * q_conj[3] + self.target_quaternion[2] * q_conj[0] + self.target_quaternion[3] * q_conj[1],
-                self.target_quaternion[0] * q_conj[3] + self.target_quaternion[1] * q_conj[2] - self.target_quaternion[2] * q_conj[1] + self.target_quaternion[3] * q_conj[0]
-            ]
-        )
 
-        return q_error
+class ResetPool():
+    def __init__(self, attitude, size):
+
+        self.attitude = attitude
+        self.size = size
+
+        # the pool of the current episodes and the next episode inside it
+        self.pool_seed = None
+        self.cursor = size
+
+        # attitudes of the last sampled pool
+        self.samples_pool_seed = None
+        self.samples = None
+
+    def draw_episode_seed(self, rng):
 
+        # a new pool seed is drawn once every episode of the pool has been used. Episode seeds of pooled
+        # episodes encode their pool and their index inside it, so that they can be replayed on their own
+        if self.cursor == self.size:
+            self.pool_seed = int(rng.integers(2**63 // self.size))
+            self.cursor = 0
 
-    def _get_angular_error(self, quaternion_error):
+        episode_seed = self.pool_seed * self.size + self.cursor
+        self.cursor += 1
 
-        return np.rad2deg(2 * np.arccos(quaternion_error[0]))
+        return episode_seed
+
+    def get_sample(self, episode_seed):
+
+        pool_seed, idx = divmod(int(episode_seed), self.size)
+
+        # attitudes are sampled a whole pool at a time, from a stream given by the pool seed only
+        if pool_seed != self.samples_pool_seed:
+            self.samples = self.attitude._sample_quaternions(self.size, np.random.default_rng([pool_seed, self.size]))
+            self.samples_pool_seed = pool_seed
+
+        quaternions, quaternion_errors, angular_errors = self.samples
+
+        return quaternions[idx].copy(), quaternion_errors[idx].copy(), angular_errors[idx]
 
-   
 
 class Spacecraft():
-    def __init__(self):
+    def __init__(self, config=None, rng=None):
+
+        config = load_config(config)
 
         # initialize spacecraft components
-        self.inertia = Inertia()
-        self.attitude = Attitude()
+        self.inertia = Inertia(config, rng)
+        self.attitude = Attitude(config)
 
+        # domain randomization: a new tensor of inertia can be drawn at every reset
+        self.resample_on_reset = config.spacecraft.inertia.resample_on_reset
 
-    def reset(self):
-        
-        self.attitude.init_states()
+
+    def draw_episode_seed(self, rng):
+
+        # pooled episodes get seeds given by their pool, the other ones any seed drawn from the stream
+        if self.attitude.reset_pool is not None:
+            return self.attitude.reset_pool.draw_episode_seed(rng)
+
+        return int(rng.integers(2**63))
+
+    def reset(self, episode_seed=None):
+
+        rng = np.random.default_rng(episode_seed)
+
+        if self.resample_on_reset:
+            self.inertia.resample(rng)
+
+        self.attitude.init_states(rng, episode_seed)
 
     def get_prop_states(self):
 
@@ -192,6 +383,15 @@ class Spacecraft():
         # update attitude states
         self.attitude.update_states(states)
 
+    def update_frame_states(self, frame_states):
+
+        # update attitude states with the states of several consecutive frames
+        return self.attitude.update_frame_states(frame_states)
+
+    def sample_initial_states(self, n, rng=None):
+
+        return self.attitude.sample_initial_states(n, rng)
+
 
 
 if __name__ == "__main__":
@@ -1,32 +1,89 @@
+import os
 import numpy as np
 import matplotlib.pyplot as plt
-from animation import Animation
+from trajectory_writer import MemmapTrajectoryWriter
+from downsampling import downsample
+from config import load_config
+
 
 class Storage():
-    def __init__(self):
+    def __init__(self, config=None):
+
+        config = load_config(config)
+
+        # define the number of records of an episode: the initial one, one for each integration step
+        # and the skipped frames that can be performed after reaching the time horizon
+        self.capacity = int(np.ceil(config.propagator.time_horizon / config.propagator.integration_step)) + \
+            config.environment.n_skipped_frames + 1
+
+        self.cursor = 0
+
+        # define the sink used to stream records on disk
+        self.sink = None
+        self.sink_cursor = 0
+
+        if config.environment.storage.sink == "memmap":
+            self.attach_sink(
+                MemmapTrajectoryWriter(
+                    config.environment.storage.sink_directory,
+                    config.environment.storage.sink_chunk_size,
+                    config.environment.storage.sink_queue_size
+                )
+            )
+
+        self._time_steps = None
+        self._states = None
+        self._quaternion_errors = None
+        self._angular_errors = None
+        self._actions = None
+
+        # the animation module is imported on first use, see get_animation_utils
+        self.animation_utils = None
 
-        self.time_steps = None
-        self.quaternions = None
-        self.quaternion_errors = None
-        self.angular_errors = None
-        self.angular_velocities = None
-        self.actions = None
+    @property
+    def time_steps(self):
+        return self._time_steps[:self.cursor]
 
-        self.animation_utils = Animation()
+    @property
+    def quaternions(self):
+        return self._states[:self.cursor, :4]
+
+    @property
+    def quaternion_errors(self):
+        return self._quaternion_errors[:self.cursor]
+
+    @property
+    def angular_errors(self):
+        return self._angular_errors[:self.cursor]
+
+    @property
+    def angular_velocities(self):
+        return self._states[:self.cursor, 4:]
+
+    @property
+    def actions(self):
+        return self._actions[:self.cursor]
 
     def reset(self,
         quaternion,
         quaternion_error,
         angular_error,
-        angular_velocity
+        angular_velocity,
+        time_step=0
     ):
 
-        self.time_steps = [0]
-        self.quaternions = [quaternion]
-        self.quaternion_errors = [quaternion_error]
-        self.angular_errors = [angular_error]
-        self.angular_velocities = [angular_velocity]
-        self.actions = [np.array([0, 0, 0])]
+        # stream the remaining records of the previous episode
+        if self.sink is not None and self._time_steps is not None:
+            self._flush_records()
+            self.sink.end_episode()
+
+        # allocate new buffers, so that records of previous episodes are never overwritten.
+        # Restored states start from a non null time step, detached from the records before them
+        self._allocate_buffers(self.capacity)
+
+        self.cursor = 0
+        self.sink_cursor = 0
+        self.update_records(time_step, quaternion, quaternion_error, angular_error, angular_velocity, 0)
 
     def update_records(self,
         time_step,
@@ -37,65 +94,178 @@ class Storage():
         action
     ):
 
-        self.time_steps.append(time_step)
-        self.quaternions.append(quaternion)
-        self.quaternion_errors.append(quaternion_error)
-        self.angular_errors.append(angular_error)
-        self.angular_velocities.append(angular_velocity)
-        self.actions.append(action)
+        # grow buffers if the episode lasts longer than expected
+        if self.cursor == self._time_steps.shape[0]:
+            self._grow_buffers()
+
+        idx = self.cursor
+
+        self._time_steps[idx] = time_step
+        self._states[idx, :4] = quaternion
+        self._states[idx, 4:] = angular_velocity
+        self._quaternion_errors[idx] = quaternion_error
+        self._angular_errors[idx] = angular_error
+        self._actions[idx] = action
+
+        self.cursor += 1
+
+        # stream a chunk of records as soon as it is complete
+        if self.sink is not None and self.cursor - self.sink_cursor >= self.sink.chunk_size:
+            self._flush_records()
+
+    def update_frame_records(self,
+        time_steps,
+        quaternions,
+        quaternion_errors,
+        angular_errors,
+        angular_velocities,
+        actions
+    ):
+
+        # store the records of several consecutive frames at once
+        n_records = time_steps.shape[0]
+
+        while self.cursor + n_records > self._time_steps.shape[0]:
+            self._grow_buffers()
+
+        records = slice(self.cursor, self.cursor + n_records)
+
+        self._time_steps[records] = time_steps
+        self._states[records, :4] = quaternions
+        self._states[records, 4:] = angular_velocities
+        self._quaternion_errors[records] = quaternion_errors
+        self._angular_errors[records] = angular_errors
+        self._actions[records] = actions
+
+        self.cursor += n_records
+
+        # stream a chunk of records as soon as it is complete
+        if self.sink is not None and self.cursor - self.sink_cursor >= self.sink.chunk_size:
+            self._flush_records()
+
+    def attach_sink(self, sink):
+
+        self.sink = sink
+        self.sink_cursor = self.cursor
+
+    def close(self):
 
-    def get_env_states(self):
+        if self.sink is None:
+            return
 
-        # get current quaternion
-        quaternion = self.quaternions[-1]
+        # stream the records of the last episode and wait for them to be written
+        if self._time_steps is not None:
+            self._flush_records()
+            self.sink.end_episode()
 
-        # get current angular velocity
-        angular_velocity = self.angular_velocities[-1]
+        self.sink.close()
+        self.sink = None
 
-        states = np.concatenate((quaternion, angular_velocity), axis=None)
+    def get_env_states(self, out=None):
 
-        return states
+        # get current quaternion and angular velocity, without copying them unless out is provided
+        states = self._states[self.cursor - 1]
+
+        if out is None:
+            return states
+
+        np.copyto(out, states)
+
+        return out
+
+    def _flush_records(self):
+
+        # buffers are never overwritten during an episode, so views can be handed to the sink without copies
+        records = slice(self.sink_cursor, self.cursor)
+
+        if records.start < records.stop:
+            self.sink.write_records(
+                self._time_steps[records],
+                self._states[records],
+                self._quaternion_errors[records],
+                self._angular_errors[records],
+                self._actions[records]
+            )
+
+        self.sink_cursor = self.cursor
+
+    def _allocate_buffers(self, capacity):
+
+        # quaternions and angular velocities share the same buffer, so that the environment states are contiguous
+        self._time_steps = np.empty(capacity)
+        self._states = np.empty((capacity, 7))
+        self._quaternion_errors = np.empty((capacity, 4))
+        self._angular_errors = np.empty(capacity)
+        self._actions = np.empty((capacity, 3))
+
+    def _grow_buffers(self):
+
+        time_steps = self._time_steps
+        states = self._states
+        quaternion_errors = self._quaternion_errors
+        angular_errors = self._angular_errors
+        actions = self._actions
+
+        self._allocate_buffers(2 * time_steps.shape[0])
+
+        self._time_steps[:self.cursor] = time_steps
+        self._states[:self.cursor] = states
+        self._quaternion_errors[:self.cursor] = quaternion_errors
+        self._angular_errors[:self.cursor] = angular_errors
+        self._actions[:self.cursor] = actions
+
+    def get_animation_utils(self):
+
+        if self.animation_utils is None:
+            from animation import Animation
+            self.animation_utils = Animation()
+
+        return self.animation_utils
 
     def render_animation(self, target_quaternion, time_step):
 
-        self.animation_utils.animate(self.quaternion_errors, target_quaternion, time_step)
-
-
-    def plot_results(self):
-
-        # plot quaternions
-        plt.figure()
-        plt.plot(self.time_steps, self.quaternions)
-        plt.xlabel('t [s]')
-        plt.ylabel('quaternions')
-        plt.grid()
-
-        # plot quaternion errors
-        plt.figure()
-        plt.plot(self.time_steps, self.quaternion_errors)
-        plt.xlabel('t [s]')
-        plt.ylabel('quaternion errors')
-        plt.grid()
-
-        # plot angular errors
-        plt.figure()
-        plt.plot(self.time_steps, self.angular_errors)
-        plt.xlabel('t [s]')
-        plt.ylabel('angular errors')
-        plt.grid()
-
-        # plot angular velocities
-        plt.figure()
-        plt.plot(self.time_steps, self.angular_velocities)
-        plt.xlabel('t [s]')
-        plt.ylabel('angular velocoties')
-        plt.grid()
-
-        # plot actions
-        plt.figure()
-        plt.plot(self.time_steps, self.actions)
-        plt.xlabel('t [s]')
-        plt.ylabel('actions')
-        plt.grid()
-
-        plt.show()
+        self.get_animation_utils().animate(self.quaternion_errors, target_quaternion, time_step)
+
+    def export_animation(self, target_quaternion, time_step, path, fps=None, frame_stride=1):
+
+        return self.get_animation_utils().export(self.quaternion_errors, target_quaternion, time_step, path, fps, frame_stride)
+
+
+    def plot_results(self, max_points=2000, method="lttb", output_directory=None, show=True):
+
+        # records are decimated to at most max_points points per series (none if max_points is None),
+        # figures are saved inside output_directory, if provided, and shown only if requested
+        figures = (
+            ("quaternions", "quaternions", self.quaternions),
+            ("quaternion_errors", "quaternion errors", self.quaternion_errors),
+            ("angular_errors", "angular errors", self.angular_errors),
+            ("angular_velocities", "angular velocoties", self.angular_velocities),
+            ("actions", "actions", self.actions),
+        )
+
+        if output_directory is not None:
+            os.makedirs(output_directory, exist_ok=True)
+
+        for name, label, records in figures:
+
+            figure = plt.figure()
+
+            if max_points is None:
+                plt.plot(self.time_steps, records)
+            else:
+                for time_steps, values in downsample(self.time_steps, records, max_points, method):
+                    plt.plot(time_steps, values)
+
+            plt.xlabel('t [s]')
+            plt.ylabel(label)
+            plt.grid()
+
+            if output_directory is not None:
+                figure.savefig(os.path.join(output_directory, f"{name}.png"))
+
+            # figures are closed, once saved, unless they are shown
+            if not show:
+                plt.close(figure)
+
+        if show:
+            plt.show()
@@ -0,0 +1,393 @@
+import time
+import traceback
+import multiprocessing as mp
+import numpy as np
+from gymnasium.vector import VectorEnv, AutoresetMode
+from gymnasium.vector.utils import batch_space
+from environment import SpacecraftEnv
+from config import load_config
+
+
+# worker commands
+STEP = 0
+RESET = 1
+CLOSE = 2
+
+
+class SharedBuffers():
+    def __init__(self, num_envs, n_workers, ctx):
+
+        # parent -> workers block
+        self.raw_actions = ctx.RawArray('d', num_envs * 3)
+        self.raw_commands = ctx.RawArray('i', n_workers)
+        self.raw_seeds = ctx.RawArray('Q', num_envs)
+
+        # workers -> parent block
+        self.raw_observations = ctx.RawArray('f', num_envs * 7)
+        self.raw_final_observations = ctx.RawArray('f', num_envs * 7)
+        self.raw_rewards = ctx.RawArray('d', num_envs)
+        self.raw_episode_seeds = ctx.RawArray('Q', num_envs)
+        self.raw_flags = ctx.RawArray('b', num_envs * 5)
+
+        self.num_envs = num_envs
+        self.map_arrays()
+
+    def map_arrays(self):
+
+        # numpy views of the shared memory blocks, rebuilt inside each process
+        self.actions = np.frombuffer(self.raw_actions, dtype=np.float64).reshape(self.num_envs, 3)
+        self.commands = np.frombuffer(self.raw_commands, dtype=np.int32)
+        self.seeds = np.frombuffer(self.raw_seeds, dtype=np.uint64)
+        self.observations = np.frombuffer(self.raw_observations, dtype=np.float32).reshape(self.num_envs, 7)
+        self.final_observations = np.frombuffer(self.raw_final_observations, dtype=np.float32).reshape(self.num_envs, 7)
+        self.rewards = np.frombuffer(self.raw_rewards, dtype=np.float64)
+        self.episode_seeds = np.frombuffer(self.raw_episode_seeds, dtype=np.uint64)
+
+        # terminated, truncated, final observation, error and reset seed flags
+        flags = np.frombuffer(self.raw_flags, dtype=np.bool_).reshape(5, self.num_envs)
+        self.terminated, self.truncated, self.has_final_observation, self.has_error, self.has_seed = flags
+
+    def __getstate__(self):
+
+        state = self.__dict__.copy()
+        for name in ("actions", "commands", "seeds", "observations", "final_observations", "rewards", "episode_seeds",
+                     "terminated", "truncated", "has_final_observation", "has_error", "has_seed"):
+            del state[name]
+
+        return state
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+        self.map_arrays()
+
+
+def _worker(worker_idx, env_indices, config, seed_sequences, buffers, request_semaphore, done_semaphore, error_connection):
+
+    # every environment gets its own child stream of the parent seed sequence, from which its tensor of inertia
+    # is drawn, and writes its observations straight inside the shared memory block
+    envs = [SpacecraftEnv(config, seed_sequence) for seed_sequence in seed_sequences]
+
+    for env, idx in zip(envs, env_indices):
+        env.set_observation_buffer(buffers.observations[idx])
+
+    while True:
+
+        request_semaphore.acquire()
+
+        command = buffers.commands[worker_idx]
+
+        if command == CLOSE:
+            for env in envs:
+                env.close()
+            done_semaphore.release()
+            break
+
+        for env, idx in zip(envs, env_indices):
+
+            buffers.has_final_observation[idx] = False
+            buffers.has_error[idx] = False
+
+            if command == RESET:
+                seed = int(buffers.seeds[idx]) if buffers.has_seed[idx] else None
+                observation, info = env.reset(seed=seed)
+                buffers.episode_seeds[idx] = info['episode_seed']
+                buffers.rewards[idx] = 0
+                buffers.terminated[idx] = False
+                buffers.truncated[idx] = False
+                buffers.observations[idx] = observation
+                continue
+
+            try:
+                observation, reward, terminated, truncated, _ = env.step(buffers.actions[idx].copy())
+
+            except Exception as error:
+                # a failing environment is truncated and reset, the worker keeps running.
+                # The error is sent to the parent before the step is completed
+                observation, reward, terminated, truncated = buffers.observations[idx].copy(), 0, False, True
+                buffers.has_error[idx] = True
+                error_connection.send((idx, repr(error), traceback.format_exc()))
+
+            buffers.rewards[idx] = reward
+            buffers.terminated[idx] = terminated
+            buffers.truncated[idx] = truncated
+
+            # autoreset, keeping the last observation of the episode
+            if terminated or truncated:
+                buffers.final_observations[idx] = observation
+                buffers.has_final_observation[idx] = True
+                observation, info = env.reset()
+                buffers.episode_seeds[idx] = info['episode_seed']
+
+            buffers.observations[idx] = observation
+
+        done_semaphore.release()
+
+
+class SubprocSpacecraftVecEnv(VectorEnv):
+
+    # terminated environments are reset by their workers inside the step that terminates them
+    metadata = {"autoreset_mode": AutoresetMode.SAME_STEP}
+
+    def __init__(self, num_envs, n_workers=None, config=None, start_method=None, timeout=60, step_timeout=30):
+
+        self.num_envs = num_envs
+        self.n_workers = min(num_envs, n_workers or mp.cpu_count())
+        self.config = load_config(config)
+        self.timeout = timeout
+
+        # a worker that does not answer a command within step_timeout seconds, e.g. stuck inside the
+        # integration of non finite states, is killed and restarted. None waits for it forever
+        self.step_timeout = step_timeout
+        self.reuse_observation_buffer = self.config.environment.reuse_observation_buffer
+
+        self.ctx = mp.get_context(start_method)
+
+        # define single and batched observation and action spaces
+        env = SpacecraftEnv(self.config)
+        self.single_observation_space = env.observation_space
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+        self.single_action_space = env.action_space
+        self.action_space = batch_space(self.single_action_space, num_envs)
+        env.close()
+
+        # split environments between workers
+        self.env_indices = np.array_split(np.arange(num_envs), self.n_workers)
+
+        # random streams of the environments, spawned from the config seed if requested
+        self.seed_sequences = np.random.SeedSequence(
+            self.config.environment.random_seed if self.config.environment.use_random_seed else None
+        ).spawn(num_envs)
+
+        self.buffers = SharedBuffers(num_envs, self.n_workers, self.ctx)
+        # semaphores instead of events, an event condition can be left locked by a killed worker
+        self.request_semaphores = [self.ctx.Semaphore(0) for _ in range(self.n_workers)]
+        self.done_semaphores = [self.ctx.Semaphore(0) for _ in range(self.n_workers)]
+        self.processes = [None] * self.n_workers
+        self.restarted_envs = np.zeros(num_envs, dtype=bool)
+
+        # errors of the failed environments, received from one pipe per worker
+        self.error_connections = [None] * self.n_workers
+        self.errors = np.full(num_envs, None, dtype=object)
+        self.tracebacks = np.full(num_envs, None, dtype=object)
+
+        for worker_idx in range(self.n_workers):
+            self._start_worker(worker_idx)
+
+        self.is_waiting = False
+        self.closed = False
+
+    def reset(self, seed=None, options=None):
+
+        # reseed every environment with its own child stream of the provided seed
+        if seed is not None:
+            for idx, seed_sequence in enumerate(np.random.SeedSequence(seed).spawn(self.num_envs)):
+                self.buffers.seeds[idx] = seed_sequence.generate_state(1, np.uint64)[0]
+
+        self.buffers.has_seed[:] = seed is not None
+
+        self._send(RESET)
+        self._wait()
+
+        infos = {
+            'episode_seed': self.buffers.episode_seeds.copy(),
+            '_episode_seed': np.ones(self.num_envs, dtype=bool),
+        }
+
+        return self._get_observations(), infos
+
+    def step_async(self, actions):
+
+        self.buffers.actions[:] = np.asarray(actions, dtype=np.float64).reshape(self.num_envs, 3)
+        self._send(STEP)
+
+    def step_wait(self):
+
+        self._wait()
+
+        buffers = self.buffers
+        truncated = buffers.truncated | self.restarted_envs
+
+        infos = {}
+
+        if np.any(buffers.has_final_observation):
+            infos['final_obs'] = buffers.final_observations.copy()
+            infos['_final_obs'] = buffers.has_final_observation.copy()
+
+        # new episodes started by autoresets or worker restarts
+        has_episode_seed = buffers.has_final_observation | self.restarted_envs
+
+        if np.any(has_episode_seed):
+            infos['episode_seed'] = buffers.episode_seeds.copy()
+            infos['_episode_seed'] = has_episode_seed
+
+        if np.any(buffers.has_error) or np.any(self.restarted_envs):
+            infos['worker_error'] = buffers.has_error | self.restarted_envs
+            infos['error'] = self.errors.copy()
+            infos['traceback'] = self.tracebacks.copy()
+            self.restarted_envs[:] = False
+            self.errors[:] = None
+            self.tracebacks[:] = None
+
+        return (
+            self._get_observations(),
+            buffers.rewards.copy(),
+            buffers.terminated.copy(),
+            truncated,
+            infos
+        )
+
+    def step(self, actions):
+
+        self.step_async(actions)
+
+        return self.step_wait()
+
+    def close(self, **kwargs):
+
+        if self.closed:
+            return
+
+        if self.is_waiting:
+            self._wait()
+
+        self._send(CLOSE)
+
+        for worker_idx, process in enumerate(self.processes):
+            self.done_semaphores[worker_idx].acquire(timeout=self.timeout)
+            process.join(self.timeout)
+            if process.is_alive():
+                process.terminate()
+
+        self.closed = True
+
+    def _get_observations(self):
+
+        # observations are written by the workers inside the shared (N, 7) float32 block
+        if self.reuse_observation_buffer:
+            return self.buffers.observations
+
+        return self.buffers.observations.copy()
+
+    def _start_worker(self, worker_idx):
+
+        error_connection, worker_error_connection = self.ctx.Pipe(duplex=False)
+
+        process = self.ctx.Process(
+            target=_worker,
+            args=(
+                worker_idx,
+                self.env_indices[worker_idx],
+                self.config,
+                [self.seed_sequences[idx] for idx in self.env_indices[worker_idx]],
+                self.buffers,
+                self.request_semaphores[worker_idx],
+                self.done_semaphores[worker_idx],
+                worker_error_connection
+            ),
+            daemon=True
+        )
+        process.start()
+        worker_error_connection.close()
+
+        self.processes[worker_idx] = process
+        self.error_connections[worker_idx] = error_connection
+
+    def _receive_errors(self, worker_idx):
+
+        # drain the errors sent by a worker, also while waiting, so that a full pipe never blocks it
+        connection = self.error_connections[worker_idx]
+
+        try:
+            while connection.poll():
+                idx, error, error_traceback = connection.recv()
+                self.errors[idx] = error
+                self.tracebacks[idx] = error_traceback
+        except (EOFError, OSError):
+            pass
+
+    def _send(self, command):
+
+        self.buffers.commands[:] = command
+
+        for semaphore in self.request_semaphores:
+            semaphore.release()
+
+        self.is_waiting = True
+        self.send_time = time.monotonic()
+
+    def _wait(self):
+
+        # workers run in parallel, so they all share the deadline of the command
+        deadline = None if self.step_timeout is None else self.send_time + self.step_timeout
+
+        for worker_idx in range(self.n_workers):
+
+            # poll worker liveness while waiting, so that a crashed or hung worker does not block the parent
+            while not self.done_semaphores[worker_idx].acquire(timeout=0.1):
+
+                self._receive_errors(worker_idx)
+
+                if not self.processes[worker_idx].is_alive():
+                    self._restart_worker(worker_idx, f"worker {worker_idx} exited with code {self.processes[worker_idx].exitcode}")
+                    break
+
+                if deadline is not None and time.monotonic() > deadline:
+                    self._restart_worker(worker_idx, f"worker {worker_idx} did not complete the step within {self.step_timeout} s")
+                    break
+
+            else:
+                self._receive_errors(worker_idx)
+
+        self.is_waiting = False
+
+    def _stop_worker(self, worker_idx):
+
+        process = self.processes[worker_idx]
+
+        if process.is_alive():
+            process.terminate()
+            process.join(self.timeout)
+
+            if process.is_alive():
+                process.kill()
+
+        process.join()
+
+    def _restart_worker(self, worker_idx, reason):
+
+        # spawn a new worker and reset its environments, their episodes are reported as truncated
+        self._stop_worker(worker_idx)
+        self.error_connections[worker_idx].close()
+        self.request_semaphores[worker_idx] = self.ctx.Semaphore(0)
+        self.done_semaphores[worker_idx] = self.ctx.Semaphore(0)
+
+        # restarted environments continue with new child streams, instead of repeating their first episodes
+        indices = self.env_indices[worker_idx]
+        for idx in indices:
+            self.seed_sequences[idx] = self.seed_sequences[idx].spawn(1)[0]
+        self.buffers.has_seed[indices] = False
+
+        self._start_worker(worker_idx)
+
+        command = self.buffers.commands[worker_idx]
+        self.buffers.commands[worker_idx] = RESET
+        self.request_semaphores[worker_idx].release()
+
+        if not self.done_semaphores[worker_idx].acquire(timeout=self.timeout):
+            self._stop_worker(worker_idx)
+            raise RuntimeError(f"worker {worker_idx} was restarted but did not reset its environments within {self.timeout} s")
+
+        self.buffers.commands[worker_idx] = command
+
+        self.buffers.rewards[indices] = 0
+        self.buffers.terminated[indices] = False
+        self.buffers.has_final_observation[indices] = False
+        self.restarted_envs[indices] = True
+        self.errors[indices] = reason
+        self.tracebacks[indices] = None
+
+    def __del__(self):
+
+        if not getattr(self, "closed", True):
+            self.close()
@@ -0,0 +1,214 @@
+import os
+import json
+import uuid
+import queue
+import threading
+import numpy as np
+
+
+# columns of every record written on disk
+RECORD_COLUMNS = (
+    "time_step",
+    "q0", "q1", "q2", "q3",
+    "wx", "wy", "wz",
+    "qe0", "qe1", "qe2", "qe3",
+    "angular_error",
+    "ux", "uy", "uz",
+)
+
+HEADER_FILE = "header.json"
+INDEX_FILE = "index.jsonl"
+RECORDS_FILE = "records.bin"
+
+
+class MemmapTrajectoryWriter():
+    def __init__(self, directory, chunk_size=1024, queue_size=64):
+
+        self.directory = directory
+        self.chunk_size = chunk_size
+
+        # every writer streams into its own shard of the directory, so that environments or processes sharing
+        # the same sink directory never overwrite each other. TrajectoryReader reads every shard at once
+        self.shard_directory = os.path.join(self.directory, f"shard-{os.getpid()}-{uuid.uuid4().hex[:12]}")
+        os.makedirs(self.shard_directory)
+
+        # write header describing the binary layout of the records file
+        with open(os.path.join(self.shard_directory, HEADER_FILE), "w") as header_file:
+            json.dump(
+                {
+                    "dtype": "<f8",
+                    "columns": list(RECORD_COLUMNS),
+                    "records_file": RECORDS_FILE,
+                    "index_file": INDEX_FILE,
+                },
+                header_file,
+                indent=4
+            )
+
+        self.records_file = open(os.path.join(self.shard_directory, RECORDS_FILE), "wb")
+        self.index_file = open(os.path.join(self.shard_directory, INDEX_FILE), "w")
+
+        self.n_episodes = 0
+        self.n_records = 0
+        self.episode_offset = 0
+
+        # records are written by a background thread, so that the environment step is not slowed down.
+        # The queue is bounded, so that a slow disk blocks the producer instead of growing memory
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write_records(self, time_steps, states, quaternion_errors, angular_errors, actions):
+
+        # arrays are only referenced here, they are stacked and written by the background thread
+        self._raise_error()
+        self.queue.put(("records", (time_steps, states, quaternion_errors, angular_errors, actions)))
+
+    def end_episode(self):
+
+        self._raise_error()
+        self.queue.put(("end_episode", None))
+
+    def flush(self):
+
+        # wait until every queued record has been written
+        self.queue.join()
+        self._raise_error()
+        self.records_file.flush()
+        self.index_file.flush()
+
+    def close(self):
+
+        if self.thread is None:
+            return
+
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+        self.records_file.close()
+        self.index_file.close()
+
+        self._raise_error()
+
+    def _raise_error(self):
+
+        # errors of the background thread are raised inside the producer, the sink is unusable afterwards
+        if self.error is not None:
+            raise RuntimeError(f"trajectory writer failed: {self.error!r}") from self.error
+
+    def _run(self):
+
+        while True:
+
+            item = self.queue.get()
+
+            try:
+                if item is None:
+                    break
+
+                # after an error, remaining items are dropped so that the producer is never blocked
+                if self.error is not None:
+                    continue
+
+                command, data = item
+
+                if command == "records":
+                    self._write_records(*data)
+
+                elif command == "end_episode":
+                    self._write_index()
+
+            except Exception as error:
+                self.error = error
+
+            finally:
+                self.queue.task_done()
+
+    def _write_records(self, time_steps, states, quaternion_errors, angular_errors, actions):
+
+        records = np.column_stack(
+            (time_steps, states, quaternion_errors, angular_errors, actions)
+        ).astype("<f8", copy=False)
+
+        self.records_file.write(records.tobytes())
+        self.n_records += records.shape[0]
+
+    def _write_index(self):
+
+        # every episode is indexed by its first record and its number of records
+        self.index_file.write(
+            json.dumps(
+                {
+                    "episode": self.n_episodes,
+                    "offset": self.episode_offset,
+                    "length": self.n_records - self.episode_offset,
+                }
+            ) + "\n"
+        )
+
+        self.n_episodes += 1
+        self.episode_offset = self.n_records
+
+
+class TrajectoryReader():
+    def __init__(self, directory):
+
+        self.directory = directory
+
+        # read a single shard, or every shard of a sink directory in a stable order
+        if os.path.exists(os.path.join(self.directory, HEADER_FILE)):
+            shard_directories = [self.directory]
+        else:
+            shard_directories = [
+                os.path.join(self.directory, name)
+                for name in sorted(os.listdir(self.directory))
+                if os.path.exists(os.path.join(self.directory, name, HEADER_FILE))
+            ]
+
+        self.header = None
+        self.index = list()
+        self.records = list()
+
+        for shard, shard_directory in enumerate(shard_directories):
+
+            with open(os.path.join(shard_directory, HEADER_FILE), "r") as header_file:
+                self.header = json.load(header_file)
+
+            # episodes are indexed by their shard, their first record and their number of records
+            with open(os.path.join(shard_directory, self.header["index_file"]), "r") as index_file:
+                self.index.extend(dict(json.loads(line), shard=shard) for line in index_file if line.strip())
+
+            # map the whole records file, episodes are then random accessed without loading them
+            records_path = os.path.join(shard_directory, self.header["records_file"])
+            n_columns = len(self.header["columns"])
+
+            if os.path.getsize(records_path) > 0:
+                self.records.append(np.memmap(records_path, dtype=self.header["dtype"], mode="r").reshape(-1, n_columns))
+            else:
+                self.records.append(np.zeros((0, n_columns)))
+
+        self.columns = self.header["columns"] if self.header is not None else list(RECORD_COLUMNS)
+
+    def __len__(self):
+
+        return len(self.index)
+
+    def __getitem__(self, episode):
+
+        return self.get_episode(episode)
+
+    def get_episode(self, episode):
+
+        entry = self.index[episode]
+        records = self.records[entry["shard"]][entry["offset"]:entry["offset"] + entry["length"]]
+
+        return {
+            "time_steps": records[:, 0],
+            "quaternions": records[:, 1:5],
+            "angular_velocities": records[:, 5:8],
+            "quaternion_errors": records[:, 8:12],
+            "angular_errors": records[:, 12],
+            "actions": records[:, 13:16],
+        }
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# modules of the environment are flat inside src, as when scripts are run from there
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from batched_environment import BatchedSpacecraftEnv
+from environment import SpacecraftEnv
+
+
+@pytest.mark.parametrize("method", ["rk4_fixed", "RK45"])
+def test_lanes_match_single_environments(method):
+
+    # every lane replays inside a single environment through its episode seed
+    config = {"propagator": {"integration_method": method}}
+    n_envs = 3
+    n_steps = 20
+
+    batched_env = BatchedSpacecraftEnv(n_envs, config)
+    observations, infos = batched_env.reset(seed=0)
+
+    rng = np.random.default_rng(0)
+    actions = rng.uniform(-1, 1, (n_steps, n_envs, 3))
+
+    batched_observations = [observations]
+    for step in range(n_steps):
+        observations, _, terminated, _, _ = batched_env.step(actions[step])
+        if np.any(terminated):
+            break
+        batched_observations.append(observations)
+
+    tolerance = 1e-6 if method == "rk4_fixed" else 1e-3
+
+    for lane in range(n_envs):
+
+        env = SpacecraftEnv(config)
+        observation, _ = env.reset(options={"episode_seed": int(infos["episode_seed"][lane])})
+        np.testing.assert_allclose(observation, batched_observations[0][lane], atol=1e-6)
+
+        for step in range(1, len(batched_observations)):
+            observation, *_ = env.step(actions[step - 1, lane])
+            np.testing.assert_allclose(observation, batched_observations[step][lane], atol=tolerance)
+
+
+def test_autoreset_declares_same_step_mode():
+
+    env = BatchedSpacecraftEnv(2, {"propagator": {"time_horizon": 0.05}})
+    env.reset(seed=0)
+
+    assert env.metadata["autoreset_mode"].value == "SameStep"
+
+    for _ in range(10):
+        _, _, terminated, _, infos = env.step(np.zeros((2, 3)))
+        if np.any(terminated):
+            break
+
+    assert np.all(terminated)
+    assert infos["_final_obs"].all()
+    assert infos["final_obs"].shape == (2, 7)
+
+
+def test_reset_pool_episodes_replay_from_their_episode_seeds():
+
+    # pooled initial attitudes are given by the episode seeds, for both environment types
+    config = {"spacecraft": {"attitude": {"reset_pool_size": 3}}, "propagator": {"time_horizon": 0.02}}
+    n_envs = 2
+
+    batched_env = BatchedSpacecraftEnv(n_envs, config)
+    observations, infos = batched_env.reset(seed=0)
+    episodes = [(seed, observation) for seed, observation in zip(infos["episode_seed"], observations)]
+
+    for _ in range(20):
+        observations, _, _, _, infos = batched_env.step(np.zeros((n_envs, 3)))
+        if "episode_seed" in infos:
+            mask = infos["_episode_seed"]
+            episodes.extend(zip(infos["episode_seed"][mask], observations[mask]))
+
+    single_env = SpacecraftEnv(dict(config, environment={"use_random_seed": True, "random_seed": 0}))
+    for _ in range(7):
+        observation, info = single_env.reset()
+        episodes.append((info["episode_seed"], observation))
+
+    assert len(set(int(seed) for seed, _ in episodes)) == len(episodes)
+
+    env = SpacecraftEnv(config)
+    for seed, observation in episodes:
+        replayed_observation, _ = env.reset(options={"episode_seed": int(seed)})
+        np.testing.assert_allclose(replayed_observation, observation, atol=1e-6)
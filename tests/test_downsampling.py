@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from downsampling import lttb_indices, min_max_indices, downsample
+
+
+@pytest.mark.parametrize("get_indices", [lttb_indices, min_max_indices])
+@pytest.mark.parametrize("n", [10, 1001, 5000])
+def test_indices_keep_endpoints(get_indices, n):
+
+    x = np.linspace(0, 10, n)
+    y = np.sin(x) + np.random.default_rng(0).normal(scale=0.1, size=n)
+
+    indices = get_indices(x, y, 100)
+
+    assert indices[0] == 0
+    assert indices[-1] == n - 1
+    assert np.all(np.diff(indices) > 0)
+    # min-max bucketing can keep the same point twice, duplicates are dropped
+    assert indices.shape[0] <= min(n, 100)
+
+    if get_indices is lttb_indices:
+        assert indices.shape[0] == min(n, 100)
+
+
+@pytest.mark.parametrize("method", ["lttb", "min_max"])
+def test_downsample_keeps_spikes(method):
+
+    x = np.arange(10000, dtype=np.float64)
+    y = np.zeros((10000, 2))
+    y[1234, 0] = 5
+    y[8765, 1] = -5
+
+    (x_0, y_0), (x_1, y_1) = downsample(x, y, 50, method)
+
+    assert 1234 in x_0 and y_0.max() == 5
+    assert 8765 in x_1 and y_1.min() == -5
+    assert x_0[0] == 0 and x_0[-1] == 9999
@@ -0,0 +1,133 @@
+import os
+import socket
+import asyncio
+import threading
+import numpy as np
+import pytest
+
+from env_server import EnvServer, EnvClient, HEADER, STEP, OBSERVATION_SIZE, ACTION_SIZE
+from environment import SpacecraftEnv
+
+
+CONFIG = {
+    "environment": {"use_random_seed": True, "random_seed": 5},
+    "spacecraft": {"inertia": {"use_random_moi": True, "use_random_poi": True}},
+    "propagator": {"integration_method": "rk4_fixed"},
+}
+N_ENVS = 3
+
+
+@pytest.fixture
+def server(tmp_path):
+
+    # the server runs its own event loop inside a thread, clients connect from the test thread
+    server = EnvServer(N_ENVS, CONFIG, path=os.path.join(str(tmp_path), "env_server.sock"))
+    loop = asyncio.new_event_loop()
+    is_started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        is_started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    is_started.wait(10)
+
+    yield server
+
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+    server.close()
+    loop.run_until_complete(server.server.wait_closed())
+    loop.close()
+
+
+def test_hosted_environments_draw_their_inertia_from_their_own_streams():
+
+    server = EnvServer(N_ENVS, CONFIG)
+
+    try:
+        matrices = [env.spacecraft.inertia.matrix for env in server.envs]
+        assert not np.allclose(matrices[0], matrices[1])
+        assert not np.allclose(matrices[1], matrices[2])
+    finally:
+        server.close()
+
+
+def test_protocol_round_trip(server):
+
+    client = EnvClient(path=server.path)
+
+    try:
+        assert tuple(client.info()) == (N_ENVS, OBSERVATION_SIZE, ACTION_SIZE)
+
+        env_ids = [2, 0]
+        observations, episode_seeds = client.reset(env_ids)
+
+        actions = np.array([[0.1, -0.2, 0.3], [0.0, 0.1, 0.0]])
+        step_observations, rewards, terminated, truncated, errors = client.step(env_ids, actions)
+
+        assert not np.any(errors) and not np.any(truncated)
+
+        # every hosted environment is replayed by a single environment built on its child stream
+        seed_sequences = np.random.SeedSequence(5).spawn(N_ENVS)
+
+        for idx, env_id in enumerate(env_ids):
+
+            env = SpacecraftEnv(CONFIG, seed_sequences[env_id])
+            observation, _ = env.reset(options={"episode_seed": int(episode_seeds[idx])})
+            np.testing.assert_allclose(observation, observations[idx], atol=1e-6)
+
+            observation, reward, is_terminated, _, _ = env.step(actions[idx].astype(np.float32).astype(np.float64))
+            np.testing.assert_allclose(observation, step_observations[idx], atol=1e-6)
+            assert reward == pytest.approx(rewards[idx])
+            assert is_terminated == terminated[idx]
+
+        # non finite actions only set the error flag of their environment
+        actions[1, 0] = np.nan
+        _, _, _, _, errors = client.step(env_ids, actions)
+        assert list(errors) == [False, True]
+
+    finally:
+        client.close()
+
+
+def test_invalid_requests_are_rejected(server):
+
+    client = EnvClient(path=server.path)
+
+    try:
+        # invalid ids are reported as errors, the connection is kept
+        with pytest.raises(RuntimeError, match="lower than"):
+            client.step([N_ENVS], np.zeros((1, 3)))
+
+        with pytest.raises(RuntimeError, match="unique"):
+            client.step([1, 1], np.zeros((2, 3)))
+
+        client.reset([0, 1])
+
+    finally:
+        client.close()
+
+    # requests covering more environments than hosted are rejected before their body is read
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.connect(server.path)
+
+    try:
+        connection.sendall(HEADER.pack(STEP, 2**31))
+        connection.settimeout(10)
+        response = b""
+        while True:
+            data = connection.recv(4096)
+            if not data:
+                break
+            response += data
+
+        status, n = HEADER.unpack(response[:HEADER.size])
+        assert status == 1
+        assert b"at most" in response[HEADER.size:]
+
+    finally:
+        connection.close()
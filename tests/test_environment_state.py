@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from environment import SpacecraftEnv, STATE_SIZE
+
+
+def rollout(env, actions):
+
+    transitions = list()
+
+    for action in actions:
+        observation, reward, terminated, _, _ = env.step(action)
+        transitions.append((observation, reward, terminated))
+        if terminated:
+            break
+
+    return transitions
+
+
+@pytest.mark.parametrize("propagator", [
+    {"integration_method": "rk4_fixed"},
+    {"integration_method": "RK45", "continuous_propagation": True},
+])
+def test_set_state_resumes_the_episode(propagator):
+
+    config = {
+        "spacecraft": {"inertia": {"use_random_moi": True, "use_random_poi": True}},
+        "propagator": propagator,
+    }
+    actions = np.random.default_rng(0).uniform(-0.1, 0.1, (20, 3))
+
+    env = SpacecraftEnv(config)
+    env.reset(seed=0)
+    rollout(env, actions[:5])
+
+    state = env.get_state()
+    assert state.shape == (STATE_SIZE,)
+
+    continuation = rollout(env, actions[5:])
+
+    # a snapshot restored inside another environment gives the same states and the same branches
+    branches = list()
+
+    for _ in range(2):
+
+        other_env = SpacecraftEnv(config)
+        other_env.reset(seed=1)
+        other_env.set_state(state)
+        np.testing.assert_array_equal(other_env.get_state(), state)
+
+        branches.append(rollout(other_env, actions[5:]))
+
+    for (observation, reward, terminated), (other_observation, other_reward, other_terminated) in zip(*branches):
+        np.testing.assert_array_equal(observation, other_observation)
+        assert reward == other_reward and terminated == other_terminated
+
+    # restored solvers start again from the snapshot, so only fixed steps continue exactly
+    tolerance = 0 if propagator["integration_method"] == "rk4_fixed" else 1e-3
+
+    assert len(branches[0]) == len(continuation)
+    for (observation, reward, _), (other_observation, other_reward, _) in zip(continuation, branches[0]):
+        np.testing.assert_allclose(observation, other_observation, atol=tolerance)
+        assert reward == other_reward
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from scipy.integrate import solve_ivp
+from integrators import RK4_TABLEAU, RK8_TABLEAU
+from propagator import Propagator
+
+
+# asymmetric spacecraft without perturbations, so that the dynamics are smooth
+CONFIG = {
+    "force_model": {"use_perturbations": False},
+    "spacecraft": {"inertia": {"moi": [1, 2, 3], "poi": [0.1, 0.2, 0.1]}},
+}
+
+INERTIA_MATRIX = np.array([[1, -0.1, -0.2], [-0.1, 2, -0.1], [-0.2, -0.1, 3]])
+INITIAL_STATES = np.array([1, 0, 0, 0, 0.5, -0.3, 0.4])
+DURATION = 2.0
+
+
+def propagate(method, step_size):
+
+    propagator = Propagator(
+        dict(CONFIG, propagator={"integration_method": method, "integration_step": step_size, "time_horizon": 10})
+    )
+    propagator.reset()
+
+    states = INITIAL_STATES.copy()
+    action = np.array([0.05, -0.02, 0.01])
+    inverse_inertia_matrix = np.linalg.inv(INERTIA_MATRIX)
+
+    for _ in range(int(round(DURATION / step_size))):
+        _, ode_solution = propagator.propagate(states, action, INERTIA_MATRIX, inverse_inertia_matrix)
+        states = np.take(ode_solution.y, -1, -1).copy()
+
+    return states
+
+
+def reference_states():
+
+    propagator = Propagator(CONFIG)
+
+    return solve_ivp(
+        propagator.force_model.ode,
+        [0, DURATION],
+        INITIAL_STATES,
+        method="DOP853",
+        rtol=1e-12,
+        atol=1e-12,
+        args=(np.array([0.05, -0.02, 0.01]), INERTIA_MATRIX, np.linalg.inv(INERTIA_MATRIX))
+    ).y[:, -1]
+
+
+@pytest.mark.parametrize("tableau", [RK4_TABLEAU, RK8_TABLEAU])
+def test_tableaus_are_consistent(tableau):
+
+    np.testing.assert_allclose(np.sum(tableau["A"], axis=1), tableau["C"], atol=1e-14)
+    np.testing.assert_allclose(np.sum(tableau["B"]), 1, atol=1e-14)
+
+
+@pytest.mark.parametrize("method, order, step_size", [("rk4_fixed", 4, 0.1), ("rkmk4_fixed", 4, 0.1), ("rk8_fixed", 8, 0.5)])
+def test_fixed_step_methods_converge_at_their_order(method, order, step_size):
+
+    reference = reference_states()
+
+    # the 8th order method reaches round off errors at small steps, so it is checked at larger ones
+    errors = [np.max(np.abs(propagate(method, step) - reference)) for step in (step_size, step_size / 2)]
+
+    # halving the step divides the error by about 2**order
+    assert errors[0] / errors[1] > 2**(order - 1)
+
+
+@pytest.mark.parametrize("method", ["rk4_fixed", "rk8_fixed", "rkmk4_fixed", "euler_semi_implicit"])
+def test_fixed_step_methods_match_rk45(method):
+
+    tolerance = 1e-2 if method == "euler_semi_implicit" else 1e-3
+
+    np.testing.assert_allclose(propagate(method, 0.01), propagate("RK45", 0.01), atol=tolerance)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from force_model import ForceModel
+
+
+def get_finite_difference_jacobian(force_model, t, x, args, epsilon=1e-6):
+
+    # central differences, column by column
+    jacobian = np.empty((x.shape[0], x.shape[0]))
+
+    for column in range(x.shape[0]):
+        dx = np.zeros(x.shape[0])
+        dx[column] = epsilon
+        jacobian[:, column] = (force_model.ode(t, x + dx, *args) - force_model.ode(t, x - dx, *args)) / (2 * epsilon)
+
+    return jacobian
+
+
+@pytest.mark.parametrize("use_perturbations", [True, False])
+def test_analytic_jacobian_matches_finite_differences(use_perturbations):
+
+    # the default perturbations include fixed frame torques, whose derivatives depend on the quaternion
+    force_model = ForceModel({"force_model": {"use_perturbations": use_perturbations}})
+    rng = np.random.default_rng(0)
+
+    inertia_matrix = np.array([[1, 0.1, 0.2], [0.1, 2, 0.1], [0.2, 0.1, 3]])
+    args = (np.array([0.1, -0.2, 0.3]), inertia_matrix, np.linalg.inv(inertia_matrix))
+
+    for t in (0.7, 3.1, 12.4):
+
+        quaternion = rng.normal(size=4)
+        x = np.concatenate((quaternion / np.linalg.norm(quaternion), rng.normal(size=3)))
+
+        jacobian = force_model.jacobian(t, x, *args)
+
+        np.testing.assert_allclose(
+            jacobian, get_finite_difference_jacobian(force_model, t, x, args), rtol=1e-6, atol=1e-7
+        )
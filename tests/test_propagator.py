@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from propagator import Propagator, BatchedPropagator
+
+
+# a constant pulse whose edges fall inside integration steps, on a spacecraft at rest with unit inertia:
+# the angular velocity reached after it is the amplitude times its duration
+CONFIG = {
+    "force_model": {
+        "perturbations": {
+            "n_sinusoidal_perturbations": 0,
+            "constant_perturbations_amplitudes": [[0, 2, 0], [0, 0, 0], [0, 0, 0]],
+            "constant_perturbations_times": [[0.105, 0.1425], [0, 0], [0, 0]],
+        },
+    },
+}
+
+
+@pytest.mark.parametrize("method", ["rk4_fixed", "rk8_fixed", "rkmk4_fixed"])
+def test_fixed_steps_are_split_at_discontinuities(method):
+
+    config = dict(CONFIG, propagator={"integration_method": method, "integration_step": 0.01})
+    inertia_matrix = np.eye(3)
+
+    propagator = Propagator(config)
+    propagator.reset()
+    states = np.array([1, 0, 0, 0, 0, 0, 0], dtype=np.float64)
+
+    for _ in range(30):
+        _, ode_solution = propagator.propagate(states, propagator.null_action, inertia_matrix, inertia_matrix)
+        states = np.take(ode_solution.y, -1, -1).copy()
+
+    assert propagator.current_time == pytest.approx(0.3)
+    assert states[5] == pytest.approx(2 * 0.0375, abs=1e-12)
+
+    # spacecraft of a batch crossing a discontinuity at different times are split as well
+    batched_propagator = BatchedPropagator(config)
+    batched_states = np.tile([1, 0, 0, 0, 0, 0, 0], (2, 1)).astype(np.float64)
+    current_times = np.array([0, 0.003])
+
+    for _ in range(30):
+        _, batched_states, current_times = batched_propagator.propagate(
+            batched_states, np.zeros((2, 3)), current_times, np.tile(inertia_matrix, (2, 1, 1)), np.tile(inertia_matrix, (2, 1, 1))
+        )
+
+    np.testing.assert_allclose(batched_states[:, 5], 2 * 0.0375, atol=1e-12)
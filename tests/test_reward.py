@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from environment import SpacecraftEnv
+from batched_environment import BatchedSpacecraftEnv
+
+
+def get_storage_rewards(env, actions):
+
+    # the discrete reward of model_1 compares the last two frames recorded by the storage
+    rewards = list()
+
+    for action in actions:
+        _, reward, terminated, _, _ = env.step(action)
+        if terminated:
+            break
+        angular_errors = env.storage.angular_errors
+        if angular_errors[-1] > 0.5:
+            rewards.append((reward, 0.1 if angular_errors[-1] < angular_errors[-2] else -0.1))
+
+    return rewards
+
+
+@pytest.mark.parametrize("fuse_skipped_frames", [False, True])
+@pytest.mark.parametrize("n_skipped_frames", [0, 3])
+def test_model_1_compares_the_previous_frame(n_skipped_frames, fuse_skipped_frames):
+
+    config = {
+        "environment": {"n_skipped_frames": n_skipped_frames, "fuse_skipped_frames": fuse_skipped_frames},
+        "spacecraft": {"attitude": {"initial_angular_error_min": 0, "initial_angular_error_max": 10}},
+        "force_model": {"use_perturbations": False},
+        "propagator": {"integration_method": "rk4_fixed"},
+    }
+    actions = np.random.default_rng(0).uniform(-0.5, 0.5, (20, 3))
+
+    env = SpacecraftEnv(config)
+    env.reset(seed=0)
+
+    for reward, expected in get_storage_rewards(env, actions):
+        assert reward == expected
+
+    # lanes of the batched environment get the same rewards as single environments
+    batched_env = BatchedSpacecraftEnv(1, config)
+    _, infos = batched_env.reset(seed=0)
+
+    env.reset(options={"episode_seed": int(infos["episode_seed"][0])})
+
+    for action in actions:
+        _, reward, terminated, _, _ = env.step(action)
+        _, rewards, _, _, _ = batched_env.step(action[None])
+        assert rewards[0] == pytest.approx(reward)
+        if terminated:
+            break
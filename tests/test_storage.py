@@ -0,0 +1,26 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from environment import SpacecraftEnv
+
+
+def test_plot_results_closes_figures_that_are_not_shown(tmp_path):
+
+    env = SpacecraftEnv({"propagator": {"integration_method": "rk4_fixed"}})
+    env.reset(seed=0)
+
+    for _ in range(10):
+        env.step(np.zeros(3))
+
+    n_figures = len(plt.get_fignums())
+
+    env.storage.plot_results(show=False)
+    assert len(plt.get_fignums()) == n_figures
+
+    env.storage.plot_results(output_directory=str(tmp_path), show=False)
+    assert len(plt.get_fignums()) == n_figures
+    assert len(list(tmp_path.glob("*.png"))) == 5
@@ -0,0 +1,71 @@
+import numpy as np
+
+import subproc_environment
+from subproc_environment import SubprocSpacecraftVecEnv
+from environment import SpacecraftEnv
+
+
+def test_worker_errors_are_sent_to_the_parent(monkeypatch):
+
+    step = subproc_environment.SpacecraftEnv.step
+
+    def failing_step(self, action):
+        if action[0] > 0.5:
+            raise ValueError("failing step")
+        return step(self, action)
+
+    # forked workers inherit the patched step
+    monkeypatch.setattr(subproc_environment.SpacecraftEnv, "step", failing_step)
+
+    env = SubprocSpacecraftVecEnv(2, n_workers=2, start_method="fork")
+
+    try:
+        env.reset(seed=0)
+
+        actions = np.zeros((2, 3))
+        actions[0, 0] = 0.9
+        _, _, _, truncated, infos = env.step(actions)
+
+        assert list(truncated) == [True, False]
+        assert list(infos["worker_error"]) == [True, False]
+        assert infos["error"][0] == "ValueError('failing step')"
+        assert "failing_step" in infos["traceback"][0]
+        assert infos["error"][1] is None
+
+        # errors are reported once
+        _, _, _, _, infos = env.step(np.zeros((2, 3)))
+        assert "error" not in infos
+
+    finally:
+        env.close()
+
+
+def test_environments_draw_their_inertia_from_their_own_streams():
+
+    # with random inertia, the same action from rest changes the angular velocity of each environment differently
+    config = {
+        "environment": {"use_random_seed": True, "random_seed": 3},
+        "spacecraft": {"inertia": {"use_random_moi": True, "use_random_poi": True}},
+        "propagator": {"integration_method": "rk4_fixed"},
+    }
+    n_envs = 3
+    actions = np.tile([0.1, -0.2, 0.3], (n_envs, 1))
+
+    env = SubprocSpacecraftVecEnv(n_envs, n_workers=2, config=config)
+
+    try:
+        _, infos = env.reset()
+        observations, *_ = env.step(actions)
+    finally:
+        env.close()
+
+    assert len(set(np.round(observations[:, 4:], 6).ravel().tolist())) == 3 * n_envs
+
+    # every environment is replayed by a single environment built with its child stream
+    seed_sequences = np.random.SeedSequence(3).spawn(n_envs)
+
+    for idx, seed_sequence in enumerate(seed_sequences):
+        single_env = SpacecraftEnv(config, seed_sequence)
+        single_env.reset(options={"episode_seed": int(infos["episode_seed"][idx])})
+        observation, *_ = single_env.step(actions[idx])
+        np.testing.assert_allclose(observation, observations[idx], atol=1e-6)
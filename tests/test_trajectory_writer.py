@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from trajectory_writer import MemmapTrajectoryWriter, TrajectoryReader
+from environment import SpacecraftEnv
+
+
+def write_episode(writer, n_records, value):
+
+    writer.write_records(
+        np.arange(n_records, dtype=np.float64),
+        np.full((n_records, 7), value),
+        np.full((n_records, 4), value),
+        np.full(n_records, value),
+        np.full((n_records, 3), value)
+    )
+    writer.end_episode()
+
+
+def test_writers_sharing_a_directory_do_not_overwrite_each_other(tmp_path):
+
+    writers = [MemmapTrajectoryWriter(str(tmp_path)) for _ in range(2)]
+
+    write_episode(writers[0], 5, 1.0)
+    write_episode(writers[1], 3, 2.0)
+    write_episode(writers[0], 4, 3.0)
+
+    for writer in writers:
+        writer.close()
+
+    reader = TrajectoryReader(str(tmp_path))
+
+    assert len(reader) == 3
+    assert sorted((episode["time_steps"].shape[0], episode["angular_errors"][0]) for episode in reader) == \
+        [(3, 2.0), (4, 3.0), (5, 1.0)]
+
+
+def test_background_errors_are_raised(tmp_path):
+
+    writer = MemmapTrajectoryWriter(str(tmp_path), queue_size=2)
+
+    # records of mismatching lengths cannot be stacked by the background thread
+    writer.write_records(np.zeros(3), np.zeros((4, 7)), np.zeros((3, 4)), np.zeros(3), np.zeros((3, 3)))
+
+    with pytest.raises(RuntimeError):
+        writer.flush()
+
+    with pytest.raises(RuntimeError):
+        writer.close()
+
+
+def test_environment_episodes_are_streamed(tmp_path):
+
+    config = {"environment": {"storage": {"sink": "memmap", "sink_directory": str(tmp_path)}}}
+    envs = [SpacecraftEnv(config) for _ in range(2)]
+
+    for env in envs:
+        env.reset(seed=0)
+        for _ in range(10):
+            env.step(np.zeros(3))
+        env.reset(seed=1)
+        env.close()
+
+    reader = TrajectoryReader(str(tmp_path))
+
+    assert len(reader) == 4
+    np.testing.assert_array_equal(reader[0]["quaternions"][-1], reader[2]["quaternions"][-1])